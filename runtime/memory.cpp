@@ -325,33 +325,3 @@ bool memory_test_is_live_object(int32_t* object) {
   }
   return false;
 }
-
-int32_t** build_string_table(const char* strings, int32_t string_count) {
-  int32_t** table = new int32_t*[string_count + 1];
-  const char* string_ptr = strings;
-  for (int i = 0; i < string_count; ++i) {
-    int len = strlen(string_ptr);
-    char* string = new char[len + 1];
-    for (int j = 0; j < len; ++j) {
-      string[j] = string_ptr[j];
-    }
-    string[len] = '\0';
-    table[i] = tag_pointer(string);
-    string_ptr += (len + 1);
-  }
-  table[string_count] = nullptr;
-  return table;
-}
-
-void free_string_table(int32_t** table) {
-  int row = 0;
-  while (true) {
-    int32_t* string = table[row];
-    if (string == nullptr) {
-      break;
-    }
-    delete[] untag_pointer(string);
-    ++row;
-  }
-  delete[] table;
-}
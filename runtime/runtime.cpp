@@ -13,7 +13,9 @@ const char* error_messages[] = {"Assert failure in generated code",
                                 "Array index not an int",
                                 "Array base not an array"};
 
-int32_t** global_string_table = nullptr;
+// Points to the string table emitted by the compiler, in the read-only data
+// section. The table and the strings are used in place.
+int32_t* const* global_string_table = nullptr;
 
 extern "C" void user_code();
 
@@ -28,7 +30,7 @@ extern "C" void* runtime_CreateFunctionContext(std::int32_t* outer, std::int32_t
   context->return_value_count = return_value_count;
   // FIXME: it's wasteful to reserve space for the string table in all function
   // contexts.
-  context->string_table = tag_pointer(global_string_table);
+  context->string_table = tag_pointer(const_cast<int32_t**>(global_string_table));
   // fprintf(stderr, "CreateFunctionContext (outer %p) returns %p\n", outer, context);
   return tag_pointer(context);
 }
@@ -45,7 +47,7 @@ extern "C" void* runtime_CreateFunction(FunctionContext* function_context, std::
   return tag_pointer(function);
 }
 
-extern "C" void* runtime_CreateMainFunctionContext(std::int32_t locals_count, const char* strings, int32_t string_count) {
+extern "C" void* runtime_CreateMainFunctionContext(std::int32_t locals_count, int32_t* const* string_table) {
   // We don't have proper stack structure yet, so GC cannot
   // happen. But we're guaranteed to have enough space in the start.
   FunctionContext* context = reinterpret_cast<FunctionContext*>(memory_allocate_no_gc(sizeof(FunctionContext) + locals_count * POINTER_SIZE));
@@ -54,8 +56,8 @@ extern "C" void* runtime_CreateMainFunctionContext(std::int32_t locals_count, co
   context->params_and_locals_count = locals_count;
   context->return_value_count = 0;
   assert(global_string_table == nullptr);
-  global_string_table = build_string_table(strings, string_count);
-  context->string_table = tag_pointer(global_string_table);
+  global_string_table = string_table;
+  context->string_table = tag_pointer(const_cast<int32_t**>(global_string_table));
   // fprintf(stderr, "CreateMainFunctionContext returns %p\n", context);
   return tag_pointer(context);
 }
@@ -78,7 +80,6 @@ int main(int argc, char** argv) {
   }
   memory_init();
   user_code();
-  free_string_table(global_string_table);
   memory_teardown();
   return 0;
 }
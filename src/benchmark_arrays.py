@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+
+# Measures the memory use and the throughput of interpreter Arrays with 10M
+# elements, filled with distinct ints, when they use the typed storage and
+# when they use the generic list storage (which they switch to after a non-int
+# is stored).
+
+from interpreter import Array
+
+import time
+import tracemalloc
+
+SIZE = 10 * 1000 * 1000
+
+
+def create_array(typed):
+  a = Array(SIZE)
+  if not typed:
+    a.setData(0, "not an int")
+    a.setData(0, 0)
+  assert(a.is_typed == typed)
+  return a
+
+
+def fill(a):
+  for i in range(SIZE):
+    a.setData(i, i)
+
+
+def read(a):
+  total = 0
+  for i in range(SIZE):
+    total += a.getData(i)
+  return total
+
+
+def measure_memory(typed):
+  tracemalloc.start()
+  a = create_array(typed)
+  fill(a)
+  (current, peak) = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return current
+
+
+def measure_time(typed):
+  a = create_array(typed)
+  start = time.perf_counter()
+  fill(a)
+  fill_time = time.perf_counter() - start
+  start = time.perf_counter()
+  assert(read(a) == SIZE * (SIZE - 1) // 2)
+  read_time = time.perf_counter() - start
+  return (fill_time, read_time)
+
+
+if __name__ == "__main__":
+  print("%-8s %12s %12s %12s" % ("Storage", "Memory", "Fill", "Read"))
+  for typed in [True, False]:
+    memory = measure_memory(typed)
+    (fill_time, read_time) = measure_time(typed)
+    print("%-8s %9.1f MB %10.2f s %10.2f s" % ("typed" if typed else "list", memory / 1000000, fill_time, read_time))
@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+
+# Measures building the grammar tables for the real grammar and for synthetic
+# grammars which are 10x and 100x larger, and checks that the build scales
+# linearly: the time per rule may grow somewhat with the size (caches etc.),
+# but not with the number of copies.
+
+from benchmark_util import best_time
+from grammar import GrammarDriver, GrammarRule
+from grammar_rules import rules
+
+# How much slower per rule the 100x grammar may be than the 10x grammar.
+MAX_TIME_PER_RULE_GROWTH = 2
+
+
+# Makes a grammar out of copies of rules, with the nonfinals and tokens renamed
+# so that the copies don't overlap. The copies are chained (each start_k can
+# also continue with start_k+1), so that FIRST and FOLLOW information flows
+# through the whole grammar and not just inside one copy.
+def generate_grammar(rules, copies):
+  def rename(item, k):
+    if item == "epsilon":
+      return item
+    return item + "_" + str(k)
+
+  result = []
+  for k in range(copies):
+    start = "start_" + str(k)
+    result.append(GrammarRule(start, ["token_copy_" + str(k), rename(rules[0].left, k)], None))
+    if k < copies - 1:
+      result.append(GrammarRule(start, ["token_next_" + str(k), "start_" + str(k + 1)], None))
+    for rule in rules:
+      result.append(GrammarRule(rename(rule.left, k), [rename(item, k) for item in rule.right], rule.gatherer))
+  return result
+
+
+if __name__ == "__main__":
+  print("%10s %10s" % ("Rules", "Build"))
+  time_per_rule = dict()
+  for copies in [1, 10, 100]:
+    generated = generate_grammar(rules, copies)
+    t = best_time(lambda: GrammarDriver(generated), 3)
+    print("%10d %8.1f ms" % (len(generated), t * 1000))
+    time_per_rule[copies] = t / len(generated)
+
+  growth = time_per_rule[100] / time_per_rule[10]
+  print("Time per rule, 100x vs. 10x: %.2f" % growth)
+  assert(growth < MAX_TIME_PER_RULE_GROWTH)
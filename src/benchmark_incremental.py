@@ -0,0 +1,36 @@
+#!/usr/bin/python3
+
+# Times a one-line edit in a 50k-line program: parsing and analysing the whole
+# program again vs. the incremental front end.
+
+from benchmark_util import PROGRAM_CHUNK, best_time, generate_program
+from grammar import GrammarDriver
+from grammar_rules import rules
+from incremental import IncrementalFrontEnd, TextEdit
+
+BUILTINS = ["print", "Array"]
+
+if __name__ == "__main__":
+  grammar = GrammarDriver(rules)
+  lines = 50000
+  source = generate_program(lines * len(PROGRAM_CHUNK) // PROGRAM_CHUNK.count("\n"))
+  print("Lines: " + str(source.count("\n")) + ", characters: " + str(len(source)))
+
+  # Edit a line in the middle of the program, back and forth. The edits change
+  # the length of the line, so the positions of the statements after it move.
+  line = "  let c = a + b * 2;\n"
+  edit_start = source.index(line, len(source) // 2) + len("  let c = a + b * ")
+  edits = [TextEdit(edit_start, edit_start + 1, "20"), TextEdit(edit_start, edit_start + 2, "2")]
+
+  front_end = IncrementalFrontEnd(grammar, BUILTINS)
+  full = best_time(lambda: front_end.parse(source))
+
+  def incremental():
+    for edit in edits:
+      front_end.update(edit)
+  incremental_seconds = best_time(incremental) / len(edits)
+
+  print("Reparsed statements: " + str(front_end.reparsed_statement_count) +
+        ", reused statements: " + str(front_end.reused_statement_count))
+  print("Full parse + analysis:        %8.3f s" % full)
+  print("Incremental parse + analysis: %8.3f s" % incremental_seconds)
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+
+# Compares the Interpreter execution modes, the MediumLevelIRInterpreter and
+# the PythonCodeRunner on loop-heavy and call-heavy programs from tests/, and on
+# all of tests/. The times include scanning, parsing and scope analysis, which
+# are the same for all of them; for the MediumLevelIRInterpreter, they also
+# include creating the MediumLevelIR and the bytecode, and for the
+# PythonCodeRunner, generating and compiling the Python code.
+
+from benchmark_util import best_time
+from grammar import GrammarDriver
+from grammar_rules import rules
+from interpreter import ExecutionMode, Interpreter
+from medium_level_ir_interpreter import MediumLevelIRInterpreter
+from python_code_generator import PythonCodeRunner
+
+import os
+
+TESTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests")
+
+PROGRAMS = [("loop-heavy", "memory3.in"),
+            ("loop-heavy", "gcd.in"),
+            ("call-heavy", "fibonacci.in")]
+
+
+def runners(grammar, source):
+  return [lambda mode = mode: Interpreter(grammar, source, mode).run() for mode in ExecutionMode] + [lambda: MediumLevelIRInterpreter(grammar, source).run(), lambda: PythonCodeRunner(grammar, source).run()]
+
+
+def all_test_programs():
+  sources = []
+  for file_name in sorted(os.listdir(TESTS_PATH)):
+    if not file_name.endswith(".in") or file_name.startswith("error_"):
+      continue
+    with open(os.path.join(TESTS_PATH, file_name)) as f:
+      source = f.read()
+    if not source.startswith("SKIP"):
+      sources.append(source)
+  return sources
+
+
+if __name__ == "__main__":
+  grammar = GrammarDriver(rules)
+
+  names = [mode.name for mode in ExecutionMode] + ["bytecode", "python"]
+  print("%-12s %-14s" % ("Kind", "Program") + "".join(["%16s" % name for name in names]))
+  for (kind, file_name) in PROGRAMS:
+    with open(os.path.join(TESTS_PATH, file_name)) as f:
+      source = f.read()
+    expected_output = Interpreter(grammar, source).run()
+    times = []
+    for run in runners(grammar, source):
+      assert(run() == expected_output)
+      times.append(best_time(run, 5))
+    print("%-12s %-14s" % (kind, file_name) + "".join(["%13.1f ms" % (t * 1000) for t in times]))
+
+  sources = all_test_programs()
+  totals = [0] * len(names)
+  for source in sources:
+    for (ix, run) in enumerate(runners(grammar, source)):
+      totals[ix] += best_time(run, 3)
+  print("%-12s %-14s" % ("all", "tests/ (" + str(len(sources)) + ")") + "".join(["%13.1f ms" % (t * 1000) for t in totals]))
@@ -0,0 +1,32 @@
+#!/usr/bin/python3
+
+# Measures the memory used for parsing a large program: the tracemalloc peak
+# during parsing, and the size of the resulting parse tree.
+
+from benchmark_util import format_size, generate_program
+from grammar import GrammarDriver
+from grammar_rules import rules
+from parser import Parser
+from scanner import Scanner
+
+import sys
+import tracemalloc
+
+
+if __name__ == "__main__":
+  size = 1024 * 1024
+  if len(sys.argv) > 1:
+    size = int(sys.argv[1])
+  grammar = GrammarDriver(rules)
+  source = generate_program(size)
+
+  tracemalloc.start()
+  p = Parser(Scanner(source), grammar)
+  p.parse()
+  assert(p.success)
+  (current, peak) = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  print("Source size:          " + format_size(len(source)))
+  print("Parse tree size:      %8.1f MB" % (current / (1024 * 1024)))
+  print("Peak during parsing:  %8.1f MB" % (peak / (1024 * 1024)))
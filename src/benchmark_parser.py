@@ -0,0 +1,33 @@
+#!/usr/bin/python3
+
+# Measures parser throughput (including scanning) in tokens per second for long
+# flat programs and for deeply nested programs.
+
+from benchmark_scanner import scan_all
+from benchmark_util import best_time, format_size, generate_nested_program, generate_program
+from grammar import GrammarDriver
+from grammar_rules import rules
+from parser import Parser
+from scanner import Scanner
+
+
+def parse(grammar, source):
+  p = Parser(Scanner(source), grammar)
+  p.parse()
+  assert(p.success)
+  return p.program
+
+
+def report(grammar, description, source):
+  tokens = scan_all(source)
+  seconds = best_time(lambda: parse(grammar, source))
+  print("%-24s %10d %10.3f %14.0f" % (description, tokens, seconds, tokens / seconds))
+
+
+if __name__ == "__main__":
+  grammar = GrammarDriver(rules)
+  print("%-24s %10s %10s %14s" % ("input", "tokens", "seconds", "tokens / s"))
+  for size in [10 * 1024, 100 * 1024, 1024 * 1024]:
+    report(grammar, "flat " + format_size(size), generate_program(size))
+  for depth in [100, 1000, 10000]:
+    report(grammar, "nested depth " + str(depth), generate_nested_program(depth))
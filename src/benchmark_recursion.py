@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+
+# Measures how the cost of a function call in the Interpreter depends on the
+# recursion depth, using a recursive sum, a pair of mutually recursive
+# functions and fibonacci.in from tests/. ExecutionMode.explicit_stack is also
+# run at depths which the other modes cannot reach.
+
+from benchmark_util import best_time
+from grammar import GrammarDriver
+from grammar_rules import rules
+from interpreter import ExecutionMode, Interpreter
+
+import os
+import sys
+
+TESTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests")
+
+SUM_PROGRAM = """function sum(n) {
+  if (n == 0) {
+    return 0;
+  }
+  return n + sum(n - 1);
+}
+print(sum(%(depth)d));
+"""
+
+MUTUAL_RECURSION_PROGRAM = """function is_even(n) {
+  if (n == 0) {
+    return 1;
+  }
+  return is_odd(n - 1);
+}
+function is_odd(n) {
+  if (n == 0) {
+    return 0;
+  }
+  return is_even(n - 1);
+}
+print(is_even(%(depth)d));
+"""
+
+DEPTHS = [500, 2000, 8000]
+
+# Only for ExecutionMode.explicit_stack, with the default recursion limit.
+DEEP_DEPTHS = [100000, 1000000]
+
+
+if __name__ == "__main__":
+  grammar = GrammarDriver(rules)
+
+  # ExecutionMode.explicit_stack doesn't recurse in Python.
+  for (name, program) in [("sum", SUM_PROGRAM), ("mutual recursion", MUTUAL_RECURSION_PROGRAM)]:
+    for depth in DEEP_DEPTHS:
+      source = program % {"depth": depth}
+      t = best_time(lambda: Interpreter(grammar, source, ExecutionMode.explicit_stack).run(), 1)
+      print("%-18s %8d %11.1f us/call (%s)" % (name, depth, t / depth * 1000000, ExecutionMode.explicit_stack.name))
+  print()
+
+  # The other modes recurse in Python too.
+  sys.setrecursionlimit(100000)
+
+  print("%-18s %6s" % ("Program", "Depth") + "".join(["%20s" % mode.name for mode in ExecutionMode]))
+  for (name, program) in [("sum", SUM_PROGRAM), ("mutual recursion", MUTUAL_RECURSION_PROGRAM)]:
+    for depth in DEPTHS:
+      source = program % {"depth": depth}
+      times = [best_time(lambda: Interpreter(grammar, source, mode).run(), 3) for mode in ExecutionMode]
+      # Time per call, to show whether it depends on the depth.
+      print("%-18s %6d" % (name, depth) + "".join(["%11.1f us/call" % (t / depth * 1000000) for t in times]))
+
+  with open(os.path.join(TESTS_PATH, "fibonacci.in")) as f:
+    source = f.read()
+  times = [best_time(lambda: Interpreter(grammar, source, mode).run(), 5) for mode in ExecutionMode]
+  print("%-18s %6s" % ("fibonacci.in", "") + "".join(["%14.1f ms" % (t * 1000) for t in times]))
@@ -0,0 +1,34 @@
+#!/usr/bin/python3
+
+# Measures scanning time for growing inputs. The time per KB should stay
+# roughly constant, i.e., scanning time is linear in the input size.
+
+from benchmark_util import best_time, format_size, generate_program
+from scanner import Scanner, TokenType
+
+import sys
+
+def scan_all(source):
+  scanner = Scanner(source)
+  count = 0
+  while True:
+    token = scanner.nextToken()
+    count += 1
+    if token.token_type == TokenType.eos:
+      return count
+    assert(token.token_type != TokenType.invalid)
+
+
+if __name__ == "__main__":
+  sizes = [1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024]
+  if len(sys.argv) > 1:
+    sizes = [int(s) for s in sys.argv[1:]]
+
+  print("%10s %10s %12s %14s" % ("size", "tokens", "seconds", "us per KB"))
+  for size in sizes:
+    source = generate_program(size)
+    tokens = scan_all(source)
+    repeat = 3 if size <= 1024 * 1024 else 1
+    seconds = best_time(lambda: scan_all(source), repeat)
+    print("%10s %10d %12.4f %14.1f" % (format_size(size), tokens, seconds,
+                                      seconds * 1e6 / (len(source) / 1024)))
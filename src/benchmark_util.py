@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+
+# Helpers shared by the benchmark_*.py scripts.
+
+import time
+
+# A chunk of valid source code; every copy gets its own names so that the
+# generated programs also pass scope analysis.
+PROGRAM_CHUNK = """// Chunk %(n)d
+function f%(n)d(a, b) {
+  let c = a + b * 2;
+  if (c > 10) {
+    c = c - 1;
+  }
+  return c;
+}
+let v%(n)d = f%(n)d(1, 2);
+print("hello %(n)d");
+"""
+
+def generate_program(size):
+  # Returns a program which is roughly size characters long.
+  chunks = []
+  length = 0
+  n = 0
+  while length < size:
+    chunk = PROGRAM_CHUNK % {"n": n}
+    chunks.append(chunk)
+    length += len(chunk)
+    n += 1
+  return "".join(chunks)
+
+def generate_nested_program(depth):
+  # Returns a program with ifs, whiles and parenthesized expressions nested
+  # depth levels deep.
+  parts = ["let x = 0;\n"]
+  for i in range(depth):
+    if i % 2 == 0:
+      parts.append("if (x == 0) {\n")
+    else:
+      parts.append("while (x < 1) {\n")
+  parts.append("x = " + "(" * depth + "x + 1" + ")" * depth + ";\n")
+  parts.append("}\n" * depth)
+  parts.append("print(x);\n")
+  return "".join(parts)
+
+def best_time(f, repeat = 3):
+  # Runs f repeat times and returns the fastest wall time in seconds.
+  best = None
+  for i in range(repeat):
+    start = time.perf_counter()
+    f()
+    elapsed = time.perf_counter() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+def format_size(size):
+  if size >= 1024 * 1024:
+    return str(size // (1024 * 1024)) + " MB"
+  if size >= 1024:
+    return str(size // 1024) + " KB"
+  return str(size) + " B"
@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+
+# Caches the files built from a program (the assembly, the object file and the
+# executable) in a directory, so that compiling the same program again only
+# copies them. An entry is found by a hash of the source text and of a version
+# string, which should identify the compiler and the runtime build (see
+# compiler_version). The entries are directories named by the hash; the least
+# recently used ones are removed when the total size exceeds max_size.
+#
+# compile.sh uses the cache via the command line:
+#   compilation_cache.py fetch source_file build_path
+#   compilation_cache.py store source_file build_path
+# fetch exits with 0 if the files were copied into build_path. The cache is in
+# $COMPILATION_CACHE_DIR (by default ~/.cache/silly_little_compiler); setting
+# it to "" disables it.
+
+import hashlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+
+DEFAULT_COMPILATION_CACHE_SIZE = 256 * 1024 * 1024
+
+DEFAULT_COMPILATION_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "silly_little_compiler")
+
+# The files of an entry.
+CACHED_FILE_NAMES = ["temp.as", "temp.o", "a.out"]
+
+SRC_PATH = os.path.dirname(os.path.abspath(__file__))
+RUNTIME_PATH = os.path.join(SRC_PATH, "..", "runtime")
+
+IMPORT_PATTERN = re.compile(r"^(?:from\s+(\w+)\s+import|import\s+(\w+))", re.MULTILINE)
+
+
+# Returns a hash of the contents of the files, e.g., the compiler source files
+# or the runtime objects.
+def hash_files(paths):
+  h = hashlib.sha256()
+  for path in sorted(paths):
+    h.update(os.path.basename(path).encode("utf-8") + b"\0")
+    with open(path, "rb") as f:
+      h.update(hashlib.sha256(f.read()).digest())
+  return h.hexdigest()
+
+
+# Returns the paths of compiler.py and of the modules in src/ it imports,
+# directly or indirectly. Tests, benchmarks etc. are not included, so changing
+# them doesn't invalidate the cache.
+def compiler_source_files():
+  paths = []
+  modules = ["compiler"]
+  seen = set(modules)
+  while modules:
+    path = os.path.join(SRC_PATH, modules.pop() + ".py")
+    paths.append(path)
+    with open(path, "r") as f:
+      for match in IMPORT_PATTERN.finditer(f.read()):
+        module = match.group(1) or match.group(2)
+        if module not in seen and os.path.isfile(os.path.join(SRC_PATH, module + ".py")):
+          seen.add(module)
+          modules.append(module)
+  return sorted(paths)
+
+
+# Returns the paths of the files the runtime is built from.
+def runtime_source_files():
+  return sorted(os.path.join(RUNTIME_PATH, f) for f in os.listdir(RUNTIME_PATH)
+                if f == "Makefile" or f.endswith(".cpp") or f.endswith(".h"))
+
+
+# A version string for the current compiler and runtime.
+def compiler_version():
+  return hash_files(compiler_source_files() + runtime_source_files())
+
+
+class CompilationCache:
+  def __init__(self, directory, version, max_size = DEFAULT_COMPILATION_CACHE_SIZE):
+    self.directory = directory
+    self.version = version
+    self.max_size = max_size
+    self.hits = 0
+    self.misses = 0
+    self.stores = 0
+    self.evictions = 0
+    # The cache can be used by several threads.
+    self.__lock = threading.Lock()
+    os.makedirs(directory, exist_ok = True)
+
+  def key(self, source):
+    if isinstance(source, str):
+      source = source.encode("utf-8")
+    h = hashlib.sha256()
+    h.update(self.version.encode("utf-8") + b"\0")
+    h.update(source)
+    return h.hexdigest()
+
+  # Copies the cached files for key into build_path. Returns False if they're
+  # not in the cache.
+  def fetch(self, key, build_path):
+    entry_path = os.path.join(self.directory, key)
+    try:
+      for name in CACHED_FILE_NAMES:
+        shutil.copy2(os.path.join(entry_path, name), os.path.join(build_path, name))
+      # The modification time of the entry is its last use.
+      os.utime(entry_path)
+    except OSError:
+      # Not cached, or evicted by another process while copying.
+      with self.__lock:
+        self.misses += 1
+      return False
+    with self.__lock:
+      self.hits += 1
+    return True
+
+  # Copies the files built in build_path into the cache.
+  def store(self, key, build_path):
+    entry_path = os.path.join(self.directory, key)
+    # The entry is created under a temporary name and renamed, so that the
+    # other users of the cache never see partial entries.
+    temporary_path = tempfile.mkdtemp(prefix = ".store_", dir = self.directory)
+    for name in CACHED_FILE_NAMES:
+      shutil.copy2(os.path.join(build_path, name), os.path.join(temporary_path, name))
+    try:
+      os.rename(temporary_path, entry_path)
+    except OSError:
+      # Stored by somebody else meanwhile.
+      shutil.rmtree(temporary_path, ignore_errors = True)
+      return
+    with self.__lock:
+      self.stores += 1
+      self.__evict()
+
+  # Returns [(last use, size, path)] for the entries.
+  def __entries(self):
+    entries = []
+    for name in os.listdir(self.directory):
+      path = os.path.join(self.directory, name)
+      if name.startswith(".") or not os.path.isdir(path):
+        continue
+      try:
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        entries.append((os.path.getmtime(path), size, path))
+      except OSError:
+        # Evicted by another process.
+        pass
+    return entries
+
+  def __evict(self):
+    entries = sorted(self.__entries())
+    size = sum(entry[1] for entry in entries)
+    for (last_use, entry_size, path) in entries:
+      if size <= self.max_size:
+        break
+      shutil.rmtree(path, ignore_errors = True)
+      size -= entry_size
+      self.evictions += 1
+
+  def statistics(self):
+    entries = self.__entries()
+    return {"hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "size": sum(entry[1] for entry in entries),
+            "max_size": self.max_size}
+
+
+if __name__ == "__main__":
+  if len(sys.argv) != 4 or sys.argv[1] not in ["fetch", "store"]:
+    print("Usage: compilation_cache.py fetch|store source_file build_path")
+    exit(2)
+  (command, source_file_name, build_path) = sys.argv[1:]
+  directory = os.environ.get("COMPILATION_CACHE_DIR", DEFAULT_COMPILATION_CACHE_DIR)
+  if not directory:
+    exit(1 if command == "fetch" else 0)
+  try:
+    cache = CompilationCache(directory, compiler_version())
+    with open(source_file_name, "rb") as f:
+      key = cache.key(f.read())
+    if command == "fetch":
+      exit(0 if cache.fetch(key, build_path) else 1)
+    cache.store(key, build_path)
+  except OSError as e:
+    # The compilation doesn't fail because of the cache.
+    print("Compilation cache not used: " + str(e), file = sys.stderr)
+    exit(1 if command == "fetch" else 0)
+  exit(0)
@@ -1,4 +1,9 @@
 #!/bin/bash
 
 BASEDIR=$(dirname "$0")
-python3 $BASEDIR/compiler.py $1 > /tmp/temp.as && as -32 -ggstabs -o /tmp/temp.o /tmp/temp.as && make -C $BASEDIR/../runtime && g++ -m32 /tmp/temp.o $BASEDIR/../runtime/runtime.o $BASEDIR/../runtime/builtins.o $BASEDIR/../runtime/memory.o $BASEDIR/../runtime/stack_walk.o -o /tmp/a.out
+
+# If the same program was compiled before with the same compiler and runtime,
+# the files are copied from the compilation cache (see compilation_cache.py).
+python3 $BASEDIR/compilation_cache.py fetch $1 /tmp && exit 0
+
+python3 $BASEDIR/compiler.py $1 > /tmp/temp.as && as -32 -ggstabs -o /tmp/temp.o /tmp/temp.as && make -C $BASEDIR/../runtime && g++ -m32 /tmp/temp.o $BASEDIR/../runtime/runtime.o $BASEDIR/../runtime/builtins.o $BASEDIR/../runtime/memory.o $BASEDIR/../runtime/stack_walk.o -o /tmp/a.out && python3 $BASEDIR/compilation_cache.py store $1 /tmp
@@ -1,13 +1,14 @@
 #!/usr/bin/python3
 
 from cfg_creator import CfgCreator
+from constant_folder import ConstantFolder, used_string_table
 from constants import *
 from grammar import GrammarDriver
 from grammar_rules import rules
 from parser import Parser
 from medium_level_ir import MediumLevelIRCreator
 from pseudo_assembler import PseudoAssembler
-from scanner import Scanner
+from scanner import Scanner, map_source_file
 from scope_analyser import ScopeAnalyser
 from real_assembler import RealAssembler
 from util import *
@@ -16,8 +17,7 @@ from variable import Function, FunctionVariable
 import sys
 
 if __name__ == "__main__":
-  input_file = open(sys.argv[1], 'r')
-  source = input_file.read()
+  source = map_source_file(sys.argv[1])
   grammar = GrammarDriver(rules)
   scanner = Scanner(source)
   p = Parser(scanner, grammar)
@@ -41,6 +41,8 @@ if __name__ == "__main__":
   if not sa.success:
     raise sa.error
 
+  ConstantFolder(p.program).fold()
+
   cfgc = CfgCreator(p.program)
   cfgs = cfgc.create()
 
@@ -50,7 +52,7 @@ if __name__ == "__main__":
   # TODO: optimizations
 
   pa = PseudoAssembler()
-  pseudo_assembly = pa.create(medium_level_ir, scanner.string_table)
+  pseudo_assembly = pa.create(medium_level_ir, used_string_table(p.program))
 
   # TODO: optimizations
 
@@ -0,0 +1,250 @@
+#!/usr/bin/python3
+
+# Simplifies an analysed parse tree before it's run by the Interpreter or
+# compiled: arithmetic on constants is folded, additions of 0 and
+# multiplications and divisions by 1 are removed, ifs with a constant condition
+# are replaced by the branch which is taken (unless it declares functions), and
+# whiles with a constant false condition are removed.
+#
+# The Interpreter has unbounded ints and rounds divisions down, whereas the
+# native code has 31-bit ints which wrap around (and products only keep 30
+# bits) and rounds divisions towards zero. Only the operations whose result is
+# the same for both are folded. Expressions which might fail at run time are
+# not simplified away; e.g., "x - x" is not replaced by 0, since the variables
+# are not typed and the subtraction fails if x is not an int.
+#
+# Removing "* 1" also removes the wrap around of the native multiplication;
+# for ints which don't fit in 30 bits, the result is then the correct one.
+
+from constants import *
+from parse_tree import *
+from scanner import StringTable, Token, TokenType
+
+MIN_INT = -(1 << (31 - INT_TAG_SHIFT))
+MAX_INT = (1 << (31 - INT_TAG_SHIFT)) - 1
+
+# The range of products which the native multiplication gets right.
+MIN_PRODUCT = -(1 << (30 - INT_TAG_SHIFT))
+MAX_PRODUCT = (1 << (30 - INT_TAG_SHIFT)) - 1
+
+COMPARISONS = {TokenType.equals: lambda a, b: a == b,
+               TokenType.not_equals: lambda a, b: a != b,
+               TokenType.less_than: lambda a, b: a < b,
+               TokenType.less_or_equals: lambda a, b: a <= b,
+               TokenType.greater_than: lambda a, b: a > b,
+               TokenType.greater_or_equals: lambda a, b: a >= b}
+
+
+# Returns True if evaluating e produces an int (or fails in the same way, no
+# matter where it's used).
+def is_int_expression(e):
+  return isinstance(e, NumberExpression) or isinstance(e, AddExpression) or isinstance(e, MultiplyExpression)
+
+
+# Returns a StringTable with the strings the program uses. After folding, it
+# doesn't contain the strings which were only used in removed code.
+def used_string_table(program):
+  string_table = StringTable()
+  nodes = [program]
+  while nodes:
+    node = nodes.pop()
+    if isinstance(node, StringExpression):
+      string_table.addString(node.value)
+    # In reverse, so that the strings are in the order of the source.
+    nodes.extend(reversed(child_nodes(node)))
+  return string_table
+
+
+class ConstantFolder:
+  def __init__(self, program):
+    self.__program = program
+
+  def fold(self):
+    self.__program.statements = self.__foldStatements(self.__program.statements)
+
+  def __foldStatements(self, statements):
+    result = []
+    for s in statements:
+      result += self.__foldStatement(s)
+    return result
+
+  # Returns the statements which replace s.
+  def __foldStatement(self, s):
+    if isinstance(s, LetStatement):
+      s.expression = self.__foldExpression(s.expression)
+      return [s]
+
+    if isinstance(s, AssignmentStatement):
+      s.where = self.__foldExpression(s.where)
+      s.expression = self.__foldExpression(s.expression)
+      return [s]
+
+    if isinstance(s, FunctionCall):
+      return [self.__foldExpression(s)]
+
+    if isinstance(s, ReturnStatement):
+      if s.expression:
+        s.expression = self.__foldExpression(s.expression)
+      return [s]
+
+    if isinstance(s, FunctionStatement):
+      s.body = self.__foldStatements(s.body)
+      return [s]
+
+    if isinstance(s, IfStatement):
+      s.expression = self.__foldExpression(s.expression)
+      s.then_body = self.__foldStatements(s.then_body)
+      s.else_body = self.__foldStatements(s.else_body)
+      condition = self.__constantCondition(s.expression)
+      if condition is None:
+        return [s]
+      body = s.then_body if condition else s.else_body
+      # The variables of the branch already have their own slots, so the
+      # statements can be moved to the outer body. But function declarations
+      # are hoisted to the beginning of the body they're in, so moving them
+      # would create the functions earlier. Then the if stays, without the
+      # branch which is not taken.
+      if any(isinstance(statement, FunctionStatement) for statement in body):
+        if condition:
+          s.else_body = []
+        else:
+          s.then_body = []
+        return [s]
+      return body
+
+    if isinstance(s, WhileStatement):
+      s.expression = self.__foldExpression(s.expression)
+      s.body = self.__foldStatements(s.body)
+      if self.__constantCondition(s.expression) == False:
+        return []
+      return [s]
+
+    assert(False)
+
+  # Returns the value of a condition, or None if it's not constant.
+  def __constantCondition(self, e):
+    if not isinstance(e, BooleanExpression):
+      return None
+    [left, op, right] = e.items
+    if isinstance(left, NumberExpression) and isinstance(right, NumberExpression):
+      return COMPARISONS[op.token_type](left.value, right.value)
+    # Equal strings are the same string in the native code too.
+    if isinstance(left, StringExpression) and isinstance(right, StringExpression) and (op.token_type == TokenType.equals or op.token_type == TokenType.not_equals):
+      return COMPARISONS[op.token_type](left.value, right.value)
+    return None
+
+  def __foldExpression(self, e):
+    if isinstance(e, AddExpression):
+      return self.__foldAddExpression(e)
+
+    if isinstance(e, MultiplyExpression):
+      return self.__foldMultiplyExpression(e)
+
+    if isinstance(e, BooleanExpression):
+      e.items[0] = self.__foldExpression(e.items[0])
+      e.items[2] = self.__foldExpression(e.items[2])
+      return e
+
+    if isinstance(e, FunctionCall):
+      e.function = self.__foldExpression(e.function)
+      # Modified in place, since a NewExpression shares the list with its
+      # FunctionCall.
+      e.parameters[:] = [self.__foldExpression(p) for p in e.parameters]
+      return e
+
+    if isinstance(e, NewExpression):
+      e.parameters[:] = [self.__foldExpression(p) for p in e.parameters]
+      return e
+
+    if isinstance(e, ArrayIndexExpression):
+      e.array = self.__foldExpression(e.array)
+      e.index = self.__foldExpression(e.index)
+      return e
+
+    assert(isinstance(e, NumberExpression) or isinstance(e, StringExpression) or isinstance(e, VariableExpression))
+    return e
+
+  def __foldAddExpression(self, e):
+    items = [self.__foldExpression(item) if ix % 2 == 0 else item for (ix, item) in enumerate(e.items)]
+    # The constant terms are summed up, and the sum is added after the other
+    # terms; additions and subtractions wrap around in the same way in any
+    # order.
+    constant = items[0].value if isinstance(items[0], NumberExpression) else 0
+    # (operator token, term) for the non-constant terms. The first term has no
+    # operator.
+    terms = [] if isinstance(items[0], NumberExpression) else [(None, items[0])]
+    for ix in range(1, len(items), 2):
+      (op, term) = (items[ix], items[ix + 1])
+      if isinstance(term, NumberExpression):
+        if op.token_type == TokenType.plus:
+          constant += term.value
+        else:
+          constant -= term.value
+      else:
+        terms.append((op, term))
+
+    if constant < MIN_INT or constant > MAX_INT:
+      return AddExpression(items, e.pos)
+
+    if not terms:
+      return NumberExpression(constant, e.pos)
+
+    if terms[0][0] is None or terms[0][0].token_type == TokenType.plus:
+      new_items = [terms[0][1]]
+      for (op, term) in terms[1:]:
+        new_items += [op, term]
+      if constant > 0:
+        new_items += [Token(TokenType.plus), NumberExpression(constant, e.pos)]
+      elif constant < 0:
+        new_items += [Token(TokenType.minus), NumberExpression(-constant, e.pos)]
+    else:
+      # All the terms are subtracted, so the constant stays first.
+      new_items = [NumberExpression(constant, e.pos)]
+      for (op, term) in terms:
+        new_items += [op, term]
+
+    if len(new_items) == 1:
+      if is_int_expression(new_items[0]):
+        return new_items[0]
+      # The addition checks that the term is an int.
+      return AddExpression(items, e.pos)
+    return AddExpression(new_items, e.pos)
+
+  def __foldMultiplyExpression(self, e):
+    items = [self.__foldExpression(item) if ix % 2 == 0 else item for (ix, item) in enumerate(e.items)]
+    # Multiplications and divisions don't commute with each other, so only the
+    # constants in the beginning are folded.
+    ix = 1
+    if isinstance(items[0], NumberExpression):
+      value = items[0].value
+      while ix < len(items) and isinstance(items[ix + 1], NumberExpression):
+        other = items[ix + 1].value
+        if items[ix].token_type == TokenType.multiplication:
+          result = value * other
+          if result < MIN_PRODUCT or result > MAX_PRODUCT:
+            break
+        else:
+          # The Interpreter rounds down and the native code towards zero.
+          if other == 0 or (value % other != 0 and (value < 0) != (other < 0)):
+            break
+          result = value // other
+          if result > MAX_INT:
+            break
+        value = result
+        ix += 2
+      items = [NumberExpression(value, e.pos)] + items[ix:]
+
+    # Multiplying or dividing by 1 doesn't change the value.
+    new_items = [items[0]]
+    for ix in range(1, len(items), 2):
+      if not (isinstance(items[ix + 1], NumberExpression) and items[ix + 1].value == 1):
+        new_items += [items[ix], items[ix + 1]]
+    if len(new_items) > 1 and isinstance(new_items[0], NumberExpression) and new_items[0].value == 1 and new_items[1].token_type == TokenType.multiplication:
+      new_items = new_items[2:]
+
+    if len(new_items) == 1:
+      if is_int_expression(new_items[0]):
+        return new_items[0]
+      # The multiplication checks that the term is an int.
+      return MultiplyExpression(items, e.pos)
+    return MultiplyExpression(new_items, e.pos)
@@ -6,6 +6,8 @@ from util import list_to_string, print_debug
 class SyntaxError(Exception):
   def __init__(self, pos = None, message = None):
     super().__init__(message + " (position " + str(pos) + ")")
+    self.message = message
+    self.pos = pos
 
 
 class GrammarRule:
@@ -31,84 +33,123 @@ class GrammarDriver:
         if GrammarDriver.__isToken(item):
           finals.add(item)
 
-    self.nonfinals = list(nonfinals)
-    self.finals = list(finals)
+    # Sorted, so that the symbol ids are deterministic.
+    self.nonfinals = sorted(nonfinals)
+    self.finals = sorted(finals)
 
     # print ("nonfinals" + str(self.nonfinals))
     # print ("finals" + str(self.finals))
 
+    self.__computeTables()
+    self.__buildPredictionTable()
+
+  def __computeTables(self):
+    self.__computeEpsilon()
+    self.__computeFirst()
+    self.__computeFollow()
+    self.__computePredictions()
+
+  # The EPS, FIRST and FOLLOW computations are worklist based: a symbol is
+  # (re)visited only when what we know about it has changed, and then only the
+  # rules which depend on it are updated.
+
+  def __computeEpsilon(self):
     self.canBeEpsilon = defaultdict(bool)
-    for nf in self.nonfinals:
-      if self.__hasEpsilonRule(nf):
-        self.canBeEpsilon[nf] = True
     self.canBeEpsilon["epsilon"] = True
 
-    self.first = defaultdict(set)
-    self.follow = defaultdict(set)
+    # For each production, how many of its symbols are not yet known to be able
+    # to be epsilon, and for each symbol, which productions it occurs in.
+    productions = []
+    occurrences = defaultdict(list)
+    for item in self.nonfinals:
+      for (production, rule) in self.rules[item]:
+        for rhsItem in production:
+          occurrences[rhsItem].append(len(productions))
+        productions.append([item, len(production)])
+
+    worklist = ["epsilon"]
+    while worklist:
+      symbol = worklist.pop()
+      for ix in occurrences[symbol]:
+        productions[ix][1] -= 1
+        # A -> B1 B2 .. Bn, if all B's can be epsilon, A can be epsilon.
+        item = productions[ix][0]
+        if productions[ix][1] == 0 and not self.canBeEpsilon[item]:
+          self.canBeEpsilon[item] = True
+          worklist.append(item)
+
+  # Propagates sets along the edges in dependents (sets[x] subset_of
+  # sets[y] for each y in dependents[x]), starting from the symbols in
+  # worklist. Only the elements added since a symbol was last visited are
+  # propagated from it, so each element crosses each edge at most once.
+  @staticmethod
+  def __propagate(sets, dependents, worklist):
+    pending = {symbol: set(sets[symbol]) for symbol in worklist}
+    worklist = list(pending)
+    while worklist:
+      symbol = worklist.pop()
+      added = pending.pop(symbol)
+      for dependent in dependents[symbol]:
+        new = added - sets[dependent]
+        if new:
+          sets[dependent] |= new
+          if dependent in pending:
+            pending[dependent] |= new
+          else:
+            pending[dependent] = new
+            worklist.append(dependent)
 
+  def __computeFirst(self):
+    self.first = defaultdict(set)
     for f in self.finals:
       self.first[f].add(f)
 
-    # Compute FIRST and EPS
-    didSomething = True
-    while didSomething:
-      didSomething = False
-      for item in self.rules:
-        productions = self.rules[item]
-        for (production, rule) in productions:
-          # print("handling " + str(item) + " -> " + str(production))
-          if production[0] == "epsilon":
+    # A -> B1 B2 .. Bn C, if all B's can be epsilon, first(B1) .. first(Bn) and
+    # first(C) are subsets of first(A).
+    dependents = defaultdict(set)
+    for item in self.nonfinals:
+      for (production, rule) in self.rules[item]:
+        for rhsItem in production:
+          dependents[rhsItem].add(item)
+          if not self.canBeEpsilon[rhsItem]:
+            break
+
+    GrammarDriver.__propagate(self.first, dependents, list(self.finals))
+
+  def __computeFollow(self):
+    self.follow = defaultdict(set)
+
+    # Only the FOLLOW sets of the nonfinals are needed (for PREDICT), so the
+    # finals and epsilon are skipped; otherwise e.g. follow(epsilon) would
+    # collect the tokens following every nonfinal which can be epsilon.
+    nonfinals = set(self.nonfinals)
+
+    # A -> B C D, follow(A) subset_of follow(D), and if D can be epsilon,
+    # follow(A) subset_of follow(C) etc.
+    dependents = defaultdict(set)
+    for item in self.nonfinals:
+      for (production, rule) in self.rules[item]:
+        # A -> B C D, first(C) subset_of follow(B), and first(D) subset_of
+        # follow(C). If C can be epsilon, then first(D) subset_of follow(B).
+        for i in range(len(production) - 1):
+          if production[i] not in nonfinals:
             continue
-          # A -> B C, first(B) subset_of first(A)
-          if GrammarDriver.__addSetToSet(self.first[item], self.first[production[0]]):
-            # print("A -> B C, first(B) subset_of first(A)")
-            # print("first of " + str(item) + " += " + str(self.first[production[0]]))
-            didSomething = True
-
-          # A -> B1 B2 .. Bn C, if all B's can be epsilon, first(C) subset_of first(A)
-          firstDefNonEpsilon = None
-          for rhsItem in production:
-            if not self.canBeEpsilon[rhsItem]:
-              firstDefNonEpsilon = rhsItem
-              break
-          if firstDefNonEpsilon:
-            if GrammarDriver.__addSetToSet(self.first[item], self.first[firstDefNonEpsilon]):
-              didSomething = True
-          else:
-            if not self.canBeEpsilon[item]:
-              self.canBeEpsilon[item] = True
-              didSomething = True
-
-
-    # Compute FOLLOW
-    didSomething = True
-    while didSomething:
-      didSomething = False
-      for item in self.rules:
-        productions = self.rules[item]
-        for (production, rule) in productions:
-          #print("Processing: " + str(item) + " -> " + str(production))
-          # A -> B C D, first(C) subset_of follow(B), and first(D) subset_of follow(C)
-          for i in range(len(production) - 1):
-            whatToAdd = i + 1
-            while whatToAdd < len(production):
-              if GrammarDriver.__addSetToSet(self.follow[production[i]],
-                                             self.first[production[whatToAdd]]):
-                didSomething = True
-              # If C can be epsilon, then first(D) subset_of follow(B)
-              if self.canBeEpsilon[production[whatToAdd]]:
-                whatToAdd += 1
-              else:
-                break
-
-          # A -> B C D, follow(A) subset_of follow(D)
-          for i in reversed(range(len(production))):
-            if GrammarDriver.__addSetToSet(self.follow[production[i]], self.follow[item]):
-              didSomething = True
-            # If D can be epsilon, then follow(A) subset_of follow(C)
-            if not self.canBeEpsilon[production[i]]:
+          follow = self.follow[production[i]]
+          for whatToAdd in range(i + 1, len(production)):
+            follow |= self.first[production[whatToAdd]]
+            if not self.canBeEpsilon[production[whatToAdd]]:
               break
 
+        for rhsItem in reversed(production):
+          if rhsItem in nonfinals:
+            dependents[item].add(rhsItem)
+          if not self.canBeEpsilon[rhsItem]:
+            break
+
+    GrammarDriver.__propagate(self.follow, dependents,
+                              [item for item in self.follow if self.follow[item]])
+
+  def __computePredictions(self):
     # Compute PREDICT
     self.predictions = defaultdict(defaultdict)
     self.success = True
@@ -122,15 +163,15 @@ class GrammarDriver:
         # A -> B C, predict to use this rule if the symbol in first(B) or if B can be epsilon and the symbol in first(C), or if all can be epsilon and symbol in follow(A).
         for i in range(len(production)):
           # print_debug("Case 1: adding to predictSet: " + str(self.first[production[i]]))
-          GrammarDriver.__addSetToSet(predictSet, self.first[production[i]])
+          predictSet |= self.first[production[i]]
           if not self.canBeEpsilon[production[i]]:
             break
           if i < len(production) - 1:
             # print_debug("Case 2: adding to predictSet: " + str(self.first[production[i]]))
-            GrammarDriver.__addSetToSet(predictSet, self.first[production[i + 1]])
+            predictSet |= self.first[production[i + 1]]
           else: # all can be epsilon
             # print_debug("Case 3: adding to predictSet: " + str(self.first[production[i]]))
-            GrammarDriver.__addSetToSet(predictSet, self.follow[item])
+            predictSet |= self.follow[item]
         for f in predictSet:
           if f in self.predictions[item]:
             print_debug("Going to fail; rule " + str(item) + " -> " + str(production))
@@ -156,6 +197,32 @@ class GrammarDriver:
     assert(self.success)
     # print("success: " + str(self.success))
 
+  def __buildPredictionTable(self):
+    # Intern the symbols to small integers: first the finals, then the
+    # nonfinals, then epsilon. The id right after the finals
+    # (unknown_final_id) is used for tokens which don't occur in the grammar.
+    self.symbol_names = self.finals + self.nonfinals + ["epsilon"]
+    self.symbol_ids = {name: ix for (ix, name) in enumerate(self.symbol_names)}
+    self.final_count = len(self.finals)
+    self.unknown_final_id = self.final_count
+    self.epsilon_id = self.symbol_ids["epsilon"]
+
+    # prediction_table[symbol id * prediction_stride + final id] is (production
+    # as ids in reverse order, rule); symbols which can't be predicted with the
+    # final are not in the table. The productions are reversed because that's
+    # the order in which the parser pushes them. The table is a dict instead of
+    # a nonfinals x finals matrix, since that would grow quadratically with
+    # the grammar while most of it is empty.
+    self.prediction_stride = self.final_count + 1
+    self.prediction_table = dict()
+    for item in self.predictions:
+      base = self.symbol_ids[item] * self.prediction_stride
+      for f, (production, rule) in self.predictions[item].items():
+        self.prediction_table[base + self.symbol_ids[f]] = ([self.symbol_ids[i] for i in reversed(production)], rule)
+
+  def finalId(self, name):
+    return self.symbol_ids.get(name, self.unknown_final_id)
+
   def predict(self, top_of_stack, token):
     if top_of_stack not in self.predictions or token not in self.predictions[top_of_stack]:
       raise SyntaxError(None, "Grammar error: top of stack is " + str(top_of_stack) + ", token is: " + str(token))
@@ -164,24 +231,3 @@ class GrammarDriver:
   @staticmethod
   def __isToken(item):
     return item.find("token_") == 0
-
-  def __hasEpsilonRule(self, item):
-    for (rhs, rule) in self.rules[item]:
-      if rhs == ["epsilon"]:
-        return True
-    return False
-
-  @staticmethod
-  def __addToSet(s, item):
-    if item in s:
-      return False
-    s.add(item)
-    return True
-
-  def __addSetToSet(s1, s2):
-    added_something = False
-    for item in s2:
-      if not item in s1:
-        added_something = True
-      s1.add(item)
-    return added_something
@@ -4,10 +4,12 @@
 
 from grammar import GrammarDriver, GrammarRule, SyntaxError
 from parse_tree import *
-from ttypes import any_type, identifier_to_type, dispatch_type_template, TypeList, TypeListContinuation, FunctionType
+from ttypes import any_type, identifier_to_type, dispatch_type_template, TypeList, FunctionType
 from util import *
 
 class Gatherer:
+  __slots__ = ("__name", "__ix", "__mask", "__gathered", "__ctor", "__pos")
+
   def __init__(self, name, mask, ctor):
     self.__name = name
     self.__ix = 0
@@ -16,6 +18,11 @@ class Gatherer:
     self.__ctor = ctor
     self.__pos = None
 
+  # The parser calls this when it creates the Gatherer, with the position of
+  # the first token of the construct.
+  def setPos(self, pos):
+    self.__pos = pos
+
   def add(self, item, pos):
     if self.__mask[self.__ix]:
       self.__gathered.append(item)
@@ -34,59 +41,62 @@ class Gatherer:
 
 
 just_route = lambda: Gatherer("JustRoute", [True], lambda items, pos: items[0])
-flatten = lambda n: lambda: Gatherer("Flatten", [True] * n, flatten_items)
+
+# Right-recursive rules (lists and continuations) don't create temporary
+# objects or copy lists at every level. Instead, they produce linked tuples
+# (item, rest), which are turned into a list once the whole list has been
+# parsed.
+link = lambda: Gatherer("Link", [True, True], lambda items, pos: (items[0], items[1]))
+
+def linked_to_list(linked):
+  result = []
+  while linked is not None:
+    (item, linked) = linked
+    result.append(item)
+  return result
+
+# add_term_tail and mul_term_tail: (operator, (operand, rest)).
+link_operation = lambda: Gatherer("LinkOperation", [True, True, True],
+                                  lambda items, pos: (items[0], (items[1], items[2])))
 
 def add_expr_from_items(items, pos):
   if items[1]:
-    return AddExpression(flatten_items(items), pos)
+    return AddExpression([items[0]] + linked_to_list(items[1]), pos)
   return items[0]
 
 def mul_expr_from_items(items, pos):
   if items[1]:
-    return MultiplyExpression(flatten_items(items), pos)
+    return MultiplyExpression([items[0]] + linked_to_list(items[1]), pos)
   return items[0]
 
-def flatten_items(items, pos = None):
-  new_items = []
-  for i in items:
-    if isinstance(i, list):
-      new_items += i
-    elif i:
-      new_items += [i]
-  return new_items
-
 def dispatch_assignment_continuation(items, pos):
   assert(len(items) == 2)
-  if isinstance(items[1], AssignmentStatementContinuation):
-    return AssignmentStatement([items[0], items[1].expression], pos)
-  assert(items[1] is None)
+  # The continuation is either the assigned expression or None.
+  if items[1] is not None:
+    return AssignmentStatement([items[0], items[1]], pos)
   return items[0]
 
+# array_or_function_call_continuation: (is_function_call, index or parameters,
+# rest).
 def dispatch_array_index_or_function_call(items, pos):
   assert(len(items) == 2)
-
-  def to_expression(item, pos):
-    if isinstance(item, ArrayIndexExpression) or isinstance(item, FunctionCall):
-      return item
-    return VariableExpression(item.value, pos)
-
-  if items[1] is None:
-    return to_expression(items[0], pos)
-
-  if isinstance(items[1], ArrayIndexContinuation):
-    return dispatch_array_index_or_function_call([ArrayIndexExpression(to_expression(items[0], pos), items[1].index_expression, pos), items[1].continuation], pos)
-  elif isinstance(items[1], FunctionCallContinuation):
-    return dispatch_array_index_or_function_call([FunctionCall(to_expression(items[0], pos), items[1].call_expression, pos), items[1].continuation], pos)
-  else:
-    assert(False)
+  expression = VariableExpression(items[0].value, pos)
+  continuation = items[1]
+  while continuation is not None:
+    (is_function_call, item, continuation) = continuation
+    if is_function_call:
+      expression = FunctionCall(expression, item, pos)
+    else:
+      expression = ArrayIndexExpression(expression, item, pos)
+  return expression
 
 
 rules = [
     GrammarRule("program", ["statement_list", "token_eos"],
                 lambda: Gatherer("ProgramGatherer",
-                                 [True, False], lambda items, pos: Program(items, pos))),
+                                 [True, False], lambda items, pos: Program([linked_to_list(items[0])], pos))),
     GrammarRule("statement_list", ["epsilon"], None),
-    GrammarRule("statement_list", ["statement", "statement_list"], flatten(2)),
+    GrammarRule("statement_list", ["statement", "statement_list"], link),
 
     GrammarRule("statement",
                 ["identifier_or_array_or_function_call", "assignment_continuation"],
@@ -96,7 +106,7 @@ rules = [
                 ["token_assign", "expression", "token_semicolon"],
                 lambda: Gatherer("AssignmentStatementContinuationGatherer",
                                  [False, True, False],
-                                 lambda items, pos: AssignmentStatementContinuation(items, pos))),
+                                 lambda items, pos: items[0])),
 
     GrammarRule("assignment_continuation", ["token_semicolon"], lambda: Gatherer("None", [False], lambda items, pos: None)),
 
@@ -113,7 +123,7 @@ rules = [
                  "token_left_curly", "statement_list", "token_right_curly"],
                 lambda: Gatherer("FunctionStatementGatherer",
                                  [False, True, False, True, False, True, False, True, False],
-                                 lambda items, pos: FunctionStatement(items, pos))),
+                                 lambda items, pos: FunctionStatement(items[:3] + [linked_to_list(items[3])], pos))),
 
     GrammarRule("statement",
                 ["token_keyword_return", "expression_or_none", "token_semicolon"],
@@ -140,11 +150,11 @@ rules = [
     GrammarRule("type_list", ["epsilon"], None),
     GrammarRule("type_list", ["type", "type_list_continuation"],
                 lambda: Gatherer("TypeListGatherer", [True, True],
-                                 lambda items, pos: TypeList(items))),
+                                 lambda items, pos: TypeList(linked_to_list((items[0], items[1]))))),
     GrammarRule("type_list_continuation", ["epsilon"], None),
     GrammarRule("type_list_continuation", ["token_comma", "type", "type_list_continuation"],
                 lambda: Gatherer("TypeListContinuationGatherer", [False, True, True],
-                                 lambda items, pos: TypeListContinuation(items))),
+                                 lambda items, pos: (items[0], items[1]))),
 
     GrammarRule("expression_or_none", ["epsilon"], None),
     GrammarRule("expression_or_none", ["expression"], just_route),
@@ -153,38 +163,38 @@ rules = [
     GrammarRule("formal_parameter_list",
                 ["token_identifier", "maybe_type", "formal_parameter_list_continuation"],
                 lambda: Gatherer("FormalParameterStartGatherer", [True, True, True],
-                                 lambda items, pos: FormalParameterList(items, pos))),
+                                 lambda items, pos: FormalParameterList(linked_to_list((FormalParameter(items[0], items[1], pos), items[2])), pos))),
     GrammarRule("formal_parameter_list_continuation", ["epsilon"], None),
     GrammarRule("formal_parameter_list_continuation",
                 ["token_comma", "token_identifier", "maybe_type", "formal_parameter_list_continuation"],
                 lambda: Gatherer("FormalParameterListContinuationGatherer", [False, True, True, True],
-                                 lambda items, pos: FormalParameterListContinuation(items, pos))),
+                                 lambda items, pos: (FormalParameter(items[0], items[1], pos), items[2]))),
 
     GrammarRule("statement",
                 ["token_keyword_if", "token_left_paren", "bool_expression", "token_right_paren",
                  "token_left_curly", "statement_list", "token_right_curly", "maybe_else_if"],
                 lambda: Gatherer("IfStatementGatherer",
                                  [False, False, True, False, False, True, False, True],
-                                 lambda items, pos: IfStatement(items, pos))),
+                                 lambda items, pos: IfStatement([items[0], linked_to_list(items[1]), items[2]], pos))),
     GrammarRule("maybe_else_if", ["token_keyword_else", "maybe_else_if_continuation"], lambda: Gatherer("ElseStatementGatherer", [False, True], lambda items, pos: items[0])),
     GrammarRule("maybe_else_if", ["epsilon"], None),
 
     GrammarRule("maybe_else_if_continuation",
                 ["token_keyword_if", "token_left_paren", "bool_expression", "token_right_paren", "token_left_curly", "statement_list", "token_right_curly", "maybe_else_if"],
-                lambda: Gatherer("ElseIfStatementTempGatherer",
+                lambda: Gatherer("ElseIfStatementGatherer",
                                  [False, False, True, False, False, True, False, True],
-                                 lambda items, pos: ElseIfStatementTemp(items, pos))),
+                                 lambda items, pos: [IfStatement([items[0], linked_to_list(items[1]), items[2]], pos)])),
     GrammarRule("maybe_else_if_continuation",
                 ["token_left_curly", "statement_list", "token_right_curly"],
-                lambda: Gatherer("ElseStatementTempGatherer",
+                lambda: Gatherer("ElseStatementGatherer",
                                  [False, True, False],
-                                 lambda items, pos: ElseStatementTemp(items, pos))),
+                                 lambda items, pos: linked_to_list(items[0]))),
     GrammarRule("statement",
                 ["token_keyword_while", "token_left_paren", "bool_expression", "token_right_paren",
                  "token_left_curly", "statement_list", "token_right_curly"],
                 lambda: Gatherer("IfStatementGatherer",
                                  [False, False, True, False, False, True, False],
-                                 lambda items, pos: WhileStatement(items, pos))),
+                                 lambda items, pos: WhileStatement([items[0], linked_to_list(items[1])], pos))),
     GrammarRule("bool_expression", ["expression", "bool_op", "expression"],
                 lambda: Gatherer("BooleanExpressionGatherer",
                                  [True, True, True],
@@ -198,11 +208,11 @@ rules = [
                                  [True, True], add_expr_from_items)),
 
     GrammarRule("add_term_tail", ["epsilon"], None),
-    GrammarRule("add_term_tail", ["add_op", "add_term", "add_term_tail"], flatten(3)),
+    GrammarRule("add_term_tail", ["add_op", "add_term", "add_term_tail"], link_operation),
     GrammarRule("add_term", ["mul_term", "mul_term_tail"],
                 lambda: Gatherer("AddTermGatherer", [True, True], mul_expr_from_items)),
     GrammarRule("mul_term_tail", ["epsilon"], None),
-    GrammarRule("mul_term_tail", ["mul_op", "mul_term", "mul_term_tail"], flatten(3)),
+    GrammarRule("mul_term_tail", ["mul_op", "mul_term", "mul_term_tail"], link_operation),
     GrammarRule("mul_term", ["token_number"],
                 lambda: Gatherer("NumberExpression", [True],
                                  lambda items, pos: NumberExpression(items[0].value, pos))),
@@ -212,10 +222,11 @@ rules = [
     GrammarRule("mul_term", ["identifier_or_array_or_function_call"], just_route),
 
     GrammarRule("parameter_list", ["epsilon"], None),
-    GrammarRule("parameter_list", ["expression", "parameter_list_continuation"], flatten(2)),
+    GrammarRule("parameter_list", ["expression", "parameter_list_continuation"],
+                lambda: Gatherer("ParameterListGatherer", [True, True], lambda items, pos: linked_to_list((items[0], items[1])))),
     GrammarRule("parameter_list_continuation", ["epsilon"], None),
     GrammarRule("parameter_list_continuation", ["token_comma", "expression", "parameter_list_continuation"],
-                lambda: Gatherer("ParameterListContinuationGatherer", [False, True, True], lambda items, pos: flatten_items(items))),
+                lambda: Gatherer("ParameterListContinuationGatherer", [False, True, True], lambda items, pos: (items[0], items[1]))),
 
     GrammarRule("mul_term", ["token_left_paren", "expression", "token_right_paren"],
                 lambda: Gatherer("JustRoute", [False, True, False],
@@ -233,6 +244,6 @@ rules = [
 
     GrammarRule("identifier_or_array_or_function_call", ["token_identifier", "array_or_function_call_continuation"], lambda: Gatherer("ArrayIndexOrFunctionCall", [True, True], dispatch_array_index_or_function_call)),
     GrammarRule("array_or_function_call_continuation", ["epsilon"], None),
-    GrammarRule("array_or_function_call_continuation", ["token_left_bracket", "expression", "token_right_bracket", "array_or_function_call_continuation"], lambda: Gatherer("ArrayIndex", [False, True, False, True], lambda items, pos: ArrayIndexContinuation(items, pos))),
-    GrammarRule("array_or_function_call_continuation", ["token_left_paren", "parameter_list", "token_right_paren", "array_or_function_call_continuation"], lambda: Gatherer("FunctionCall", [False, True, False, True], lambda items, pos: FunctionCallContinuation(items, pos))),
+    GrammarRule("array_or_function_call_continuation", ["token_left_bracket", "expression", "token_right_bracket", "array_or_function_call_continuation"], lambda: Gatherer("ArrayIndex", [False, True, False, True], lambda items, pos: (False, items[0], items[1]))),
+    GrammarRule("array_or_function_call_continuation", ["token_left_paren", "parameter_list", "token_right_paren", "array_or_function_call_continuation"], lambda: Gatherer("FunctionCall", [False, True, False, True], lambda items, pos: (True, items[0], items[1]))),
 ]
@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+
+# Incremental front end: after a text edit, only the top-level statements
+# touched by the edit are scanned and parsed again. The parse trees of the
+# other top-level statements are reused, and the scope analysis is rerun for
+# the whole program. Since the parse trees are reused, the previous Program
+# must not be used after an update.
+
+from constants import *
+from parse_tree import FunctionStatement, IfStatement, Program, WhileStatement, child_nodes
+from parser import Parser
+from scanner import Scanner
+from scope_analyser import ScopeAnalyser
+from variable import Function, FunctionVariable
+
+import bisect
+
+
+class TextEdit:
+  # Replaces source[start:end] with text.
+  def __init__(self, start, end, text):
+    assert(0 <= start and start <= end)
+    self.start = start
+    self.end = end
+    self.text = text
+
+  def apply(self, source):
+    return source[:self.start] + self.text + source[self.end:]
+
+
+def shift_positions(statement, delta):
+  visited = set()
+  nodes = [statement]
+  while len(nodes):
+    node = nodes.pop()
+    if node in visited:
+      continue
+    visited.add(node)
+    node.pos += delta
+    nodes.extend(child_nodes(node))
+
+
+def forget_scopes(statement):
+  # Forgets the scopes created by the previous scope analysis, so that the
+  # statement can be analysed again. Only statements have scopes, so
+  # expressions don't need to be visited.
+  statements = [statement]
+  while len(statements):
+    s = statements.pop()
+    if isinstance(s, IfStatement):
+      s.if_scope = None
+      s.else_scope = None
+      statements.extend(s.then_body)
+      statements.extend(s.else_body)
+    elif isinstance(s, WhileStatement):
+      s.scope = None
+      statements.extend(s.body)
+    elif isinstance(s, FunctionStatement):
+      statements.extend(s.body)
+
+
+class IncrementalFrontEnd:
+  def __init__(self, grammar, builtins):
+    self.__grammar = grammar
+    self.__builtins = builtins
+    self.source = None
+    # The results of the latest successful parse + analysis.
+    self.program = None
+    self.top_scope = None
+    # How many top-level statements the latest parse reparsed and reused.
+    self.reparsed_statement_count = 0
+    self.reused_statement_count = 0
+
+  def parse(self, source):
+    # Parses the whole source. Raises SyntaxError or ScopeError.
+    self.source = source
+    self.program = None
+    p = Parser(Scanner(source), self.__grammar)
+    p.parse()
+    if not p.success:
+      raise p.error
+    self.__analyse(p.program.statements)
+    self.reparsed_statement_count = len(self.program.statements)
+    self.reused_statement_count = 0
+    return self.program
+
+  def update(self, edit):
+    # Applies the edit to the source and parses the result, reusing the parse
+    # trees of the top-level statements the edit doesn't touch. Raises
+    # SyntaxError or ScopeError; the next update after an error parses
+    # everything again.
+    old_source = self.source
+    new_source = edit.apply(old_source)
+    if self.program is None or len(self.program.statements) == 0:
+      return self.parse(new_source)
+
+    # Top-level statement i covers the source from its start to the start of
+    # the next statement. The first one also covers everything before it.
+    # Statements which touch the edit, including at the edges, are parsed
+    # again.
+    statements = self.program.statements
+    starts = [s.pos for s in statements]
+    starts[0] = 0
+    first = max(bisect.bisect_left(starts, edit.start) - 1, 0)
+    last = max(bisect.bisect_right(starts, edit.end) - 1, 0)
+
+    delta = len(edit.text) - (edit.end - edit.start)
+    region_start = starts[first]
+    if last + 1 < len(statements):
+      region_end = starts[last + 1] + delta
+    else:
+      region_end = len(new_source)
+
+    # If the last line of the region contains a comment, it might now continue
+    # over the region end. Be conservative and parse everything.
+    line_start = max(new_source.rfind("\n", region_start, region_end) + 1, region_start)
+    if region_end < len(new_source) and new_source.find("//", line_start, region_end) != -1:
+      return self.parse(new_source)
+
+    p = Parser(Scanner(new_source, region_start, region_end), self.__grammar)
+    p.parse()
+    if not p.success:
+      # The edit might make sense together with the statements around it
+      # (e.g., it opens a block), so try parsing everything.
+      return self.parse(new_source)
+
+    self.source = new_source
+    self.program = None
+    for s in statements[:first]:
+      forget_scopes(s)
+    for s in statements[last + 1:]:
+      forget_scopes(s)
+      if delta != 0:
+        shift_positions(s, delta)
+    new_statements = statements[:first] + p.program.statements + statements[last + 1:]
+    self.__analyse(new_statements)
+    self.reparsed_statement_count = len(p.program.statements)
+    self.reused_statement_count = len(statements) - (last + 1 - first)
+    return self.program
+
+  def __analyse(self, statements):
+    program = Program([statements], 0)
+    main_variable = FunctionVariable(MAIN_NAME, MAIN_NAME, None, None)
+    program.main_function = Function(main_variable)
+    program.main_function.name = MAIN_NAME
+    program.main_function.unique_name = MAIN_NAME
+
+    sa = ScopeAnalyser(program)
+    for b in self.__builtins:
+      sa.builtins.add(b)
+    sa.analyse()
+    if not sa.success:
+      raise sa.error
+
+    self.program = program
+    self.top_scope = sa.top_scope
@@ -1,20 +1,32 @@
 #!/usr/bin/python3
 
+from constant_folder import ConstantFolder
 from constants import *
 from grammar import GrammarDriver
 from grammar_rules import rules
+from memoizer import Memoizer, NOT_MEMOIZED
 from parse_tree import *
 from parser import Parser
-from scanner import Scanner, TokenType
+from profiler import Profiler
+from scanner import Scanner, TokenType, map_source_file
 from scope_analyser import ScopeAnalyser, ScopeType, FunctionVariable
 from util import print_debug
 from variable import Function as variable_Function
 
 from enum import Enum
 
+import array
+import io
+import operator
 import sys
 
-output = ""
+# How many characters of output are collected before writing them to the
+# output stream, by default.
+DEFAULT_FLUSH_SIZE = 8192
+
+# How many times a function is called by the tree walker in
+# ExecutionMode.tiered before it's compiled, by default.
+DEFAULT_TIER_UP_THRESHOLD = 50
 
 ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT = "RuntimeError: Arithmetic operation parameter not an int"
 ERROR_ARRAY_INDEX_NOT_INT = "RuntimeError: Array index not an int"
@@ -28,31 +40,41 @@ class InterpreterException(BaseException):
     self.pos = pos
 
 
+# The variables of one function invocation (or the top level). Each variable
+# has a slot assigned by the ScopeAnalyser, and the values are stored in a list
+# indexed by the slot. Variables of outer functions are found by following the
+# outer links variable.depth - depth times.
 class FunctionContext:
-  def __init__(self, function):
-    self.function = function
-    self.__symbols = dict()
+  __slots__ = ("values", "outer", "depth", "caller")
+
+  # scope is the function (or top) scope, outer is the FunctionContext of the
+  # function where the function was declared, and caller is the
+  # FunctionContext of the function which called this one. Only the tree
+  # walker uses caller; the other modes keep their call stacks elsewhere.
+  def __init__(self, scope, outer, caller = None):
+    self.values = [None] * scope.slot_count
+    self.outer = outer
+    self.depth = scope.depth
+    self.caller = caller
 
   def addVariable(self, variable, value):
     # print_debug("Adding variable into FunctionContext: " + str(variable))
     assert(variable)
-    self.__symbols[variable] = value
+    assert(variable.depth == self.depth)
+    self.values[variable.slot] = value
 
   def updateVariable(self, variable, value):
-    if variable in self.__symbols:
-      self.__symbols[variable] = value
-    else:
-      assert(self.function)
-      self.function.outer_function_context.updateVariable(variable, value)
+    self.owner(variable).values[variable.slot] = value
 
   def variableValue(self, variable):
-    if variable in self.__symbols:
-      return self.__symbols[variable]
-    assert(self.function)
-    return self.function.outer_function_context.variableValue(variable)
+    return self.owner(variable).values[variable.slot]
 
-  def hasVariable(self, variable):
-    return variable in self.__symbols
+  # Returns the FunctionContext where variable is allocated.
+  def owner(self, variable):
+    context = self
+    for i in range(self.depth - variable.depth):
+      context = context.outer
+    return context
 
 
 class FunctionType(Enum):
@@ -62,9 +84,12 @@ class FunctionType(Enum):
 
 # Function is a run-time thing.
 class Function:
-  def __init__(self, function_statement, outer_function_context):
+  def __init__(self, function_statement, outer_function_context, compiled_body = None):
     self.function_statement = function_statement
     self.outer_function_context = outer_function_context
+    # Only used by ExecutionMode.closures (a closure) and
+    # ExecutionMode.explicit_stack (a list of instructions).
+    self.compiled_body = compiled_body
 
   def __str__(self):
     return "Function(" + self.function_statement.name + ")"
@@ -73,23 +98,47 @@ class Function:
     return None
 
 
+# Stored in the typed storage of an Array for the elements which haven't been
+# set (they read as None). Storing this int switches to the generic storage.
+UNDEFINED_ELEMENT = -(1 << 63)
+
+
 class Array:
   def __init__(self, size):
     self.size = size
-    self.values = [None]*size
+    # While the Array contains only ints, they're stored compactly in an
+    # array.array; storing anything else switches to a list.
+    self.values = array.array("q", [UNDEFINED_ELEMENT]) * size
+    self.is_typed = True
 
   def getData(self, index):
     if type(index) is not int:
       raise InterpreterException(ERROR_ARRAY_INDEX_NOT_INT)
     # FIXME: better runtime error for overflow
-    return self.values[index]
+    value = self.values[index]
+    if self.is_typed and value == UNDEFINED_ELEMENT:
+      return None
+    return value
 
   def setData(self, index, new_value):
     if type(index) is not int:
       raise InterpreterException(ERROR_ARRAY_INDEX_NOT_INT)
     # FIXME: better runtime error for overflow
+    if self.is_typed:
+      if type(new_value) is int and new_value != UNDEFINED_ELEMENT:
+        try:
+          self.values[index] = new_value
+          return
+        except OverflowError:
+          # Doesn't fit in 64 bits.
+          pass
+      self.__switchToList()
     self.values[index] = new_value
 
+  def __switchToList(self):
+    self.values = [None if value == UNDEFINED_ELEMENT else value for value in self.values]
+    self.is_typed = False
+
 
 class BuiltinFunction:
   def __init__(self, name, code):
@@ -100,14 +149,38 @@ class BuiltinFunction:
     return self.code(parameters)
 
 
-def print_builtin(parameters):
+# Collects the output of the program and writes it to stream (e.g., an
+# io.TextIOBase) whenever at least flush_size characters have been collected,
+# so that the output is streamed while the program runs. With flush_size 0,
+# everything is written immediately.
+class OutputSink:
+  def __init__(self, stream, flush_size = DEFAULT_FLUSH_SIZE):
+    self.stream = stream
+    self.flush_size = flush_size
+    self.__pending = []
+    self.__pending_size = 0
+
+  def write(self, text):
+    self.__pending.append(text)
+    self.__pending_size += len(text)
+    if self.__pending_size >= self.flush_size:
+      self.flush()
+
+  def flush(self):
+    if self.__pending:
+      self.stream.write("".join(self.__pending))
+      self.__pending = []
+      self.__pending_size = 0
+      if hasattr(self.stream, "flush"):
+        self.stream.flush()
+
+
+def print_builtin(parameters, sink):
   assert(len(parameters) == 1)
-  global output
   if parameters[0] == None:
-    output += "undefined"
+    sink.write("undefined\n")
   else:
-    output += str(parameters[0])
-  output += "\n"
+    sink.write(str(parameters[0]) + "\n")
   return None
 
 
@@ -118,17 +191,48 @@ def array_builtin(parameters):
   return Array(parameters[0])
 
 
+class ExecutionMode(Enum):
+  # Walk the parse tree.
+  tree_walking = 0
+  # Compile the parse tree into closures once, then run them.
+  closures = 1
+  # Compile the parse tree into instructions for a stack machine, and run them
+  # in a loop which keeps its own value and call stacks; calls in the program
+  # don't recurse in Python.
+  explicit_stack = 2
+  # Walk the parse tree, but compile functions into closures when they've
+  # been called tier_up_threshold times. Functions called by compiled code are
+  # compiled too.
+  tiered = 3
+
+
 class Interpreter:
-  def __init__(self, grammar, source):
+  # If output (a stream) is given, the output of the program is written there
+  # while the program runs. Otherwise, it's collected and returned by run().
+  # If profiler (a Profiler) is given, the run is profiled. If memoizer (a
+  # Memoizer) is given, calls to pure functions are memoized.
+  def __init__(self, grammar, source, mode = ExecutionMode.tree_walking, output = None, flush_size = DEFAULT_FLUSH_SIZE, profiler = None, memoizer = None, tier_up_threshold = DEFAULT_TIER_UP_THRESHOLD):
     self.grammar = grammar
     self.source = source
-    # FIXME: reverse the stack; be consistent!
-    self.__function_context_stack = [FunctionContext(None)]
+    self.mode = mode
+    self.output = output
+    self.flush_size = flush_size
+    self.profiler = profiler
+    self.memoizer = memoizer
+    self.tier_up_threshold = tier_up_threshold
+    # The names of the functions compiled by ExecutionMode.tiered because they
+    # were called often enough, in order.
+    self.tiered_up_functions = []
+    # For ExecutionMode.tiered: the ClosureCompiler, and FunctionStatement ->
+    # how many times the tree walker has called it.
+    self.__closure_compiler = None
+    self.__call_counts = dict()
+    # The call stack is a chain of FunctionContexts linked via their caller
+    # fields; the top context is at the bottom.
+    self.__top_function_context = None
+    self.__current_function_context = None
 
   def run(self):
-    global output
-    output = ""
-
     scanner = Scanner(self.source)
     p = Parser(scanner, self.grammar)
     p.parse()
@@ -149,13 +253,46 @@ class Interpreter:
     if not sa.success:
       raise sa.error
 
+    ConstantFolder(p.program).fold()
+
+    if self.memoizer:
+      self.memoizer.begin(p.program)
+
+    self.__top_function_context = FunctionContext(sa.top_scope, None)
+    self.__current_function_context = self.__top_function_context
+
+    if self.output is None:
+      stream = io.StringIO()
+    else:
+      stream = self.output
+    sink = OutputSink(stream, self.flush_size)
+
     # Install builtins to the top scope.
-    self.__function_context_stack[0].addVariable(sa.top_scope.resolve("print"), BuiltinFunction("print", print_builtin))
-    self.__function_context_stack[0].addVariable(sa.top_scope.resolve("Array"), BuiltinFunction("Array", array_builtin))
+    self.__current_function_context.addVariable(sa.top_scope.resolve("print"), BuiltinFunction("print", lambda parameters: print_builtin(parameters, sink)))
+    self.__current_function_context.addVariable(sa.top_scope.resolve("Array"), BuiltinFunction("Array", array_builtin))
 
-    self.__executeStatements(p.program.statements)
+    if self.profiler:
+      self.profiler.begin(self.source)
+    try:
+      if self.mode == ExecutionMode.closures:
+        compiled = ClosureCompiler(self.__top_function_context, self.profiler, self.memoizer).compileStatements(p.program.statements)
+        compiled(self.__top_function_context)
+      elif self.mode == ExecutionMode.explicit_stack:
+        code = StackCompiler(self.__top_function_context, self.profiler).compileFunctionBody(p.program.statements)
+        run_stack_code(code, self.__top_function_context, self.profiler, self.memoizer)
+      else:
+        if self.mode == ExecutionMode.tiered:
+          self.__closure_compiler = ClosureCompiler(self.__top_function_context, self.profiler, self.memoizer)
+        self.__executeStatements(p.program.statements)
+    finally:
+      # Also the output before a run-time error is written.
+      sink.flush()
+      if self.profiler:
+        self.profiler.end()
 
-    return output
+    if self.output is None:
+      return stream.getvalue()
+    return None
 
   def __executeStatements(self, statements):
     # We need to execute function declarations first since they're
@@ -181,10 +318,12 @@ class Interpreter:
 
   def __executeStatement(self, s):
     # print("Executing " + str(s))
+    if self.profiler:
+      self.profiler.countStatement(s)
     if isinstance(s, LetStatement):
       assert(s.resolved_variable)
       # The variable gets created in the current context.
-      self.__function_context_stack[0].addVariable(s.resolved_variable, self.__evaluateExpression(s.expression))
+      self.__current_function_context.addVariable(s.resolved_variable, self.__evaluateExpression(s.expression))
       return (False, None)
     if isinstance(s, AssignmentStatement):
       if isinstance(s.where, VariableExpression):
@@ -193,10 +332,10 @@ class Interpreter:
         new_value = self.__evaluateExpression(s.expression)
         # Maybe the variable is in the current function context...
         if s.where.resolvedVariable().allocation_scope.scope_type == ScopeType.function:
-          self.__function_context_stack[0].updateVariable(s.where.resolvedVariable(), new_value)
+          self.__current_function_context.updateVariable(s.where.resolvedVariable(), new_value)
         else: # Or in the top scope.
           assert(s.where.resolvedVariable().allocation_scope.scope_type == ScopeType.top)
-          self.__function_context_stack[-1].updateVariable(s.where.resolvedVariable(), new_value)
+          self.__top_function_context.updateVariable(s.where.resolvedVariable(), new_value)
       elif isinstance(s.where, ArrayIndexExpression):
         array = self.__evaluateExpression(s.where.array)
         if type(array) is not Array:
@@ -230,7 +369,10 @@ class Interpreter:
       # This code is executed when we see a function (this might be an inner
       # function of a function we're already executing, or a top level
       # function).
-      self.__function_context_stack[0].addVariable(s.resolved_function, Function(s, self.__function_context_stack[0]))
+      compiled_body = None
+      if self.__closure_compiler:
+        compiled_body = self.__closure_compiler.compiledFunctionBody(s)
+      self.__current_function_context.addVariable(s.resolved_function, Function(s, self.__current_function_context, compiled_body))
       return (False, None)
     assert(False)
 
@@ -245,10 +387,10 @@ class Interpreter:
       # Maybe the variable is in the current function context, or in some outer
       # function context... (note that variableValue() walks the stack!)
       if e.resolved_variable.allocation_scope.scope_type == ScopeType.function:
-        return self.__function_context_stack[0].variableValue(e.resolved_variable)
+        return self.__current_function_context.variableValue(e.resolved_variable)
       # Or in the top context.
       assert(e.resolved_variable.allocation_scope.scope_type == ScopeType.top)
-      return self.__function_context_stack[-1].variableValue(e.resolved_variable)
+      return self.__top_function_context.variableValue(e.resolved_variable)
     if isinstance(e, AddExpression):
       ix = 1
       assert(len(e.items) % 2 == 1)
@@ -315,11 +457,11 @@ class Interpreter:
       # Maybe the variable is in the current function context, or in some outer
       # function context... (note that variableValue() walks the stack!)
       if f.allocation_scope.scope_type == ScopeType.function:
-        value = self.__function_context_stack[0].variableValue(f)
+        value = self.__current_function_context.variableValue(f)
       else:
         # Or in the top context.
         assert(f.allocation_scope.scope_type == ScopeType.top)
-        value = self.__function_context_stack[-1].variableValue(f)
+        value = self.__top_function_context.variableValue(f)
 
       if isinstance(value, BuiltinFunction):
         return value.execute(parameters)
@@ -332,22 +474,54 @@ class Interpreter:
       if len(parameters) != len(function_statement.formal_parameters.items):
         raise RuntimeError("RuntimeError: Wrong number of parameters, expecting " + str(len(function_statement.formal_parameters.items)), e.pos)
 
+      memoizer_key = None
+      if self.memoizer:
+        memoizer_key = self.memoizer.key(function_statement, parameters)
+        if memoizer_key is not None:
+          memoized = self.memoizer.lookup(memoizer_key)
+          if memoized is not NOT_MEMOIZED:
+            return memoized
+
+      if self.__closure_compiler:
+        compiled_body = value.compiled_body or self.__tierUp(value)
+        if compiled_body:
+          # Compiled code doesn't use the caller links.
+          function_context = FunctionContext(function_statement.function.scope, value.outer_function_context)
+          for i in range(len(parameters)):
+            function_context.addVariable(function_statement.function.parameter_variables[i], parameters[i])
+          return_value = compiled_body(function_context)
+          if return_value is NO_RETURN:
+            return_value = None
+          if memoizer_key is not None:
+            self.memoizer.store(memoizer_key, return_value)
+          return return_value
+
       # Create a FunctionContext for the function we're about to call.
-      self.__function_context_stack = [FunctionContext(value)] + self.__function_context_stack
+      self.__current_function_context = FunctionContext(function_statement.function.scope, value.outer_function_context, self.__current_function_context)
 
       for i in range(len(parameters)):
-        self.__function_context_stack[0].addVariable(function_statement.function.parameter_variables[i], parameters[i])
+        self.__current_function_context.addVariable(function_statement.function.parameter_variables[i], parameters[i])
+      if self.profiler:
+        self.profiler.enterFunction(function_statement.name, function_statement.pos)
       (did_return, maybe_return_value) = self.__executeStatements(function_statement.body)
+      if self.profiler:
+        self.profiler.exitFunction()
 
 
-      self.__function_context_stack.pop(0)
+      # Closures created by the call keep its context alive, but they mustn't
+      # keep its callers alive.
+      returning_context = self.__current_function_context
+      self.__current_function_context = returning_context.caller
+      returning_context.caller = None
+      if memoizer_key is not None:
+        self.memoizer.store(memoizer_key, maybe_return_value)
       return maybe_return_value
 
     if isinstance(e, NewExpression):
       parameters = [self.__evaluateExpression(p) for p in e.parameters]
       assert(e.function_call.function.resolved_variable)
       f = e.function_call.function.resolved_variable
-      value = self.__function_context_stack[-1].variableValue(f)
+      value = self.__top_function_context.variableValue(f)
       if isinstance(value, BuiltinFunction):
         r = value.execute(parameters)
         return r
@@ -363,18 +537,756 @@ class Interpreter:
 
     assert(False)
 
+  # Counts a call of the Function value by the tree walker. Returns the
+  # compiled body of the function if it's now called often enough to be
+  # compiled, otherwise None.
+  def __tierUp(self, value):
+    function_statement = value.function_statement
+    count = self.__call_counts.get(function_statement, 0) + 1
+    self.__call_counts[function_statement] = count
+    if count < self.tier_up_threshold:
+      return None
+    if self.__closure_compiler.compiledFunctionBody(function_statement) is None:
+      self.tiered_up_functions.append(function_statement.name)
+    value.compiled_body = self.__closure_compiler.compileFunctionBody(function_statement)
+    return value.compiled_body
+
+
+
+# Returned by compiled statements which didn't execute a return statement.
+NO_RETURN = object()
+
+BOOLEAN_OPERATORS = {TokenType.equals: operator.eq,
+                     TokenType.not_equals: operator.ne,
+                     TokenType.less_than: operator.lt,
+                     TokenType.less_or_equals: operator.le,
+                     TokenType.greater_than: operator.gt,
+                     TokenType.greater_or_equals: operator.ge}
+
+# Compiles analysed statements and expressions into nested closures, so that
+# the type dispatch is done only once, at compile time. Compiled statements
+# take the current FunctionContext and return either NO_RETURN or the return
+# value. Compiled expressions take the current FunctionContext and return the
+# value of the expression.
+#
+# The behaviour (including the order of evaluation and the errors) is the same
+# as when walking the parse tree in Interpreter.
+class ClosureCompiler:
+  # If profiler is given, the compiled code reports to it; otherwise profiling
+  # costs nothing. If memoizer is given, calls to pure functions are memoized.
+  def __init__(self, top_function_context, profiler = None, memoizer = None):
+    self.__top_function_context = top_function_context
+    self.__profiler = profiler
+    self.__memoizer = memoizer
+    # The depth of the function whose code we're compiling.
+    self.__depth = 0
+    # FunctionStatement -> compiled body.
+    self.__function_bodies = dict()
+
+  def compileStatements(self, statements):
+    # Function declarations are hoisted; executing them creates the
+    # corresponding Function objects.
+    functions = [self.compileStatement(s) for s in statements if isinstance(s, FunctionStatement)]
+    others = [self.compileStatement(s) for s in statements if not isinstance(s, FunctionStatement)]
+
+    if not functions:
+      def run(context):
+        for s in others:
+          value = s(context)
+          if value is not NO_RETURN:
+            return value
+        return NO_RETURN
+      return run
+
+    def run_with_functions(context):
+      for f in functions:
+        f(context)
+      for s in others:
+        value = s(context)
+        if value is not NO_RETURN:
+          return value
+      return NO_RETURN
+    return run_with_functions
+
+  def compileStatement(self, s):
+    compiled = self.__compileStatement(s)
+    if not self.__profiler:
+      return compiled
+    profiler = self.__profiler
+    def run_profiled(context):
+      profiler.countStatement(s)
+      return compiled(context)
+    return run_profiled
+
+  def __compileStatement(self, s):
+    if isinstance(s, LetStatement):
+      assert(s.resolved_variable)
+      assert(s.resolved_variable.depth == self.__depth)
+      slot = s.resolved_variable.slot
+      expression = self.compileExpression(s.expression)
+      def run_let(context):
+        # The variable gets created in the current context.
+        context.values[slot] = expression(context)
+        return NO_RETURN
+      return run_let
+
+    if isinstance(s, AssignmentStatement):
+      expression = self.compileExpression(s.expression)
+      if isinstance(s.where, VariableExpression):
+        variable = s.where.resolvedVariable()
+        assert(variable)
+        slot = variable.slot
+        if variable.allocation_scope.scope_type == ScopeType.top:
+          top_values = self.__top_function_context.values
+          def run_assign_top_variable(context):
+            top_values[slot] = expression(context)
+            return NO_RETURN
+          return run_assign_top_variable
+        assert(variable.allocation_scope.scope_type == ScopeType.function)
+        hops = self.__depth - variable.depth
+        if hops == 0:
+          def run_assign_local_variable(context):
+            context.values[slot] = expression(context)
+            return NO_RETURN
+          return run_assign_local_variable
+        def run_assign_variable(context):
+          value = expression(context)
+          for i in range(hops):
+            context = context.outer
+          context.values[slot] = value
+          return NO_RETURN
+        return run_assign_variable
+      if isinstance(s.where, ArrayIndexExpression):
+        array_expression = self.compileExpression(s.where.array)
+        index_expression = self.compileExpression(s.where.index)
+        def run_assign_array(context):
+          array = array_expression(context)
+          if type(array) is not Array:
+            raise InterpreterException(ERROR_ARRAY_BASE_NOT_ARRAY)
+          array.setData(index_expression(context), expression(context))
+          return NO_RETURN
+        return run_assign_array
+      assert(False)
+
+    if isinstance(s, FunctionCall):
+      call = self.compileExpression(s)
+      def run_call(context):
+        call(context)
+        return NO_RETURN
+      return run_call
+
+    if isinstance(s, IfStatement):
+      condition = self.compileExpression(s.expression)
+      then_body = self.compileStatements(s.then_body)
+      else_body = self.compileStatements(s.else_body)
+      def run_if(context):
+        if condition(context):
+          return then_body(context)
+        return else_body(context)
+      return run_if
+
+    if isinstance(s, WhileStatement):
+      condition = self.compileExpression(s.expression)
+      body = self.compileStatements(s.body)
+      def run_while(context):
+        while condition(context):
+          value = body(context)
+          if value is not NO_RETURN:
+            return value
+        return NO_RETURN
+      return run_while
+
+    if isinstance(s, ReturnStatement):
+      if not s.expression:
+        return lambda context: None
+      expression = self.compileExpression(s.expression)
+      return expression
+
+    if isinstance(s, FunctionStatement):
+      assert(s.resolved_function.depth == self.__depth)
+      slot = s.resolved_function.slot
+      body = self.compileFunctionBody(s)
+      def run_function(context):
+        context.values[slot] = Function(s, context, body)
+        return NO_RETURN
+      return run_function
+
+    assert(False)
+
+  # Returns the compiled body of the function declared by s; it takes the
+  # FunctionContext of a call. Each function is only compiled once.
+  def compileFunctionBody(self, s):
+    body = self.__function_bodies.get(s)
+    if body:
+      return body
+    outer_depth = self.__depth
+    self.__depth = s.function.scope.depth
+    body = self.compileStatements(s.body)
+    self.__depth = outer_depth
+    if self.__profiler:
+      body = self.__profileFunctionBody(s, body)
+    self.__function_bodies[s] = body
+    return body
+
+  # Returns the compiled body of the function declared by s, or None if it
+  # hasn't been compiled.
+  def compiledFunctionBody(self, s):
+    return self.__function_bodies.get(s)
+
+  def __profileFunctionBody(self, s, body):
+    profiler = self.__profiler
+    def run_profiled_body(context):
+      profiler.enterFunction(s.name, s.pos)
+      value = body(context)
+      profiler.exitFunction()
+      return value
+    return run_profiled_body
+
+  def compileExpression(self, e):
+    if isinstance(e, NumberExpression) or isinstance(e, StringExpression):
+      value = e.value
+      return lambda context: value
+
+    if isinstance(e, VariableExpression):
+      assert(e.resolved_variable)
+      return self.__compileVariableLookup(e.resolved_variable)
+
+    if isinstance(e, AddExpression) or isinstance(e, MultiplyExpression):
+      return self.__compileArithmetic(e)
+
+    if isinstance(e, BooleanExpression):
+      left = self.compileExpression(e.items[0])
+      right = self.compileExpression(e.items[2])
+      op = BOOLEAN_OPERATORS[e.items[1].token_type]
+      return lambda context: op(left(context), right(context))
+
+    if isinstance(e, FunctionCall):
+      return self.__compileFunctionCall(e)
+
+    if isinstance(e, NewExpression):
+      parameters = [self.compileExpression(p) for p in e.parameters]
+      f = e.function_call.function.resolved_variable
+      assert(f)
+      function_lookup = self.__compileVariableLookup(f)
+      def run_new(context):
+        values = [p(context) for p in parameters]
+        value = function_lookup(context)
+        if isinstance(value, BuiltinFunction):
+          return value.execute(values)
+        # No user defined classes yet.
+        assert(False)
+      return run_new
+
+    if isinstance(e, ArrayIndexExpression):
+      array_expression = self.compileExpression(e.array)
+      index_expression = self.compileExpression(e.index)
+      def run_array_index(context):
+        array = array_expression(context)
+        if type(array) is not Array:
+          raise InterpreterException(ERROR_ARRAY_BASE_NOT_ARRAY)
+        return array.getData(index_expression(context))
+      return run_array_index
+
+    assert(False)
+
+  def __compileVariableLookup(self, variable):
+    slot = variable.slot
+    # Maybe the variable is in the top context...
+    if variable.allocation_scope.scope_type == ScopeType.top:
+      top_values = self.__top_function_context.values
+      return lambda context: top_values[slot]
+    # Or in the current function context, or in some outer function context.
+    assert(variable.allocation_scope.scope_type == ScopeType.function)
+    hops = self.__depth - variable.depth
+    if hops == 0:
+      return lambda context: context.values[slot]
+    if hops == 1:
+      return lambda context: context.outer.values[slot]
+    def run_lookup(context):
+      for i in range(hops):
+        context = context.outer
+      return context.values[slot]
+    return run_lookup
+
+  def __compileArithmetic(self, e):
+    assert(len(e.items) % 2 == 1)
+    if isinstance(e, AddExpression):
+      operators = {TokenType.plus: operator.add, TokenType.minus: operator.sub}
+    else:
+      operators = {TokenType.multiplication: operator.mul, TokenType.division: operator.floordiv}
+    first = self.compileExpression(e.items[0])
+    rest = [(operators[e.items[ix].token_type], self.compileExpression(e.items[ix + 1]))
+            for ix in range(1, len(e.items), 2)]
+
+    if len(rest) == 1:
+      [(op, second)] = rest
+      def run_binary(context):
+        current = first(context)
+        if type(current) is not int:
+          raise InterpreterException(ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT)
+        other = second(context)
+        if type(other) is not int:
+          raise InterpreterException(ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT)
+        return op(current, other)
+      return run_binary
+
+    def run_arithmetic(context):
+      current = first(context)
+      if type(current) is not int:
+        raise InterpreterException(ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT)
+      for (op, operand) in rest:
+        other = operand(context)
+        if type(other) is not int:
+          raise InterpreterException(ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT)
+        current = op(current, other)
+      return current
+    return run_arithmetic
+
+  def __compileFunctionCall(self, e):
+    parameters = [self.compileExpression(p) for p in e.parameters]
+    assert(e.function.resolvedVariable())
+    function_lookup = self.__compileVariableLookup(e.function.resolvedVariable())
+    pos = e.pos
+    memoizer = self.__memoizer
+    compile_function_body = self.compileFunctionBody
+
+    def run_function_call(context):
+      values = [p(context) for p in parameters]
+      value = function_lookup(context)
+
+      if isinstance(value, BuiltinFunction):
+        return value.execute(values)
+
+      if not isinstance(value, Function):
+        raise RuntimeError("RuntimeError: Calling something which is not a function", pos)
+
+      function_statement = value.function_statement
+      parameter_count = len(function_statement.formal_parameters.items)
+      if len(values) != parameter_count:
+        raise RuntimeError("RuntimeError: Wrong number of parameters, expecting " + str(parameter_count), pos)
+
+      memoizer_key = None
+      if memoizer:
+        memoizer_key = memoizer.key(function_statement, values)
+        if memoizer_key is not None:
+          return_value = memoizer.lookup(memoizer_key)
+          if return_value is not NOT_MEMOIZED:
+            return return_value
+
+      # Create a FunctionContext for the function we're about to call.
+      function_context = FunctionContext(function_statement.function.scope, value.outer_function_context)
+      function_values = function_context.values
+      parameter_variables = function_statement.function.parameter_variables
+      for i in range(len(values)):
+        function_values[parameter_variables[i].slot] = values[i]
+      body = value.compiled_body
+      if body is None:
+        # Created by the tree walker in ExecutionMode.tiered.
+        body = value.compiled_body = compile_function_body(function_statement)
+      return_value = body(function_context)
+      if return_value is NO_RETURN:
+        return_value = None
+      if memoizer_key is not None:
+        memoizer.store(memoizer_key, return_value)
+      return return_value
+    return run_function_call
+
+
+# Opcodes for ExecutionMode.explicit_stack. Each instruction is an opcode
+# followed by one argument.
+OP_PUSH_CONSTANT = 0 # value
+OP_LOAD_LOCAL = 1 # slot
+OP_LOAD_TOP = 2 # slot
+OP_LOAD_OUTER = 3 # (hops, slot)
+OP_STORE_LOCAL = 4 # slot
+OP_STORE_TOP = 5 # slot
+OP_STORE_OUTER = 6 # (hops, slot)
+OP_CHECK_INT = 7 # unused
+OP_ARITHMETIC = 8 # operator function
+OP_COMPARE = 9 # operator function
+OP_JUMP = 10 # target
+OP_JUMP_IF_FALSE = 11 # target
+OP_CHECK_ARRAY = 12 # unused
+OP_LOAD_ELEMENT = 13 # unused
+OP_STORE_ELEMENT = 14 # unused
+OP_CALL = 15 # (parameter count, pos)
+OP_NEW = 16 # parameter count
+OP_RETURN = 17 # unused
+OP_POP = 18 # unused
+OP_CREATE_FUNCTION = 19 # (FunctionStatement, compiled body, slot)
+# Only emitted when profiling.
+OP_COUNT_STATEMENT = 20 # statement
+OP_ENTER_FUNCTION = 21 # FunctionStatement
+OP_EXIT_FUNCTION = 22 # unused
+
+# Compiles analysed statements into a flat list of instructions for a stack
+# machine, run by run_stack_code. Expressions push their value onto the value
+# stack and statements leave it as it was.
+#
+# The behaviour (including the order of evaluation and the errors) is the same
+# as when walking the parse tree in Interpreter.
+class StackCompiler:
+  # If profiler is given, the compiled code reports to it; otherwise profiling
+  # costs nothing.
+  def __init__(self, top_function_context, profiler = None):
+    self.__top_function_context = top_function_context
+    self.__profiler = profiler
+    # The depth of the function whose code we're compiling.
+    self.__depth = 0
+    self.__code = None
+    # The FunctionStatement whose code we're compiling (None for the top
+    # level).
+    self.__function_statement = None
+
+  # Returns the code for the body of a function (or the top level, if
+  # function_statement is None), which leaves the return value on the stack
+  # and returns.
+  def compileFunctionBody(self, statements, function_statement = None):
+    outer_code = self.__code
+    outer_function_statement = self.__function_statement
+    self.__code = []
+    self.__function_statement = function_statement
+    if self.__profiler and function_statement:
+      self.__emit(OP_ENTER_FUNCTION, function_statement)
+    self.__compileStatements(statements)
+    self.__emit(OP_PUSH_CONSTANT, None)
+    self.__emitReturn()
+    code = self.__code
+    self.__code = outer_code
+    self.__function_statement = outer_function_statement
+    return code
+
+  def __emitReturn(self):
+    if self.__profiler and self.__function_statement:
+      self.__emit(OP_EXIT_FUNCTION, None)
+    self.__emit(OP_RETURN, None)
+
+  def __emit(self, op, argument):
+    self.__code.append(op)
+    self.__code.append(argument)
+
+  # Emits a jump whose target is filled in by __setJumpTarget.
+  def __emitJump(self, op):
+    self.__emit(op, None)
+    return len(self.__code) - 1
+
+  def __setJumpTarget(self, jump):
+    self.__code[jump] = len(self.__code)
+
+  def __compileStatements(self, statements):
+    # Function declarations are hoisted; executing them creates the
+    # corresponding Function objects.
+    for s in statements:
+      if isinstance(s, FunctionStatement):
+        self.__compileStatement(s)
+    for s in statements:
+      if not isinstance(s, FunctionStatement):
+        self.__compileStatement(s)
+
+  def __compileStatement(self, s):
+    if self.__profiler:
+      self.__emit(OP_COUNT_STATEMENT, s)
+    if isinstance(s, LetStatement):
+      assert(s.resolved_variable)
+      assert(s.resolved_variable.depth == self.__depth)
+      # The variable gets created in the current context.
+      self.__compileExpression(s.expression)
+      self.__emit(OP_STORE_LOCAL, s.resolved_variable.slot)
+      return
+
+    if isinstance(s, AssignmentStatement):
+      if isinstance(s.where, VariableExpression):
+        self.__compileExpression(s.expression)
+        assert(s.where.resolvedVariable())
+        self.__compileVariableAccess(s.where.resolvedVariable(), OP_STORE_LOCAL, OP_STORE_TOP, OP_STORE_OUTER)
+        return
+      if isinstance(s.where, ArrayIndexExpression):
+        self.__compileExpression(s.where.array)
+        self.__emit(OP_CHECK_ARRAY, None)
+        self.__compileExpression(s.where.index)
+        self.__compileExpression(s.expression)
+        self.__emit(OP_STORE_ELEMENT, None)
+        return
+      assert(False)
+
+    if isinstance(s, FunctionCall):
+      self.__compileExpression(s)
+      self.__emit(OP_POP, None)
+      return
+
+    if isinstance(s, IfStatement):
+      self.__compileExpression(s.expression)
+      jump_to_else = self.__emitJump(OP_JUMP_IF_FALSE)
+      self.__compileStatements(s.then_body)
+      jump_to_end = self.__emitJump(OP_JUMP)
+      self.__setJumpTarget(jump_to_else)
+      self.__compileStatements(s.else_body)
+      self.__setJumpTarget(jump_to_end)
+      return
+
+    if isinstance(s, WhileStatement):
+      start = len(self.__code)
+      self.__compileExpression(s.expression)
+      jump_to_end = self.__emitJump(OP_JUMP_IF_FALSE)
+      self.__compileStatements(s.body)
+      self.__emit(OP_JUMP, start)
+      self.__setJumpTarget(jump_to_end)
+      return
+
+    if isinstance(s, ReturnStatement):
+      if s.expression:
+        self.__compileExpression(s.expression)
+      else:
+        self.__emit(OP_PUSH_CONSTANT, None)
+      self.__emitReturn()
+      return
+
+    if isinstance(s, FunctionStatement):
+      assert(s.resolved_function.depth == self.__depth)
+      outer_depth = self.__depth
+      self.__depth = s.function.scope.depth
+      body = self.compileFunctionBody(s.body, s)
+      self.__depth = outer_depth
+      self.__emit(OP_CREATE_FUNCTION, (s, body, s.resolved_function.slot))
+      return
+
+    assert(False)
+
+  def __compileExpression(self, e):
+    if isinstance(e, NumberExpression) or isinstance(e, StringExpression):
+      self.__emit(OP_PUSH_CONSTANT, e.value)
+      return
+
+    if isinstance(e, VariableExpression):
+      assert(e.resolved_variable)
+      self.__compileVariableAccess(e.resolved_variable, OP_LOAD_LOCAL, OP_LOAD_TOP, OP_LOAD_OUTER)
+      return
+
+    if isinstance(e, AddExpression) or isinstance(e, MultiplyExpression):
+      assert(len(e.items) % 2 == 1)
+      if isinstance(e, AddExpression):
+        operators = {TokenType.plus: operator.add, TokenType.minus: operator.sub}
+      else:
+        operators = {TokenType.multiplication: operator.mul, TokenType.division: operator.floordiv}
+      self.__compileExpression(e.items[0])
+      self.__emit(OP_CHECK_INT, None)
+      for ix in range(1, len(e.items), 2):
+        self.__compileExpression(e.items[ix + 1])
+        self.__emit(OP_ARITHMETIC, operators[e.items[ix].token_type])
+      return
+
+    if isinstance(e, BooleanExpression):
+      self.__compileExpression(e.items[0])
+      self.__compileExpression(e.items[2])
+      self.__emit(OP_COMPARE, BOOLEAN_OPERATORS[e.items[1].token_type])
+      return
+
+    if isinstance(e, FunctionCall):
+      for p in e.parameters:
+        self.__compileExpression(p)
+      assert(e.function.resolvedVariable())
+      self.__compileVariableAccess(e.function.resolvedVariable(), OP_LOAD_LOCAL, OP_LOAD_TOP, OP_LOAD_OUTER)
+      self.__emit(OP_CALL, (len(e.parameters), e.pos))
+      return
+
+    if isinstance(e, NewExpression):
+      for p in e.parameters:
+        self.__compileExpression(p)
+      assert(e.function_call.function.resolved_variable)
+      self.__compileVariableAccess(e.function_call.function.resolved_variable, OP_LOAD_LOCAL, OP_LOAD_TOP, OP_LOAD_OUTER)
+      self.__emit(OP_NEW, len(e.parameters))
+      return
+
+    if isinstance(e, ArrayIndexExpression):
+      self.__compileExpression(e.array)
+      self.__emit(OP_CHECK_ARRAY, None)
+      self.__compileExpression(e.index)
+      self.__emit(OP_LOAD_ELEMENT, None)
+      return
+
+    assert(False)
+
+  def __compileVariableAccess(self, variable, local_op, top_op, outer_op):
+    # Maybe the variable is in the top context...
+    if variable.allocation_scope.scope_type == ScopeType.top:
+      self.__emit(top_op, variable.slot)
+      return
+    # Or in the current function context, or in some outer function context.
+    assert(variable.allocation_scope.scope_type == ScopeType.function)
+    hops = self.__depth - variable.depth
+    if hops == 0:
+      self.__emit(local_op, variable.slot)
+    else:
+      self.__emit(outer_op, (hops, variable.slot))
+
+
+# Runs code created by StackCompiler in context. Calls don't recurse: the
+# caller's code, position and context are pushed onto a stack of frames, and
+# popped when the function returns. The recursion depth of the program is only
+# limited by the memory. profiler must be given if the code was compiled for
+# profiling. If memoizer is given, calls to pure functions are memoized.
+def run_stack_code(code, context, profiler = None, memoizer = None):
+  top_values = context.values
+  values = context.values
+  # The values of the expressions being evaluated, in all functions.
+  stack = []
+  # (code, pc, context, memoizer key) for each function which called the
+  # current one. The memoizer key is for storing the return value of the call.
+  frames = []
+  pc = 0
+  while True:
+    op = code[pc]
+    argument = code[pc + 1]
+    pc += 2
+    if op == OP_LOAD_LOCAL:
+      stack.append(values[argument])
+    elif op == OP_PUSH_CONSTANT:
+      stack.append(argument)
+    elif op == OP_STORE_LOCAL:
+      values[argument] = stack.pop()
+    elif op == OP_ARITHMETIC:
+      other = stack.pop()
+      if type(other) is not int:
+        raise InterpreterException(ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT)
+      stack[-1] = argument(stack[-1], other)
+    elif op == OP_CHECK_INT:
+      if type(stack[-1]) is not int:
+        raise InterpreterException(ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT)
+    elif op == OP_COMPARE:
+      other = stack.pop()
+      stack[-1] = argument(stack[-1], other)
+    elif op == OP_JUMP_IF_FALSE:
+      if not stack.pop():
+        pc = argument
+    elif op == OP_JUMP:
+      pc = argument
+    elif op == OP_LOAD_TOP:
+      stack.append(top_values[argument])
+    elif op == OP_STORE_TOP:
+      top_values[argument] = stack.pop()
+    elif op == OP_LOAD_OUTER:
+      (hops, slot) = argument
+      owner = context
+      for i in range(hops):
+        owner = owner.outer
+      stack.append(owner.values[slot])
+    elif op == OP_STORE_OUTER:
+      (hops, slot) = argument
+      owner = context
+      for i in range(hops):
+        owner = owner.outer
+      owner.values[slot] = stack.pop()
+    elif op == OP_CALL:
+      (parameter_count, pos) = argument
+      value = stack.pop()
+      if parameter_count:
+        parameters = stack[-parameter_count:]
+        del stack[-parameter_count:]
+      else:
+        parameters = []
+
+      if isinstance(value, BuiltinFunction):
+        stack.append(value.execute(parameters))
+        continue
+
+      if not isinstance(value, Function):
+        raise RuntimeError("RuntimeError: Calling something which is not a function", pos)
+
+      function_statement = value.function_statement
+      if parameter_count != len(function_statement.formal_parameters.items):
+        raise RuntimeError("RuntimeError: Wrong number of parameters, expecting " + str(len(function_statement.formal_parameters.items)), pos)
+
+      memoizer_key = None
+      if memoizer:
+        memoizer_key = memoizer.key(function_statement, parameters)
+        if memoizer_key is not None:
+          memoized = memoizer.lookup(memoizer_key)
+          if memoized is not NOT_MEMOIZED:
+            stack.append(memoized)
+            continue
+
+      # Create a FunctionContext for the function we're about to call, and
+      # continue executing its code.
+      frames.append((code, pc, context, memoizer_key))
+      context = FunctionContext(function_statement.function.scope, value.outer_function_context)
+      values = context.values
+      parameter_variables = function_statement.function.parameter_variables
+      for i in range(parameter_count):
+        values[parameter_variables[i].slot] = parameters[i]
+      code = value.compiled_body
+      pc = 0
+    elif op == OP_RETURN:
+      # The return value stays on the stack.
+      if not frames:
+        return
+      (code, pc, context, memoizer_key) = frames.pop()
+      values = context.values
+      if memoizer_key is not None:
+        memoizer.store(memoizer_key, stack[-1])
+    elif op == OP_POP:
+      stack.pop()
+    elif op == OP_CHECK_ARRAY:
+      if type(stack[-1]) is not Array:
+        raise InterpreterException(ERROR_ARRAY_BASE_NOT_ARRAY)
+    elif op == OP_LOAD_ELEMENT:
+      index = stack.pop()
+      stack[-1] = stack[-1].getData(index)
+    elif op == OP_STORE_ELEMENT:
+      new_value = stack.pop()
+      index = stack.pop()
+      stack.pop().setData(index, new_value)
+    elif op == OP_CREATE_FUNCTION:
+      (function_statement, body, slot) = argument
+      values[slot] = Function(function_statement, context, body)
+    elif op == OP_NEW:
+      value = stack.pop()
+      parameters = stack[len(stack) - argument:]
+      del stack[len(stack) - argument:]
+      if isinstance(value, BuiltinFunction):
+        stack.append(value.execute(parameters))
+        continue
+      # No user defined classes yet.
+      assert(False)
+    elif op == OP_COUNT_STATEMENT:
+      profiler.countStatement(argument)
+    elif op == OP_ENTER_FUNCTION:
+      profiler.enterFunction(argument.name, argument.pos)
+    elif op == OP_EXIT_FUNCTION:
+      profiler.exitFunction()
+    else:
+      assert(False)
+
 
 if __name__ == "__main__":
-  input_file = open(sys.argv[1], 'r')
-  source = input_file.read()
+  # Usage: interpreter.py [--closures | --explicit-stack | --tiered] [--profile | --profile-json] [--memoize] file
+  # The profile and the memoizer statistics are written to stderr.
+  mode = ExecutionMode.tree_walking
+  profile_format = None
+  memoizer = None
+  while sys.argv[1].startswith("--"):
+    flag = sys.argv.pop(1)
+    if flag == "--closures":
+      mode = ExecutionMode.closures
+    elif flag == "--explicit-stack":
+      mode = ExecutionMode.explicit_stack
+    elif flag == "--tiered":
+      mode = ExecutionMode.tiered
+    elif flag == "--profile":
+      profile_format = "text"
+    elif flag == "--profile-json":
+      profile_format = "json"
+    elif flag == "--memoize":
+      memoizer = Memoizer()
+  source = map_source_file(sys.argv[1])
   grammar = GrammarDriver(rules)
-  i = Interpreter(grammar, source)
-  # try:
-  #   output = i.run().strip()
-  #   print(output)
-  # except BaseException as e:
-  #   print("Got error")
-  #   print(e)
-  #   exit(1)
-  output = i.run().strip()
-  print(output)
+  profiler = Profiler() if profile_format else None
+  i = Interpreter(grammar, source, mode, sys.stdout, profiler = profiler, memoizer = memoizer)
+  try:
+    i.run()
+  finally:
+    if profile_format == "text":
+      print(profiler.textReport(), file=sys.stderr)
+    elif profile_format == "json":
+      print(profiler.toJson(), file=sys.stderr)
+    if memoizer:
+      print(memoizer.statistics(), file=sys.stderr)
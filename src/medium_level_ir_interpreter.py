@@ -1,48 +1,594 @@
 #!/usr/bin/python3
 
+# Runs MediumLevelIR. The IR of each function is first lowered into bytecode: a
+# flat list of ints, where each instruction is an opcode followed by its
+# operands, and the temporaries are numbered registers. The bytecode is then run
+# in a dispatch loop.
+#
+# The semantics are those of the native code created by PseudoAssembler (and
+# not those of Interpreter): ints are 31 bits and wrap around (multiplication
+# only keeps 30 bits, since it multiplies the tagged values), division rounds
+# towards zero, function contexts and arrays are zero-initialized, and calling
+# a function stored in a variable reuses the function context stored in the
+# Function.
+
 from cfg_creator import CfgCreator
+from constant_folder import ConstantFolder
+from constants import *
 from grammar import GrammarDriver
 from grammar_rules import rules
+from interpreter import DEFAULT_FLUSH_SIZE, ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT, ERROR_ARRAY_INDEX_NOT_INT, ERROR_ARRAY_BASE_NOT_ARRAY, ERROR_ARRAY_SIZE_NOT_INT, InterpreterException, OutputSink
 from parser import Parser
-from medium_level_ir import MediumLevelIRCreator
-from scanner import Scanner
+from medium_level_ir import *
+from scanner import Scanner, map_source_file
 from scope_analyser import ScopeAnalyser
+from type_enums import VariableType
+from variable import Function, FunctionVariable
 
+import io
 import sys
 
+# Opcodes. The operands are register numbers (r), indices into the function
+# context (slot; the outer function context is at index 0), indices into the
+# constants of the function (constant), indices into the functions of the
+# program (function) and code offsets (target).
+OP_LOAD_LOCAL = 0 # r_to, slot
+OP_STORE_LOCAL = 1 # slot, r_from
+OP_LOAD_CONSTANT = 2 # r_to, constant
+OP_ADD = 3 # r_to, r_from1, r_from2
+OP_SUBTRACT = 4 # r_to, r_from1, r_from2
+OP_JUMP = 5 # target
+OP_JUMP_IF_EQUALS = 6 # r_left, r_right, target_true, target_false
+OP_JUMP_IF_NOT_EQUALS = 7 # r_left, r_right, target_true, target_false
+OP_JUMP_IF_LESS_THAN = 8 # r_left, r_right, target_true, target_false
+OP_JUMP_IF_LESS_OR_EQUALS = 9 # r_left, r_right, target_true, target_false
+OP_JUMP_IF_GREATER_THAN = 10 # r_left, r_right, target_true, target_false
+OP_JUMP_IF_GREATER_OR_EQUALS = 11 # r_left, r_right, target_true, target_false
+OP_LOAD_OUTER = 12 # r_to, depth, slot
+OP_STORE_OUTER = 13 # depth, slot, r_from
+OP_LOAD_ELEMENT = 14 # r_to, r_array, r_index
+OP_STORE_ELEMENT = 15 # r_array, r_index, r_from
+OP_MULTIPLY = 16 # r_to, r_from1, r_from2
+OP_DIVIDE = 17 # r_to, r_from1, r_from2
+OP_CREATE_FUNCTION_CONTEXT = 18 # r_to, depth, function
+OP_SET_PARAMETER = 19 # r_function_context, index, r_from
+OP_CALL = 20 # function, r_function_context
+OP_GET_RETURN_VALUE = 21 # r_to, r_function_context
+OP_SET_RETURN_VALUE = 22 # r_from
+OP_RETURN = 23 #
+OP_MOVE = 24 # r_to, r_from
+OP_CALL_INDIRECT = 25 # r_function, r_function_context
+OP_GET_FUNCTION_CONTEXT = 26 # r_to, r_function
+OP_CREATE_FUNCTION = 27 # r_to, r_function_context, function
+
+OPCODE_NAMES = ["load_local", "store_local", "load_constant", "add", "subtract",
+                "jump", "jump_if_equals", "jump_if_not_equals",
+                "jump_if_less_than", "jump_if_less_or_equals",
+                "jump_if_greater_than", "jump_if_greater_or_equals",
+                "load_outer", "store_outer", "load_element", "store_element",
+                "multiply", "divide", "create_function_context",
+                "set_parameter", "call", "get_return_value", "set_return_value",
+                "return", "move", "call_indirect", "get_function_context",
+                "create_function"]
+
+OPERAND_COUNTS = [2, 2, 2, 3, 3, 1, 4, 4, 4, 4, 4, 4, 3, 3, 3, 3, 3, 3, 3, 3, 2,
+                  2, 1, 0, 2, 2, 2, 3]
+
+JUMP_OPCODES = {TestEquals: OP_JUMP_IF_EQUALS,
+                TestNotEquals: OP_JUMP_IF_NOT_EQUALS,
+                TestLessThan: OP_JUMP_IF_LESS_THAN,
+                TestLessOrEquals: OP_JUMP_IF_LESS_OR_EQUALS,
+                TestGreaterThan: OP_JUMP_IF_GREATER_THAN,
+                TestGreaterOrEquals: OP_JUMP_IF_GREATER_OR_EQUALS}
+
+ARITHMETIC_OPCODES = {AddTemporaryToTemporary: OP_ADD,
+                      SubtractTemporaryFromTemporary: OP_SUBTRACT,
+                      MultiplyTemporaryByTemporary: OP_MULTIPLY,
+                      DivideTemporaryByTemporary: OP_DIVIDE}
+
+# The range of the (untagged) ints.
+MIN_INT = -(1 << (31 - INT_TAG_SHIFT))
+MAX_INT = (1 << (31 - INT_TAG_SHIFT)) - 1
+
+BUILTIN_NAMES = ["print", "Array", "test_do_gc", "test_is_live_object"]
+
+
+def wrap_int(value, bits = 32 - INT_TAG_SHIFT):
+  half = 1 << (bits - 1)
+  return ((value + half) & ((half << 1) - 1)) - half
+
+
+# A function lowered into bytecode. Function contexts are lists: the outer
+# function context, then the parameters and locals, then the return value.
+class BytecodeFunction:
+  def __init__(self, name, slot_count, builtin = None):
+    self.name = name
+    self.function_context_size = slot_count + 2
+    self.code = []
+    self.constants = []
+    self.register_count = 0
+    # For builtins: a Python function which gets the function context and
+    # returns the return value.
+    self.builtin = builtin
+
+  def __str__(self):
+    lines = ["function " + self.name + " (registers: " + str(self.register_count) + ")"]
+    pc = 0
+    while pc < len(self.code):
+      op = self.code[pc]
+      operands = self.code[pc + 1:pc + 1 + OPERAND_COUNTS[op]]
+      lines.append("%5d %s %s" % (pc, OPCODE_NAMES[op], ", ".join([str(o) for o in operands])))
+      pc += 1 + OPERAND_COUNTS[op]
+    return "\n".join(lines)
+
+
+# Lowers the MediumLevelIR of each function into a BytecodeFunction.
+class BytecodeCompiler:
+  # builtins maps the builtin function names to Python functions.
+  def __init__(self, ir, builtins):
+    self.__ir = ir
+    self.__builtins = builtins
+
+  def compile(self):
+    counts = self.__ir.metadata.function_param_and_local_counts
+    self.functions = []
+    self.function_indices = dict()
+    for (name, builtin) in self.__builtins.items():
+      # For builtins, the count is the number of parameters.
+      self.__addFunction(BytecodeFunction(name, counts[name], builtin))
+    for [f, blocks] in self.__ir.functions_and_blocks:
+      # For user functions, the count is the size of the parameters and locals
+      # in bytes.
+      name = f.function_variable.unique_name()
+      self.__addFunction(BytecodeFunction(name, counts[name] // POINTER_SIZE))
+
+    for [f, blocks] in self.__ir.functions_and_blocks:
+      function = self.functions[self.function_indices[f.function_variable.unique_name()]]
+      self.__compileFunction(function, [i for b in blocks for i in b.code if not isinstance(i, Comment)])
+    return self.functions
+
+  def __addFunction(self, function):
+    self.function_indices[function.name] = len(self.functions)
+    self.functions.append(function)
+
+  def __compileFunction(self, function, instructions):
+    self.__function = function
+    self.__registers = dict()
+    self.__constant_indices = dict()
+    self.__code = function.code
+    labels = dict()
+    # (code offset, label) for the jump targets which need to be filled in.
+    self.__jumps = []
+
+    for ix in range(len(instructions)):
+      instruction = instructions[ix]
+      if isinstance(instruction, Label):
+        labels[instruction.name] = len(self.__code)
+      elif isinstance(instruction, Goto):
+        # Blocks often end with a jump to the next block.
+        if ix + 1 < len(instructions) and isinstance(instructions[ix + 1], Label) and instructions[ix + 1].name == instruction.label:
+          continue
+        self.__emit(OP_JUMP)
+        self.__emitJumpTarget(instruction.label)
+      else:
+        self.__compileInstruction(instruction)
+
+    for (offset, label) in self.__jumps:
+      self.__code[offset] = labels[label]
+
+    # Jump directly to the target of a jump (but don't loop forever if the
+    # program does).
+    for (offset, label) in self.__jumps:
+      target = self.__code[offset]
+      hops = 0
+      while self.__code[target] == OP_JUMP and hops < len(self.__jumps):
+        target = self.__code[target + 1]
+        hops += 1
+      self.__code[offset] = target
+
+  def __emit(self, *items):
+    self.__code.extend(items)
+
+  def __emitJumpTarget(self, label):
+    self.__jumps.append((len(self.__code), label))
+    self.__code.append(None)
+
+  def __register(self, temporary):
+    assert(isinstance(temporary, TemporaryVariable))
+    if temporary not in self.__registers:
+      self.__registers[temporary] = self.__newRegister()
+    return self.__registers[temporary]
+
+  def __newRegister(self):
+    self.__function.register_count += 1
+    return self.__function.register_count - 1
+
+  def __constant(self, value):
+    # Note that ints and strings never compare equal, so they can share the
+    # dict.
+    if value not in self.__constant_indices:
+      self.__constant_indices[value] = len(self.__function.constants)
+      self.__function.constants.append(value)
+    return self.__constant_indices[value]
+
+  def __functionIndex(self, function_variable):
+    return self.function_indices[function_variable.unique_name()]
+
+  @staticmethod
+  def __slot(variable):
+    return 1 + variable.offset // POINTER_SIZE
+
+  # Returns a register which contains what (a Constant, a StringConstant or a
+  # TemporaryVariable).
+  def __compileOperand(self, what):
+    if isinstance(what, TemporaryVariable):
+      return self.__register(what)
+    if isinstance(what, Constant):
+      value = int(str(what))
+    else:
+      assert(isinstance(what, StringConstant))
+      value = what.value
+    register = self.__newRegister()
+    self.__emit(OP_LOAD_CONSTANT, register, self.__constant(value))
+    return register
+
+  # Emits code which loads the value of target into register (or a new register
+  # if register is None), and returns the register.
+  def __compileLoad(self, target, register = None):
+    if isinstance(target, TemporaryStoreOrLoadTarget):
+      if register is None:
+        return self.__register(target.temporary)
+      self.__emit(OP_MOVE, register, self.__register(target.temporary))
+      return register
+    if register is None:
+      register = self.__newRegister()
+    if isinstance(target, Local) or isinstance(target, Parameter):
+      self.__emit(OP_LOAD_LOCAL, register, BytecodeCompiler.__slot(target.variable))
+    elif isinstance(target, OuterFunctionLocal) or isinstance(target, OuterFunctionParameter):
+      self.__emit(OP_LOAD_OUTER, register, target.depth, BytecodeCompiler.__slot(target.variable))
+    elif isinstance(target, Array):
+      array = self.__compileLoad(target.base)
+      index = self.__compileOperand(target.index)
+      self.__emit(OP_LOAD_ELEMENT, register, array, index)
+    else:
+      assert(False)
+    return register
+
+  def __compileStore(self, target, register):
+    if isinstance(target, TemporaryVariable):
+      self.__emit(OP_MOVE, self.__register(target), register)
+    elif isinstance(target, TemporaryStoreOrLoadTarget):
+      self.__emit(OP_MOVE, self.__register(target.temporary), register)
+    elif isinstance(target, Local) or isinstance(target, Parameter):
+      self.__emit(OP_STORE_LOCAL, BytecodeCompiler.__slot(target.variable), register)
+    elif isinstance(target, OuterFunctionLocal) or isinstance(target, OuterFunctionParameter):
+      self.__emit(OP_STORE_OUTER, target.depth, BytecodeCompiler.__slot(target.variable), register)
+    elif isinstance(target, Array):
+      array = self.__compileLoad(target.base)
+      index = self.__compileOperand(target.index)
+      self.__emit(OP_STORE_ELEMENT, array, index, register)
+    else:
+      assert(False)
+
+  def __compileInstruction(self, instruction):
+    if isinstance(instruction, Load):
+      self.__compileLoad(instruction.what, self.__register(instruction.where))
+      return
+
+    if isinstance(instruction, Store):
+      if isinstance(instruction.where, TemporaryVariable) and not isinstance(instruction.what, TemporaryVariable):
+        # Load constants directly into the target register.
+        value = instruction.what.value if isinstance(instruction.what, StringConstant) else int(str(instruction.what))
+        self.__emit(OP_LOAD_CONSTANT, self.__register(instruction.where), self.__constant(value))
+        return
+      self.__compileStore(instruction.where, self.__compileOperand(instruction.what))
+      return
+
+    if type(instruction) in ARITHMETIC_OPCODES:
+      self.__emit(ARITHMETIC_OPCODES[type(instruction)],
+                  self.__register(instruction.to_variable),
+                  self.__register(instruction.from_variable1),
+                  self.__register(instruction.from_variable2))
+      return
+
+    if type(instruction) in JUMP_OPCODES:
+      self.__emit(JUMP_OPCODES[type(instruction)],
+                  self.__register(instruction.left),
+                  self.__register(instruction.right))
+      self.__emitJumpTarget(instruction.true_label)
+      self.__emitJumpTarget(instruction.false_label)
+      return
+
+    if isinstance(instruction, CreateFunctionContextForFunction):
+      self.__emit(OP_CREATE_FUNCTION_CONTEXT,
+                  self.__register(instruction.temporary_variable),
+                  instruction.outer_function_context_depth,
+                  self.__functionIndex(instruction.function))
+      return
+
+    if isinstance(instruction, CreateFunctionContextFromVariable):
+      self.__emit(OP_GET_FUNCTION_CONTEXT,
+                  self.__register(instruction.temporary_variable),
+                  self.__register(instruction.function))
+      return
+
+    if isinstance(instruction, CreateFunction):
+      self.__emit(OP_CREATE_FUNCTION,
+                  self.__register(instruction.function),
+                  self.__register(instruction.function_context),
+                  self.__functionIndex(instruction.function_variable))
+      return
+
+    if isinstance(instruction, AddParameterToFunctionContext):
+      self.__emit(OP_SET_PARAMETER,
+                  self.__register(instruction.temporary_for_function_context),
+                  1 + instruction.index,
+                  self.__register(instruction.temporary_variable))
+      return
+
+    if isinstance(instruction, CallFunction):
+      function_context = self.__register(instruction.temporary_for_function_context)
+      if instruction.function.variable_type == VariableType.temporary:
+        self.__emit(OP_CALL_INDIRECT, self.__register(instruction.function), function_context)
+      else:
+        self.__emit(OP_CALL, self.__functionIndex(instruction.function), function_context)
+      return
+
+    if isinstance(instruction, GetReturnValue):
+      self.__emit(OP_GET_RETURN_VALUE,
+                  self.__register(instruction.temporary_variable),
+                  self.__register(instruction.temporary_for_function_context))
+      return
+
+    if isinstance(instruction, SetReturnValue):
+      self.__emit(OP_SET_RETURN_VALUE, self.__compileOperand(instruction.value))
+      return
+
+    if isinstance(instruction, Return):
+      self.__emit(OP_RETURN)
+      return
+
+    assert(False)
+
+
 class MediumLevelIRInterpreter:
-  def __init__(self):
+  # If output (a stream) is given, the output of the program is written there
+  # while the program runs. Otherwise, it's collected and returned by run().
+  def __init__(self, grammar, source, output = None, flush_size = DEFAULT_FLUSH_SIZE):
     self.grammar = grammar
     self.source = source
+    self.output = output
+    self.flush_size = flush_size
 
   def run(self):
-    # TODO: global output
-    pass
+    scanner = Scanner(self.source)
+    p = Parser(scanner, self.grammar)
+    p.parse()
+    if not p.success:
+      raise p.error
 
+    main_variable = FunctionVariable(MAIN_NAME, MAIN_NAME, None, None)
+    p.program.main_function = Function(main_variable)
+    p.program.main_function.name = MAIN_NAME
+    p.program.main_function.unique_name = MAIN_NAME
 
-if __name__ == "__main__":
-  input_file = open(sys.argv[1], 'r')
-  source = input_file.read()
-  grammar = GrammarDriver(rules)
-  scanner = Scanner(source)
-  p = Parser(scanner, grammar)
-  p.parse()
-  if not p.success:
-    raise p.error
-  sa = ScopeAnalyser(p.program)
+    sa = ScopeAnalyser(p.program)
+    for name in BUILTIN_NAMES:
+      sa.builtins.add(name)
+    sa.analyse()
+
+    if not sa.success:
+      raise sa.error
+
+    ConstantFolder(p.program).fold()
+
+    cfgs = CfgCreator(p.program).create()
+    medium_level_ir = MediumLevelIRCreator().create(cfgs, sa.top_scope)
 
-  sa.builtins.add("write")
-  sa.analyse()
+    if self.output is None:
+      stream = io.StringIO()
+    else:
+      stream = self.output
+    sink = OutputSink(stream, self.flush_size)
 
-  if not sa.success:
-    raise sa.error
+    compiler = BytecodeCompiler(medium_level_ir, MediumLevelIRInterpreter.__createBuiltins(sink))
+    self.functions = compiler.compile()
 
-  cfgc = CfgCreator(p.program)
-  cfgs = cfgc.create()
+    main = self.functions[compiler.function_indices[MAIN_NAME]]
+    try:
+      self.__execute(main, [None] + [0] * (main.function_context_size - 1))
+    finally:
+      # Also the output before a run-time error is written.
+      sink.flush()
 
-  pa = MediumLevelIRCreator()
-  medium_level_ir = pa.create(cfgs, sa.top_scope)
+    if self.output is None:
+      return stream.getvalue()
+    return None
 
-  # i = MediumLevelIRInterpreter()
-  # output = i.run().strip()
-  # print(output)
+  @staticmethod
+  def __createBuiltins(sink):
+    def print_builtin(function_context):
+      sink.write(str(function_context[1]) + "\n")
+      return 0
+
+    def array_builtin(function_context):
+      size = function_context[1]
+      if type(size) is not int:
+        raise InterpreterException(ERROR_ARRAY_SIZE_NOT_INT)
+      return [0] * size
+
+    return {"print": print_builtin,
+            "Array": array_builtin,
+            # There's no GC to test here; all objects stay alive.
+            "test_do_gc": lambda function_context: 0,
+            "test_is_live_object": lambda function_context: 1}
+
+  def __execute(self, function, function_context):
+    code = function.code
+    constants = function.constants
+    functions = self.functions
+    registers = [0] * function.register_count
+    pc = 0
+    while True:
+      op = code[pc]
+      if op == OP_LOAD_LOCAL:
+        registers[code[pc + 1]] = function_context[code[pc + 2]]
+        pc += 3
+      elif op == OP_STORE_LOCAL:
+        function_context[code[pc + 1]] = registers[code[pc + 2]]
+        pc += 3
+      elif op == OP_LOAD_CONSTANT:
+        registers[code[pc + 1]] = constants[code[pc + 2]]
+        pc += 3
+      elif op == OP_ADD:
+        a = registers[code[pc + 2]]
+        b = registers[code[pc + 3]]
+        if type(a) is not int or type(b) is not int:
+          raise InterpreterException(ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT)
+        result = a + b
+        if result < MIN_INT or result > MAX_INT:
+          result = wrap_int(result)
+        registers[code[pc + 1]] = result
+        pc += 4
+      elif op == OP_SUBTRACT:
+        a = registers[code[pc + 2]]
+        b = registers[code[pc + 3]]
+        if type(a) is not int or type(b) is not int:
+          raise InterpreterException(ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT)
+        result = a - b
+        if result < MIN_INT or result > MAX_INT:
+          result = wrap_int(result)
+        registers[code[pc + 1]] = result
+        pc += 4
+      elif op == OP_JUMP:
+        pc = code[pc + 1]
+      elif op == OP_JUMP_IF_LESS_THAN:
+        pc = code[pc + 3] if registers[code[pc + 1]] < registers[code[pc + 2]] else code[pc + 4]
+      elif op == OP_JUMP_IF_NOT_EQUALS or op == OP_JUMP_IF_EQUALS:
+        left = registers[code[pc + 1]]
+        right = registers[code[pc + 2]]
+        # The native code compares ints by value and everything else by
+        # identity. (Strings are interned in the string table, so comparing
+        # them by value is the same.)
+        if type(left) is int or type(left) is str:
+          result = left == right
+        else:
+          result = left is right
+        if op == OP_JUMP_IF_NOT_EQUALS:
+          result = not result
+        pc = code[pc + 3] if result else code[pc + 4]
+      elif op == OP_JUMP_IF_GREATER_THAN:
+        pc = code[pc + 3] if registers[code[pc + 1]] > registers[code[pc + 2]] else code[pc + 4]
+      elif op == OP_JUMP_IF_LESS_OR_EQUALS:
+        pc = code[pc + 3] if registers[code[pc + 1]] <= registers[code[pc + 2]] else code[pc + 4]
+      elif op == OP_JUMP_IF_GREATER_OR_EQUALS:
+        pc = code[pc + 3] if registers[code[pc + 1]] >= registers[code[pc + 2]] else code[pc + 4]
+      elif op == OP_LOAD_ELEMENT:
+        array = registers[code[pc + 2]]
+        if type(array) is not list:
+          raise InterpreterException(ERROR_ARRAY_BASE_NOT_ARRAY)
+        index = registers[code[pc + 3]]
+        if type(index) is not int:
+          raise InterpreterException(ERROR_ARRAY_INDEX_NOT_INT)
+        registers[code[pc + 1]] = array[index]
+        pc += 4
+      elif op == OP_STORE_ELEMENT:
+        array = registers[code[pc + 1]]
+        if type(array) is not list:
+          raise InterpreterException(ERROR_ARRAY_BASE_NOT_ARRAY)
+        index = registers[code[pc + 2]]
+        if type(index) is not int:
+          raise InterpreterException(ERROR_ARRAY_INDEX_NOT_INT)
+        array[index] = registers[code[pc + 3]]
+        pc += 4
+      elif op == OP_LOAD_OUTER:
+        context = function_context
+        for i in range(code[pc + 2]):
+          context = context[0]
+        registers[code[pc + 1]] = context[code[pc + 3]]
+        pc += 4
+      elif op == OP_STORE_OUTER:
+        context = function_context
+        for i in range(code[pc + 1]):
+          context = context[0]
+        context[code[pc + 2]] = registers[code[pc + 3]]
+        pc += 4
+      elif op == OP_MULTIPLY:
+        a = registers[code[pc + 2]]
+        b = registers[code[pc + 3]]
+        if type(a) is not int or type(b) is not int:
+          raise InterpreterException(ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT)
+        # The tagged values are multiplied and the result shifted, so one bit
+        # is lost.
+        registers[code[pc + 1]] = wrap_int(a * b, 31 - INT_TAG_SHIFT)
+        pc += 4
+      elif op == OP_DIVIDE:
+        a = registers[code[pc + 2]]
+        b = registers[code[pc + 3]]
+        if type(a) is not int or type(b) is not int:
+          raise InterpreterException(ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT)
+        # Rounds towards zero, like idiv.
+        result = abs(a) // abs(b)
+        if (a < 0) != (b < 0):
+          result = -result
+        if result > MAX_INT:
+          result = wrap_int(result)
+        registers[code[pc + 1]] = result
+        pc += 4
+      elif op == OP_CREATE_FUNCTION_CONTEXT:
+        outer = function_context
+        for i in range(code[pc + 2]):
+          outer = outer[0]
+        size = functions[code[pc + 3]].function_context_size
+        registers[code[pc + 1]] = [outer] + [0] * (size - 1)
+        pc += 4
+      elif op == OP_SET_PARAMETER:
+        registers[code[pc + 1]][code[pc + 2]] = registers[code[pc + 3]]
+        pc += 4
+      elif op == OP_CALL or op == OP_CALL_INDIRECT:
+        callee_context = registers[code[pc + 2]]
+        if op == OP_CALL:
+          callee = functions[code[pc + 1]]
+        else:
+          callee = registers[code[pc + 1]][0]
+        if callee.builtin:
+          callee_context[-1] = callee.builtin(callee_context)
+        else:
+          self.__execute(callee, callee_context)
+        pc += 3
+      elif op == OP_GET_RETURN_VALUE:
+        registers[code[pc + 1]] = registers[code[pc + 2]][-1]
+        pc += 3
+      elif op == OP_SET_RETURN_VALUE:
+        function_context[-1] = registers[code[pc + 1]]
+        pc += 2
+      elif op == OP_RETURN:
+        return
+      elif op == OP_MOVE:
+        registers[code[pc + 1]] = registers[code[pc + 2]]
+        pc += 3
+      elif op == OP_GET_FUNCTION_CONTEXT:
+        # A Function is a (BytecodeFunction, function context) tuple.
+        registers[code[pc + 1]] = registers[code[pc + 2]][1]
+        pc += 3
+      elif op == OP_CREATE_FUNCTION:
+        registers[code[pc + 1]] = (functions[code[pc + 3]], registers[code[pc + 2]])
+        pc += 4
+      else:
+        assert(False)
+
+
+if __name__ == "__main__":
+  # Usage: medium_level_ir_interpreter.py [--dump] file
+  dump = False
+  if sys.argv[1] == "--dump":
+    dump = True
+    sys.argv.pop(1)
+  source = map_source_file(sys.argv[1])
+  grammar = GrammarDriver(rules)
+  i = MediumLevelIRInterpreter(grammar, source, sys.stdout)
+  i.run()
+  if dump:
+    for f in i.functions:
+      if not f.builtin:
+        print(f)
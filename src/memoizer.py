@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+
+# Caches the return values of calls to pure functions (see PurityAnalyser) whose
+# arguments are all ints, for the Interpreter. The cache holds at most max_size
+# entries; the least recently used one is evicted first.
+
+from purity_analyser import PurityAnalyser
+
+from collections import OrderedDict
+
+DEFAULT_MEMOIZER_SIZE = 10000
+
+# Returned by lookup() when the call is not in the cache.
+NOT_MEMOIZED = object()
+
+class Memoizer:
+  def __init__(self, max_size = DEFAULT_MEMOIZER_SIZE):
+    self.max_size = max_size
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.pure_functions = set()
+    self.__cache = OrderedDict()
+
+  # Called by the Interpreter when the program has been analysed.
+  def begin(self, program):
+    self.pure_functions = PurityAnalyser(program).analyse()
+
+  # Returns the cache key for calling function_statement with parameters, or
+  # None if the call cannot be memoized.
+  def key(self, function_statement, parameters):
+    if function_statement not in self.pure_functions:
+      return None
+    for p in parameters:
+      # Not bools either; True would be the same key as 1.
+      if type(p) is not int:
+        return None
+    return (function_statement, tuple(parameters))
+
+  def lookup(self, key):
+    value = self.__cache.get(key, NOT_MEMOIZED)
+    if value is NOT_MEMOIZED:
+      self.misses += 1
+    else:
+      self.hits += 1
+      self.__cache.move_to_end(key)
+    return value
+
+  def store(self, key, value):
+    # The same Array or Function must not be returned from several calls.
+    if value is not None and type(value) is not int and type(value) is not str:
+      return
+    self.__cache[key] = value
+    if len(self.__cache) > self.max_size:
+      self.__cache.popitem(last = False)
+      self.evictions += 1
+
+  def statistics(self):
+    return {"pure_functions": sorted([f.name for f in self.pure_functions]),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.__cache),
+            "max_size": self.max_size}
@@ -6,61 +6,24 @@ from ttypes import Type
 from ttypes import any_type, Type
 from type_enums import VariableType
 
-# Temp constructs
-class AssignmentStatementContinuation:
-  def __init__(self, items, pos):
-    self.expression = items[0]
-    self.pos = pos
-
-
-class ArrayIndexContinuation:
-  def __init__(self, items, pos):
-    self.index_expression = items[0]
-    assert(items[1] is None or isinstance(items[1], ArrayIndexContinuation) or isinstance(items[1], FunctionCallContinuation))
-    self.continuation = items[1]
-    self.pos = pos
-
-
-class FunctionCallContinuation:
-  def __init__(self, items, pos):
-    self.call_expression = items[0]
-    assert(items[1] is None or isinstance(items[1], ArrayIndexContinuation) or isinstance(items[1], FunctionCallContinuation))
-    self.continuation = items[1]
-    self.pos = pos
-
-
-class ParameterList:
-  def __init__(self, items, pos):
-    self.parameters = items
-    self.pos = pos
-
-
-class ElseStatementTemp:
-  def __init__(self, items, pos):
-    self.body = items[0]
-    self.pos = pos
-
-
-class ElseIfStatementTemp:
-  def __init__(self, items, pos):
-    self.condition = items[0]
-    self.body = items[1] or []
-    self.continuation = items[2]
-    self.pos = pos
-
-
-# Real parse tree nodes
+# Parse tree nodes. They use __slots__, since a big program has a lot of them.
 class ParseTreeNode:
+  __slots__ = ("pos",)
+
   def __init__(self, pos):
     self.pos = pos
 
 class Statement(ParseTreeNode):
+  __slots__ = ("scope",)
+
   def __init__(self, pos):
     super().__init__(pos)
     self.scope = None
 
 
 class FormalParameter(ParseTreeNode):
+  __slots__ = ("name", "ttype")
+
   def __init__(self, name, ttype, pos):
     super().__init__(pos)
     self.name = name.value
@@ -72,16 +35,12 @@ class FormalParameter(ParseTreeNode):
 
 
 class FormalParameterList(ParseTreeNode):
+  __slots__ = ("items",)
+
+  # items is a list of FormalParameters, or None.
   def __init__(self, items, pos):
     super().__init__(pos)
-    if items is None:
-      self.items = []
-    else:
-      assert(len(items) == 3)
-      self.items = [FormalParameter(items[0], items[1], pos)]
-      if items[2] is not None:
-        assert(isinstance(items[2], FormalParameterListContinuation))
-        self.items.extend(items[2].items)
+    self.items = items or []
 
   def __str__(self):
     s = "["
@@ -93,17 +52,9 @@ class FormalParameterList(ParseTreeNode):
     return s
 
 
-class FormalParameterListContinuation(ParseTreeNode):
-  def __init__(self, items, pos):
-    super().__init__(pos)
-    assert(len(items) == 3)
-    self.items = [FormalParameter(items[0], items[1], pos)]
-    if items[2] is not None:
-      assert(isinstance(items[2], FormalParameterListContinuation))
-      self.items.extend(items[2].items)
-
-
 class FunctionStatement(Statement):
+  __slots__ = ("name", "formal_parameters", "return_type", "body", "resolved_variable", "resolved_function", "function")
+
   def __init__(self, items, pos):
     super().__init__(pos)
     self.name = items[0].value
@@ -115,6 +66,7 @@ class FunctionStatement(Statement):
       self.return_type = items[2]
     self.body = items[3] or []
     self.resolved_variable = None
+    self.resolved_function = None # The FunctionVariable created during scope analysis.
     self.function = None # The Function object created during scope analysis.
 
   def __str__(self):
@@ -124,6 +76,8 @@ class FunctionStatement(Statement):
     visitor.visitFunctionStatement(self)
 
 class LetStatement(Statement):
+  __slots__ = ("identifier", "ttype", "expression", "resolved_variable")
+
   def __init__(self, items, pos):
     super().__init__(pos)
     assert(len(items) == 3)
@@ -144,6 +98,8 @@ class LetStatement(Statement):
 
 
 class AssignmentStatement(Statement):
+  __slots__ = ("where", "expression")
+
   def __init__(self, items, pos):
     super().__init__(pos)
     assert(len(items) == 2)
@@ -168,21 +124,16 @@ class AssignmentStatement(Statement):
 
 
 class IfStatement(Statement):
+  __slots__ = ("expression", "then_body", "else_body", "if_scope", "else_scope")
+
+  # items is [condition, then body, else body]. For "else if", the else body
+  # is a list containing the inner IfStatement.
   def __init__(self, items, pos):
     super().__init__(pos)
     assert(len(items) == 3)
     self.expression = items[0]
     self.then_body = items[1] or []
-    if items[2]:
-      if isinstance(items[2], ElseStatementTemp):
-        self.else_body = items[2].body or []
-      elif isinstance(items[2], ElseIfStatementTemp):
-        self.else_body = [IfStatement([items[2].condition, items[2].body, items[2].continuation], items[2].pos)]
-      else:
-        assert(False)
-
-    else:
-      self.else_body = []
+    self.else_body = items[2] or []
     self.if_scope = None
     self.else_scope = None
 
@@ -194,6 +145,8 @@ class IfStatement(Statement):
 
 
 class WhileStatement(Statement):
+  __slots__ = ("expression", "body")
+
   def __init__(self, items, pos):
     super().__init__(pos)
     assert(len(items) == 2)
@@ -209,6 +162,8 @@ class WhileStatement(Statement):
 
 
 class ReturnStatement(Statement):
+  __slots__ = ("expression",)
+
   def __init__(self, items, pos):
     super().__init__(pos)
     self.expression = items[0]
@@ -221,11 +176,15 @@ class ReturnStatement(Statement):
 
 
 class Expression(ParseTreeNode):
+  __slots__ = ()
+
   def __init__(self, pos):
     super().__init__(pos)
 
 
 class FunctionCall(Expression):
+  __slots__ = ("function", "parameters")
+
   def __init__(self, function, parameters, pos):
     super().__init__(pos)
     assert(isinstance(function, VariableExpression) or isinstance(function, ArrayIndexExpression) or isinstance(function, FunctionCall))
@@ -243,6 +202,8 @@ class FunctionCall(Expression):
 
 
 class VariableExpression(Expression):
+  __slots__ = ("name", "resolved_variable")
+
   def __init__(self, name, pos):
     super().__init__(pos)
     self.name = name
@@ -259,6 +220,8 @@ class VariableExpression(Expression):
 
 
 class ArrayIndexExpression(Expression):
+  __slots__ = ("array", "index")
+
   def __init__(self, array, index, pos):
     super().__init__(pos)
     assert(isinstance(array, VariableExpression) or isinstance(array, ArrayIndexExpression) or isinstance(array, FunctionCall))
@@ -281,6 +244,8 @@ class ArrayIndexExpression(Expression):
 
 
 class NumberExpression(Expression):
+  __slots__ = ("value",)
+
   def __init__(self, value, pos):
     super().__init__(pos)
     self.value = value
@@ -293,6 +258,8 @@ class NumberExpression(Expression):
 
 
 class StringExpression(Expression):
+  __slots__ = ("value",)
+
   def __init__(self, value, pos):
     super().__init__(pos)
     self.value = value
@@ -305,6 +272,8 @@ class StringExpression(Expression):
 
 
 class NewExpression(Expression):
+  __slots__ = ("class_name", "parameters", "function_call")
+
   def __init__(self, items, pos):
     super().__init__(pos)
     self.class_name = items[0].value
@@ -316,6 +285,8 @@ class NewExpression(Expression):
 
 
 class AddExpression(Expression):
+  __slots__ = ("items",)
+
   def __init__(self, items, pos):
     super().__init__(pos)
     self.items = items
@@ -328,6 +299,8 @@ class AddExpression(Expression):
 
 
 class MultiplyExpression(Expression):
+  __slots__ = ("items",)
+
   def __init__(self, items, pos):
     super().__init__(pos)
     self.items = items
@@ -340,6 +313,8 @@ class MultiplyExpression(Expression):
 
 
 class BooleanExpression(Expression):
+  __slots__ = ("items",)
+
   def __init__(self, items, pos):
     super().__init__(pos)
     assert(len(items) == 3)
@@ -353,14 +328,38 @@ class BooleanExpression(Expression):
 
 
 class Program(ParseTreeNode):
+  __slots__ = ("statements", "main_function")
+
   def __init__(self, items, pos):
     super().__init__(pos)
     self.statements = items[0] or []
+    self.main_function = None
 
   def __str__(self):
     return "Program(" + list_to_string(self.statements) + ")"
 
 
+# Node class -> the names of all its slots, including the inherited ones.
+all_slots_by_class = dict()
+
+def all_slots(node_class):
+  if node_class not in all_slots_by_class:
+    all_slots_by_class[node_class] = [name for c in node_class.__mro__ for name in c.__dict__.get("__slots__", ())]
+  return all_slots_by_class[node_class]
+
+# Returns the parse tree nodes directly below node. Note that a node can be
+# reachable via several parents (e.g., the parameters of a NewExpression).
+def child_nodes(node):
+  children = []
+  for name in all_slots(type(node)):
+    value = getattr(node, name, None)
+    if isinstance(value, ParseTreeNode):
+      children.append(value)
+    elif isinstance(value, list):
+      children.extend(item for item in value if isinstance(item, ParseTreeNode))
+  return children
+
+
 class ParseTreeVisitor:
   def __init__(self):
     self.visit_expressions = True
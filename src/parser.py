@@ -9,71 +9,86 @@ class Parser:
   def __init__(self, scanner, grammar):
     self.__scanner = scanner
     self.__grammar = grammar
-    self.__stack = ["program"]
+    # Both stacks have their top at the end, so that pushing and popping don't
+    # copy them. The parse stack contains grammar symbol ids, and predictions
+    # are pushed in reverse order.
+    self.__stack = [grammar.symbol_ids["program"]]
     self.__ctor_stack = []
+    # Maps Token.kind into the id of the corresponding grammar symbol.
+    self.__token_ids = [grammar.finalId("token_" + t.name) for t in TokenType]
     self.program = None
 
   def parse(self):
-    pos = self.__scanner.pos
-    token = self.__scanner.nextToken()
+    grammar = self.__grammar
+    table = grammar.prediction_table
+    stride = grammar.prediction_stride
+    epsilon_id = grammar.epsilon_id
+    token_ids = self.__token_ids
+
+    # The tokens are scanned lazily, as the parser consumes them.
+    tokens = self.__scanner.tokens()
+    (pos, token) = next(tokens)
+    token_id = token_ids[token.kind]
     # print_debug("Got token " + str(token))
 
-    while len(self.__stack):
-      # print_debug("Stack is " + str(self.__stack))
+    stack = self.__stack
+    while len(stack):
+      # print_debug("Stack is " + str([grammar.symbol_names[i] for i in stack]))
       # print_debug("Token is " + str(token))
       # print_debug("Ctor stack is " + list_to_string(self.__ctor_stack))
 
-      while self.__stack[0] == "epsilon":
+      while stack[-1] == epsilon_id:
         self.__gather(None, pos)
-        self.__stack.pop(0)
-
-      # print_debug("Stack is " + str(self.__stack))
-      # print_debug("Token is " + str(token))
-      # print_debug("Ctor stack is " + list_to_string(self.__ctor_stack))
+        stack.pop()
 
-      if self.__stack[0] == token.name():
-        self.__stack.pop(0)
+      top = stack[-1]
+      if top == token_id:
+        stack.pop()
         # print_debug("Consumed " + str(token))
         self.__gather(token, pos)
-        pos = self.__scanner.pos
-        token = self.__scanner.nextToken()
+        (pos, token) = next(tokens)
+        token_id = token_ids[token.kind]
         # print_debug("Got token " + str(token))
         continue
 
-      try:
-        (prediction, rule) = self.__grammar.predict(self.__stack[0], token.name())
-        self.success = True
-      except SyntaxError as e:
+      # Finals other than the current token aren't in the table either.
+      prediction = table.get(top * stride + token_id)
+      if prediction is None:
         self.success = False
-        self.error = e
-        e.pos = pos
-        e.message = ("Syntax error: Expected " + str(self.__stack[0]) + ", got " +
-                     str(token.name()) + ".")
+        self.error = SyntaxError(pos, "Grammar error: top of stack is " + grammar.symbol_names[top] + ", token is: " + token.name())
+        self.error.pos = pos
+        self.error.message = ("Syntax error: Expected " + grammar.symbol_names[top] + ", got " +
+                              token.name() + ".")
         return
+      self.success = True
 
-      if rule and rule.gatherer:
+      (reversed_production, rule) = prediction
+      if rule.gatherer:
         # print_debug("rule is " + str(rule.gatherer))
-        self.__ctor_stack = [rule.gatherer()] + self.__ctor_stack
+        gatherer = rule.gatherer()
+        gatherer.setPos(pos)
+        self.__ctor_stack.append(gatherer)
 
-      # print_debug("Got prediction " + str(prediction))
-      self.__stack = prediction + self.__stack[1:]
+      # print_debug("Got prediction " + str(rule))
+      stack.pop()
+      stack.extend(reversed_production)
 
   def __gather(self, item, pos):
     #print_debug("gather " + str(self.__ctor_stack))
     #print_debug("gather " + str(item))
-    if len(self.__ctor_stack) == 0:
+    ctor_stack = self.__ctor_stack
+    if len(ctor_stack) == 0:
       #print_debug("no more ctor stack");
       #print_debug(str(item))
       return
-    if self.__ctor_stack[0]:
-      self.__ctor_stack[0].add(item, pos)
-      while self.__ctor_stack[0].done():
-        result = self.__ctor_stack[0].result()
-        self.__ctor_stack.pop(0)
-        if len(self.__ctor_stack) == 0:
+    if ctor_stack[-1]:
+      ctor_stack[-1].add(item, pos)
+      while ctor_stack[-1].done():
+        result = ctor_stack.pop().result()
+        if len(ctor_stack) == 0:
           # We're done with the program. Save it.
           self.program = result
           return
         # FIXME: pos here might be wrong; not sure.
         # print_debug("re-routing result " + str(result))
-        self.__ctor_stack[0].add(result, pos)
+        ctor_stack[-1].add(result, pos)
@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+
+# Collects a profile of a program run by the Interpreter: for each function,
+# the number of calls and the inclusive and exclusive time, and for each
+# statement, how many times it was executed. Functions and statements are
+# identified by their source positions. The top level is profiled as a
+# function with the position None.
+
+import bisect
+import json
+import time
+
+TOP_LEVEL_NAME = "<top level>"
+
+class FunctionProfile:
+  def __init__(self, name, pos):
+    self.name = name
+    self.pos = pos
+    self.calls = 0
+    # Time spent in the function, including / excluding the functions it
+    # called. For recursive functions, the inclusive time is only counted for
+    # the outermost call.
+    self.inclusive_time = 0.0
+    self.exclusive_time = 0.0
+    # How many calls of this function are being executed.
+    self.active = 0
+
+
+class Profiler:
+  def __init__(self, clock = time.perf_counter):
+    self.clock = clock
+    # Position -> FunctionProfile.
+    self.functions = dict()
+    # Position -> how many times the statement was executed.
+    self.statement_counts = dict()
+    # [FunctionProfile, start time, time spent in callees] for each function
+    # being executed.
+    self.__stack = []
+    self.__line_starts = [0]
+
+  # Called by the Interpreter when the program starts.
+  def begin(self, source):
+    newline = "\n" if isinstance(source, str) else b"\n"
+    ix = source.find(newline)
+    while ix != -1:
+      self.__line_starts.append(ix + 1)
+      ix = source.find(newline, ix + 1)
+    self.enterFunction(TOP_LEVEL_NAME, None)
+
+  # Called by the Interpreter when the program ends, also when it ends with an
+  # error; the functions being executed end then.
+  def end(self):
+    while self.__stack:
+      self.exitFunction()
+
+  def countStatement(self, statement):
+    pos = statement.pos
+    self.statement_counts[pos] = self.statement_counts.get(pos, 0) + 1
+
+  def enterFunction(self, name, pos):
+    profile = self.functions.get(pos)
+    if profile is None:
+      profile = FunctionProfile(name, pos)
+      self.functions[pos] = profile
+    profile.active += 1
+    self.__stack.append([profile, self.clock(), 0.0])
+
+  def exitFunction(self):
+    (profile, start, callee_time) = self.__stack.pop()
+    elapsed = self.clock() - start
+    profile.calls += 1
+    profile.active -= 1
+    if profile.active == 0:
+      profile.inclusive_time += elapsed
+    profile.exclusive_time += elapsed - callee_time
+    if self.__stack:
+      self.__stack[-1][2] += elapsed
+
+  # Returns (line, column), both starting from 1.
+  def lineAndColumn(self, pos):
+    line = bisect.bisect_right(self.__line_starts, pos)
+    return (line, pos - self.__line_starts[line - 1] + 1)
+
+  def __sortedFunctions(self):
+    return sorted(self.functions.values(), key = lambda f: f.exclusive_time, reverse = True)
+
+  def __sortedStatements(self):
+    return sorted(self.statement_counts.items(), key = lambda item: (-item[1], item[0]))
+
+  def toJson(self):
+    functions = []
+    for f in self.__sortedFunctions():
+      line = None if f.pos is None else self.lineAndColumn(f.pos)[0]
+      functions.append({"name": f.name, "pos": f.pos, "line": line, "calls": f.calls,
+                        "inclusive_time": f.inclusive_time, "exclusive_time": f.exclusive_time})
+    statements = []
+    for (pos, count) in self.__sortedStatements():
+      (line, column) = self.lineAndColumn(pos)
+      statements.append({"pos": pos, "line": line, "column": column, "count": count})
+    return json.dumps({"functions": functions, "statements": statements}, indent = 2)
+
+  # Functions are sorted by the exclusive time and statements by the count;
+  # statement_limit is the number of statements to include (None for all).
+  def textReport(self, statement_limit = 20):
+    lines = ["%-24s %6s %10s %14s %14s" % ("Function", "Line", "Calls", "Inclusive ms", "Exclusive ms")]
+    for f in self.__sortedFunctions():
+      line = "" if f.pos is None else str(self.lineAndColumn(f.pos)[0])
+      lines.append("%-24s %6s %10d %14.3f %14.3f" % (f.name, line, f.calls, f.inclusive_time * 1000, f.exclusive_time * 1000))
+    lines.append("")
+    lines.append("%-12s %10s" % ("Statement", "Count"))
+    for (pos, count) in self.__sortedStatements()[:statement_limit]:
+      lines.append("%-12s %10d" % ("%d:%d" % self.lineAndColumn(pos), count))
+    return "\n".join(lines)
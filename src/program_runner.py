@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+
+# An API for running programs with the Interpreter from other Python code.
+# run_program runs one program with its own state and returns what it printed
+# and the error it ended with, if any. run_programs runs many programs in a
+# pool of processes; each process builds the GrammarDriver once and runs its
+# share of the programs one after another.
+
+from grammar import GrammarDriver
+from grammar_rules import rules
+from interpreter import ExecutionMode, Interpreter, InterpreterException
+from scanner import map_source_file
+from scope_analyser import ScopeError
+
+import concurrent.futures
+import io
+import os
+import sys
+
+class ProgramResult:
+  def __init__(self, output, error = None, message = None):
+    # What the program printed, also before an error.
+    self.output = output
+    # The name of the exception class the program ended with (e.g.,
+    # "InterpreterException", "ScopeError" or "RecursionError"), or None.
+    self.error = error
+    self.message = message
+
+  def __str__(self):
+    if self.error is None:
+      return "ProgramResult(ok)"
+    return "ProgramResult(" + self.error + ": " + self.message + ")"
+
+
+# The message of an exception, without the position of the error.
+def error_message(e):
+  if isinstance(getattr(e, "message", None), str):
+    return e.message
+  # The Interpreter raises RuntimeError(message, pos) for e.g. wrong calls.
+  if e.args and isinstance(e.args[0], str):
+    return e.args[0]
+  return str(e)
+
+
+# Runs source with the Interpreter in mode. grammar is a GrammarDriver; it's
+# not modified, so the same one can be used for all programs.
+def run_program(grammar, source, mode = ExecutionMode.tree_walking):
+  stream = io.StringIO()
+  try:
+    Interpreter(grammar, source, mode, stream, 0).run()
+  except (Exception, InterpreterException, ScopeError) as e:
+    return ProgramResult(stream.getvalue(), e.__class__.__name__, error_message(e))
+  return ProgramResult(stream.getvalue())
+
+
+# The GrammarDriver and the ExecutionMode of a worker process.
+worker_grammar = None
+worker_mode = None
+
+def initialize_worker(mode):
+  global worker_grammar, worker_mode
+  worker_grammar = GrammarDriver(rules)
+  worker_mode = mode
+
+
+def run_in_worker(source):
+  return run_program(worker_grammar, source, worker_mode)
+
+
+# Runs the sources in max_workers processes (by default, one per CPU) and
+# returns the ProgramResults in the same order.
+def run_programs(sources, mode = ExecutionMode.tree_walking, max_workers = None):
+  sources = list(sources)
+  if not sources:
+    return []
+  workers = max_workers or os.cpu_count() or 1
+  # Sending the programs in chunks saves round trips for small programs, but
+  # the chunks must be small enough to keep all processes busy until the end.
+  chunk_size = max(1, len(sources) // (workers * 4))
+  with concurrent.futures.ProcessPoolExecutor(workers, initializer = initialize_worker, initargs = (mode,)) as executor:
+    return list(executor.map(run_in_worker, sources, chunksize = chunk_size))
+
+
+if __name__ == "__main__":
+  # Usage: program_runner.py [-j workers] file...
+  # Prints the output of each program, and the error it ended with.
+  max_workers = None
+  if len(sys.argv) < 2 or (sys.argv[1] == "-j" and len(sys.argv) < 3):
+    print("Usage: program_runner.py [-j workers] file...")
+    exit(1)
+  if sys.argv[1] == "-j":
+    max_workers = int(sys.argv[2])
+    del sys.argv[1:3]
+  file_names = sys.argv[1:]
+  # Mapped files can't be sent to other processes.
+  sources = [bytes(map_source_file(f)) for f in file_names]
+  failed = 0
+  for (file_name, result) in zip(file_names, run_programs(sources, max_workers = max_workers)):
+    print("== " + file_name)
+    print(result.output, end="")
+    if result.error:
+      print(result.error + ": " + result.message)
+      failed += 1
+  exit(1 if failed else 0)
@@ -58,7 +58,8 @@ class PAConstant:
     self.value = value
 
   def __str__(self):
-    return "$0x{0:x}".format(self.value)
+    # Negative values are written as -0x..., which the assembler understands.
+    return "${0:#x}".format(self.value)
 
   def registersWrittenIfTarget(self):
     return []
@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+
+# Finds the pure functions of an analysed program: functions whose return value
+# only depends on their parameters and which have no side effects. A function
+# is pure if it
+#  - doesn't read or write variables of outer functions or the top level
+#    (except for referring to functions, which are never reassigned),
+#  - doesn't store into arrays or create them,
+#  - only calls pure functions directly (and not builtins or functions stored
+#    in variables).
+# Inner function declarations don't make a function impure, but calling inner
+# functions which read the variables of the function does.
+
+from parse_tree import *
+from type_enums import VariableType
+
+class PurityAnalyser:
+  def __init__(self, program):
+    self.__program = program
+
+  # Returns the set of pure FunctionStatements.
+  def analyse(self):
+    functions = []
+    # Variables which are assigned somewhere; if a function variable is
+    # reassigned, calling it might call any function.
+    assigned = set()
+    nodes = list(self.__program.statements)
+    while nodes:
+      node = nodes.pop()
+      if isinstance(node, FunctionStatement):
+        functions.append(node)
+      elif isinstance(node, AssignmentStatement) and isinstance(node.where, VariableExpression):
+        assigned.add(node.where.resolvedVariable())
+      nodes += child_nodes(node)
+
+    # FunctionStatement -> the FunctionStatements it calls.
+    callees = dict()
+    pure = set()
+    for f in functions:
+      function_callees = self.__analyseFunction(f, assigned)
+      if function_callees is not None:
+        callees[f] = function_callees
+        pure.add(f)
+
+    # Functions calling impure functions are impure.
+    changed = True
+    while changed:
+      changed = False
+      for f in list(pure):
+        if not callees[f] <= pure:
+          pure.remove(f)
+          changed = True
+    return pure
+
+  # Returns the FunctionStatements called by f, or None if f is impure even if
+  # they're pure.
+  def __analyseFunction(self, f, assigned):
+    depth = f.function.scope.depth
+    callees = set()
+    nodes = list(f.body)
+    while nodes:
+      node = nodes.pop()
+      if isinstance(node, FunctionStatement):
+        # Declaring an inner function is fine; it's analysed separately.
+        continue
+
+      if isinstance(node, AssignmentStatement):
+        # Array stores and writes to outer variables.
+        if not isinstance(node.where, VariableExpression) or node.where.resolvedVariable().depth != depth:
+          return None
+
+      elif isinstance(node, VariableExpression):
+        variable = node.resolvedVariable()
+        if variable.depth != depth:
+          if variable.variable_type != VariableType.user_function or variable in assigned:
+            return None
+
+      elif isinstance(node, FunctionCall):
+        variable = node.function.resolvedVariable() if isinstance(node.function, VariableExpression) else None
+        if variable is None or variable.variable_type != VariableType.user_function or variable in assigned:
+          return None
+        callees.add(variable.function_statement)
+
+      elif isinstance(node, NewExpression):
+        return None
+
+      nodes += child_nodes(node)
+    return callees
@@ -0,0 +1,525 @@
+#!/usr/bin/python3
+
+# Generates Python source code from the control flow graphs created by
+# CfgCreator, and runs it with exec. Each function of the program becomes a
+# Python function, nested inside the Python function of the function which
+# declares it (the top level becomes the function "main"), so that the
+# variables of the outer functions are Python closure variables. Variables are
+# Python locals, named after the source name, the depth and the slot.
+#
+# The behaviour is the same as the Interpreter's: ints are unbounded,
+# divisions round down, and the same run-time errors are raised in the same
+# order. Each expression is generated as one Python expression, which CPython
+# evaluates from left to right like the Interpreter does; the type checks are
+# done inline.
+#
+# Statements and ifs and whiles are recovered from the CFGs: a block which is
+# the target of a back edge is the condition block of a while, and the body of
+# an if ends at the first block which both branches reach.
+
+from cfg_creator import BasicBlock, BasicBlockBranch, CfgCreator
+from constant_folder import ConstantFolder, is_int_expression
+from constants import *
+from grammar import GrammarDriver
+from grammar_rules import rules
+from interpreter import Array, BuiltinFunction, DEFAULT_FLUSH_SIZE, ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT, ERROR_ARRAY_BASE_NOT_ARRAY, ERROR_ARRAY_SIZE_NOT_INT, InterpreterException, OutputSink, array_builtin
+from parse_tree import *
+from parser import Parser
+from scanner import Scanner, TokenType, map_source_file
+from scope_analyser import ScopeAnalyser
+from type_enums import ScopeType, VariableType
+from variable import Function, FunctionVariable
+
+from collections import deque
+
+import io
+import sys
+import types
+
+INDENT = "  "
+
+MAIN_FUNCTION_NAME = "main"
+
+OPERATORS = {TokenType.plus: "+",
+             TokenType.minus: "-",
+             TokenType.multiplication: "*",
+             TokenType.division: "//",
+             TokenType.equals: "==",
+             TokenType.not_equals: "!=",
+             TokenType.less_than: "<",
+             TokenType.less_or_equals: "<=",
+             TokenType.greater_than: ">",
+             TokenType.greater_or_equals: ">="}
+
+# Used by the generated code for checking the type of a value which is not in
+# a variable.
+TEMPORARY_NAME = "_t"
+
+
+# The functions below are called by the generated code.
+
+def arithmetic_error():
+  raise InterpreterException(ERROR_ARITHMETIC_OPERATION_PARAMETER_NOT_INT)
+
+
+def array_base_error():
+  raise InterpreterException(ERROR_ARRAY_BASE_NOT_ARRAY)
+
+
+def new_array(size):
+  if type(size) is not int:
+    raise InterpreterException(ERROR_ARRAY_SIZE_NOT_INT)
+  return Array(size)
+
+
+# Calls a function which is not known when generating the code.
+def call_function(parameters, function, pos):
+  if isinstance(function, BuiltinFunction):
+    return function.execute(list(parameters))
+  if type(function) is not types.FunctionType:
+    raise RuntimeError("RuntimeError: Calling something which is not a function", pos)
+  parameter_count = function.__code__.co_argcount
+  if len(parameters) != parameter_count:
+    raise RuntimeError("RuntimeError: Wrong number of parameters, expecting " + str(parameter_count), pos)
+  return function(*parameters)
+
+
+def new_object(parameters, function):
+  if isinstance(function, BuiltinFunction):
+    return function.execute(list(parameters))
+  # No user defined classes yet.
+  assert(False)
+
+
+# Returns the print function of the generated code, writing to sink.
+def create_print(sink):
+  def print_value(value):
+    if value == None:
+      sink.write("undefined\n")
+    elif type(value) is types.FunctionType:
+      # Strip the depth and the slot from the name.
+      sink.write("Function(" + value.__name__.rsplit("_", 2)[0] + ")\n")
+    else:
+      sink.write(str(value) + "\n")
+  return print_value
+
+
+def python_name(variable):
+  return variable.name + "_" + str(variable.depth) + "_" + str(variable.slot)
+
+
+def python_tuple(items):
+  if len(items) == 1:
+    return "(" + items[0] + ",)"
+  return "(" + ", ".join(items) + ")"
+
+
+# The variables allocated in the function (or top level) of allocation_scope,
+# including the ones in its sub scopes.
+def allocated_variables(allocation_scope):
+  variables = []
+  scopes = [allocation_scope]
+  # The same sub scope can be several times in the children.
+  seen = set()
+  while scopes:
+    scope = scopes.pop()
+    if scope in seen:
+      continue
+    seen.add(scope)
+    variables += scope.variables
+    scopes += [child for child in scope.children if child.scope_type != ScopeType.function]
+  return variables
+
+
+class PythonCodeGenerator:
+  # cfgs are created by CfgCreator from the program.
+  def __init__(self, program, cfgs):
+    self.__program = program
+    self.__cfgs = cfgs
+    # The depth, the loop headers and the variables of outer functions
+    # assigned by the function whose code we're generating.
+    self.__depth = 0
+    self.__loop_headers = None
+    self.__nonlocals = None
+
+  # Returns the source code of a module defining the function main, which runs
+  # the program. The module expects the functions above, Array,
+  # BuiltinFunction, print_value and BUILTIN_FUNCTIONS (builtin name ->
+  # BuiltinFunction) in its globals.
+  def generate(self):
+    # Variables which are assigned somewhere; calls via them can't be
+    # generated as direct calls.
+    self.__assigned = set()
+    nodes = list(self.__program.statements)
+    while nodes:
+      node = nodes.pop()
+      if isinstance(node, AssignmentStatement) and isinstance(node.where, VariableExpression):
+        self.__assigned.add(node.where.resolvedVariable())
+      nodes += child_nodes(node)
+
+    # Function -> [(Function, blocks)] for the functions declared in it.
+    self.__inner_functions = dict()
+    main = None
+    for (function, blocks) in self.__cfgs:
+      if function.outer_function is None:
+        main = (function, blocks)
+      else:
+        self.__inner_functions.setdefault(function.outer_function, []).append((function, blocks))
+    assert(main)
+
+    lines = []
+    self.__generateFunction(main[0], main[1], lines, "")
+    return "\n".join(lines) + "\n"
+
+  def __generateFunction(self, function, blocks, lines, indent):
+    outer_depth = self.__depth
+    outer_loop_headers = self.__loop_headers
+    outer_nonlocals = self.__nonlocals
+    self.__depth = function.scope.depth
+    self.__loop_headers = self.__findLoopHeaders(blocks[0])
+    self.__nonlocals = set()
+
+    body_indent = indent + INDENT
+    body = []
+    locals = []
+    for v in allocated_variables(function.scope):
+      if v.variable_type == VariableType.builtin_function:
+        body.append(body_indent + python_name(v) + " = BUILTIN_FUNCTIONS[" + repr(v.name) + "]")
+      elif v.variable_type == VariableType.variable and not v.is_parameter:
+        locals.append(python_name(v))
+    # Inner functions might read variables before they're declared.
+    if locals:
+      body.append(body_indent + " = ".join(locals) + " = None")
+    for (inner_function, inner_blocks) in self.__inner_functions.get(function, []):
+      self.__generateFunction(inner_function, inner_blocks, body, body_indent)
+    self.__generateBlocks(blocks[0], None, body, body_indent)
+
+    if function.outer_function is None:
+      name = MAIN_FUNCTION_NAME
+    else:
+      name = python_name(function.function_variable)
+    parameters = [python_name(v) for v in function.parameter_variables]
+    lines.append(indent + "def " + name + "(" + ", ".join(parameters) + "):")
+    if self.__nonlocals:
+      lines.append(body_indent + "nonlocal " + ", ".join(sorted(self.__nonlocals)))
+    lines += body or [body_indent + "pass"]
+
+    self.__depth = outer_depth
+    self.__loop_headers = outer_loop_headers
+    self.__nonlocals = outer_nonlocals
+
+  # Returns the blocks where the control can flow after block. The statements
+  # after a return statement are dead code, but CfgCreator still links the
+  # blocks.
+  @staticmethod
+  def __successors(block):
+    if block.statements and isinstance(block.statements[-1], ReturnStatement):
+      return []
+    if isinstance(block.next, BasicBlockBranch):
+      return [block.next.true_block, block.next.false_block]
+    if isinstance(block.next, BasicBlock):
+      return [block.next]
+    return []
+
+  # Returns the blocks which are targets of back edges in a depth first search
+  # from entry; since the CFG was created from ifs and whiles, they're the
+  # condition blocks of whiles.
+  def __findLoopHeaders(self, entry):
+    headers = set()
+    visited = {entry}
+    on_path = {entry}
+    # (block, iterator over the successors which haven't been visited yet)
+    stack = [(entry, iter(self.__successors(entry)))]
+    while stack:
+      (block, successors) = stack[-1]
+      successor = next(successors, None)
+      if successor is None:
+        stack.pop()
+        on_path.remove(block)
+      elif successor in on_path:
+        headers.add(successor)
+      elif successor not in visited:
+        visited.add(successor)
+        on_path.add(successor)
+        stack.append((successor, iter(self.__successors(successor))))
+    return headers
+
+  # Returns the blocks reachable from block without going through stop.
+  def __reachable(self, block, stop):
+    reachable = set()
+    blocks = [block]
+    while blocks:
+      block = blocks.pop()
+      if block is stop or block in reachable:
+        continue
+      reachable.add(block)
+      blocks += self.__successors(block)
+    return reachable
+
+  # Returns True if the control can flow from block to stop (None meaning the
+  # end of the function), and not only return.
+  def __reachesStop(self, block, stop):
+    for b in self.__reachable(block, stop):
+      successors = self.__successors(b)
+      if stop in successors:
+        return True
+      if stop is None and b.next is None and not (b.statements and isinstance(b.statements[-1], ReturnStatement)):
+        return True
+    return False
+
+  # Returns the first block which is reachable from both branches before stop,
+  # or None if there is none (one of the branches returns).
+  def __findMerge(self, branch, stop):
+    true_blocks = self.__reachable(branch.true_block, stop)
+    seen = set()
+    queue = deque([branch.false_block])
+    while queue:
+      block = queue.popleft()
+      if block is stop or block in seen:
+        continue
+      if block in true_blocks:
+        return block
+      seen.add(block)
+      queue += self.__successors(block)
+    return None
+
+  # Generates the code for block and the blocks after it, until stop.
+  def __generateBlocks(self, block, stop, lines, indent):
+    while block is not None and block is not stop:
+      if block in self.__loop_headers:
+        assert(not block.statements)
+        branch = block.next
+        lines.append(indent + "while " + self.__expression(branch.condition) + ":")
+        self.__generateBody(branch.true_block, block, lines, indent + INDENT)
+        block = branch.false_block
+        continue
+
+      for s in block.statements:
+        self.__generateStatement(s, lines, indent)
+      if block.statements and isinstance(block.statements[-1], ReturnStatement):
+        return
+
+      if not isinstance(block.next, BasicBlockBranch):
+        block = block.next
+        continue
+
+      branch = block.next
+      condition = self.__expression(branch.condition)
+      merge = self.__findMerge(branch, stop)
+      if merge is None:
+        # One of the branches always returns, so the other one can continue
+        # after the if.
+        if not self.__reachesStop(branch.true_block, stop):
+          lines.append(indent + "if " + condition + ":")
+          self.__generateBody(branch.true_block, stop, lines, indent + INDENT)
+          block = branch.false_block
+        else:
+          lines.append(indent + "if not " + condition + ":")
+          self.__generateBody(branch.false_block, stop, lines, indent + INDENT)
+          block = branch.true_block
+        continue
+
+      lines.append(indent + "if " + condition + ":")
+      self.__generateBody(branch.true_block, merge, lines, indent + INDENT)
+      if branch.false_block is not merge:
+        lines.append(indent + "else:")
+        self.__generateBody(branch.false_block, merge, lines, indent + INDENT)
+      block = merge
+
+  def __generateBody(self, block, stop, lines, indent):
+    body = []
+    self.__generateBlocks(block, stop, body, indent)
+    lines += body or [indent + "pass"]
+
+  def __generateStatement(self, s, lines, indent):
+    if isinstance(s, LetStatement):
+      assert(s.resolved_variable.depth == self.__depth)
+      lines.append(indent + python_name(s.resolved_variable) + " = " + self.__expression(s.expression))
+      return
+
+    if isinstance(s, AssignmentStatement):
+      if isinstance(s.where, VariableExpression):
+        variable = s.where.resolvedVariable()
+        name = python_name(variable)
+        if variable.depth != self.__depth:
+          self.__nonlocals.add(name)
+        lines.append(indent + name + " = " + self.__expression(s.expression))
+        return
+      assert(isinstance(s.where, ArrayIndexExpression))
+      lines.append(indent + self.__arrayBase(s.where.array) + ".setData(" + self.__expression(s.where.index) + ", " + self.__expression(s.expression) + ")")
+      return
+
+    if isinstance(s, FunctionCall):
+      lines.append(indent + self.__expression(s))
+      return
+
+    if isinstance(s, ReturnStatement):
+      if s.expression:
+        lines.append(indent + "return " + self.__expression(s.expression))
+      else:
+        lines.append(indent + "return None")
+      return
+
+    assert(False)
+
+  def __expression(self, e):
+    if isinstance(e, NumberExpression):
+      if e.value < 0:
+        return "(" + str(e.value) + ")"
+      return str(e.value)
+
+    if isinstance(e, StringExpression):
+      return repr(e.value)
+
+    if isinstance(e, VariableExpression):
+      assert(e.resolvedVariable())
+      return python_name(e.resolvedVariable())
+
+    if isinstance(e, AddExpression) or isinstance(e, MultiplyExpression):
+      parts = [self.__intOperand(e.items[0])]
+      for ix in range(1, len(e.items), 2):
+        parts += [OPERATORS[e.items[ix].token_type], self.__intOperand(e.items[ix + 1])]
+      return "(" + " ".join(parts) + ")"
+
+    if isinstance(e, BooleanExpression):
+      return "(" + self.__expression(e.items[0]) + " " + OPERATORS[e.items[1].token_type] + " " + self.__expression(e.items[2]) + ")"
+
+    if isinstance(e, FunctionCall):
+      return self.__functionCall(e)
+
+    if isinstance(e, NewExpression):
+      parameters = [self.__expression(p) for p in e.parameters]
+      variable = e.function_call.function.resolvedVariable()
+      assert(variable)
+      if variable.variable_type == VariableType.builtin_function and variable.name == "Array" and variable not in self.__assigned and len(parameters) == 1:
+        return "new_array(" + parameters[0] + ")"
+      return "new_object(" + python_tuple(parameters) + ", " + python_name(variable) + ")"
+
+    if isinstance(e, ArrayIndexExpression):
+      return self.__arrayBase(e.array) + ".getData(" + self.__expression(e.index) + ")"
+
+    assert(False)
+
+  # The value of e, checked to be an int.
+  def __intOperand(self, e):
+    value = self.__expression(e)
+    if is_int_expression(e):
+      return value
+    return self.__checkedValue(e, value, "int", "arithmetic_error()")
+
+  # The value of e, checked to be an Array.
+  def __arrayBase(self, e):
+    return self.__checkedValue(e, self.__expression(e), "Array", "array_base_error()")
+
+  @staticmethod
+  def __checkedValue(e, value, python_type, error):
+    if isinstance(e, VariableExpression):
+      return "(" + value + " if type(" + value + ") is " + python_type + " else " + error + ")"
+    return "(" + TEMPORARY_NAME + " if type(" + TEMPORARY_NAME + " := " + value + ") is " + python_type + " else " + error + ")"
+
+  def __functionCall(self, e):
+    parameters = [self.__expression(p) for p in e.parameters]
+    variable = e.function.resolvedVariable()
+    assert(variable)
+    name = python_name(variable)
+    if variable not in self.__assigned:
+      # The function is known, so it can be called directly.
+      if variable.variable_type == VariableType.user_function and len(parameters) == len(variable.function_statement.formal_parameters.items):
+        return name + "(" + ", ".join(parameters) + ")"
+      if variable.variable_type == VariableType.builtin_function and len(parameters) == 1:
+        if variable.name == "print":
+          return "print_value(" + parameters[0] + ")"
+        if variable.name == "Array":
+          return "new_array(" + parameters[0] + ")"
+    # The parameters are evaluated before the function is looked up.
+    return "call_function(" + python_tuple(parameters) + ", " + name + ", " + str(e.pos) + ")"
+
+
+# Runs a program by generating Python code for it. Like the Interpreter, if
+# output (a stream) is given, the output of the program is written there while
+# the program runs. Otherwise, it's collected and returned by run().
+class PythonCodeRunner:
+  def __init__(self, grammar, source, output = None, flush_size = DEFAULT_FLUSH_SIZE):
+    self.grammar = grammar
+    self.source = source
+    self.output = output
+    self.flush_size = flush_size
+    # The generated source code.
+    self.code = None
+
+  def run(self):
+    scanner = Scanner(self.source)
+    p = Parser(scanner, self.grammar)
+    p.parse()
+    if not p.success:
+      raise p.error
+
+    main_variable = FunctionVariable(MAIN_NAME, MAIN_NAME, None, None)
+    p.program.main_function = Function(main_variable)
+    p.program.main_function.name = MAIN_NAME
+    p.program.main_function.unique_name = MAIN_NAME
+
+    sa = ScopeAnalyser(p.program)
+    sa.builtins.add("print")
+    sa.builtins.add("Array")
+    sa.analyse()
+
+    if not sa.success:
+      raise sa.error
+
+    ConstantFolder(p.program).fold()
+
+    cfgs = CfgCreator(p.program).create()
+    self.code = PythonCodeGenerator(p.program, cfgs).generate()
+
+    if self.output is None:
+      stream = io.StringIO()
+    else:
+      stream = self.output
+    sink = OutputSink(stream, self.flush_size)
+
+    print_value = create_print(sink)
+    def print_builtin(parameters):
+      assert(len(parameters) == 1)
+      print_value(parameters[0])
+
+    namespace = {"Array": Array,
+                 "BuiltinFunction": BuiltinFunction,
+                 "BUILTIN_FUNCTIONS": {"print": BuiltinFunction("print", print_builtin),
+                                       "Array": BuiltinFunction("Array", array_builtin)},
+                 "arithmetic_error": arithmetic_error,
+                 "array_base_error": array_base_error,
+                 "call_function": call_function,
+                 "new_array": new_array,
+                 "new_object": new_object,
+                 "print_value": print_value}
+    exec(compile(self.code, "<generated>", "exec"), namespace)
+    try:
+      namespace[MAIN_FUNCTION_NAME]()
+    finally:
+      # Also the output before a run-time error is written.
+      sink.flush()
+
+    if self.output is None:
+      return stream.getvalue()
+    return None
+
+
+if __name__ == "__main__":
+  # Usage: python_code_generator.py [--dump] file
+  # With --dump, the generated code is printed instead of running it.
+  dump = False
+  if sys.argv[1] == "--dump":
+    dump = True
+    sys.argv.pop(1)
+  source = map_source_file(sys.argv[1])
+  grammar = GrammarDriver(rules)
+  if dump:
+    r = PythonCodeRunner(grammar, source, io.StringIO())
+    try:
+      r.run()
+    finally:
+      if r.code:
+        print(r.code, end="")
+  else:
+    PythonCodeRunner(grammar, source, sys.stdout).run()
@@ -53,7 +53,7 @@ class RealAssembler:
     self.__esp = Register("esp")
 
   # FIXME: refactor out common parts, move code to pseudo assembler.
-  def __createMainPrologue(self, spill_position, local_counts, string_count):
+  def __createMainPrologue(self, spill_position, local_counts):
     code = [Label("user_code"),
             PAComment("prologue"),
             # Crete stack frame for the main function.
@@ -64,13 +64,12 @@ class RealAssembler:
             # 2) Stack frame marker
             PAPush(PAConstant(0xc0decafe)),
             # 3) Function context pointer
-            PAPush(PAConstant(string_count)),
             PALea(PAVariable("strings"), self.__eax),
             PAPush(self.__eax),
             PAPush(PAConstant(local_counts)),
             PACallRuntimeFunction("CreateMainFunctionContext"),
             PABuiltinOrRuntimeFunctionReturnValueToRegister(self.__eax),
-            PAClearStack(3),
+            PAClearStack(2),
             PAPush(self.__eax),
             # Set spill count in function context
             PASub(PAConstant(PTR_TAG), self.__eax),
@@ -120,12 +119,30 @@ class RealAssembler:
             PAClearStack(3)]
     return code
 
+  # Each string is a separate null-terminated string in the read-only data
+  # section, followed by the string table: an array of tagged pointers to the
+  # strings. The runtime uses the table and the strings in place.
+  @staticmethod
+  def __createStringTable(string_table):
+    code = [".section .rodata"]
+    strings = string_table.strings()
+    for ix in range(len(strings)):
+      # The strings need to be aligned so that they can be tagged.
+      code += [".balign " + str(POINTER_SIZE),
+               Label("string_" + str(ix)),
+               ".asciz \"" + strings[ix] + "\""]
+    code += [".balign " + str(POINTER_SIZE),
+             Label("strings")]
+    for ix in range(len(strings)):
+      code.append(".long string_" + str(ix) + " + " + str(PTR_TAG))
+    code.append(".text")
+    return code
+
   def create(self, pseudo_assembly):
     # FIXME: when we have functions, we need to run the register allocator for each separately.
 
-    program = [GlobalDeclaration("user_code"),
-               Label("strings"),
-               ".ascii " + pseudo_assembly.metadata.string_table.dump()]
+    program = [GlobalDeclaration("user_code")]
+    program += RealAssembler.__createStringTable(pseudo_assembly.metadata.string_table)
 
     for [function, function_blocks] in pseudo_assembly.functions_and_blocks:
       # FIXME: function name needs to refer the outer function. Add tests that
@@ -157,7 +174,7 @@ class RealAssembler:
           assert(False)
 
       if function.name == MAIN_NAME:
-        program.extend(self.__createMainPrologue(spill_position, pseudo_assembly.metadata.function_param_and_local_counts[MAIN_NAME], pseudo_assembly.metadata.string_table.stringCount()))
+        program.extend(self.__createMainPrologue(spill_position, pseudo_assembly.metadata.function_param_and_local_counts[MAIN_NAME]))
       else:
         program.extend(self.__createFunctionPrologue(function.function_variable.unique_name(), spill_position))
 
@@ -2,6 +2,10 @@
 
 from enum import Enum
 
+import mmap
+import os
+import re
+
 class TokenType(Enum):
   invalid = 0
   number = 1
@@ -42,6 +46,8 @@ class TokenType(Enum):
 class Token:
   def __init__(self, token_type, value = None):
     self.token_type = token_type
+    # The integer kind is what the parser uses for looking up predictions.
+    self.kind = token_type.value
     self.value = value
 
   def __str__(self):
@@ -53,8 +59,7 @@ class Token:
 
   # The name of the token which occurs in the grammar
   def name(self):
-    s = str(self.token_type) # TokenType.name
-    return "token_" + s.split(".")[1]
+    return "token_" + self.token_type.name
 
 
 class StringTable:
@@ -71,11 +76,9 @@ class StringTable:
   def indexOfString(self, s):
     return self.__strings[s]
 
-  def dump(self):
-    main_string = ""
-    for s in self.__strings_array:
-      main_string += s + "\\0"
-    return "\"" + main_string + "\""
+  # The strings in the order of their indices.
+  def strings(self):
+    return self.__strings_array
 
   def stringCount(self):
     return len(self.__strings_array)
@@ -117,6 +120,31 @@ class Scanner:
     "new": TokenType.keyword_new,
   }
 
+  __trivialTokenTypes = dict(__trivialTokens)
+  __bytesTrivialTokenTypes = {token_string.encode(): token_type for (token_string, token_type) in __trivialTokens}
+
+  # Whitespace and comments between tokens.
+  __skipPatternSource = "[ \n]*(?://[^\n]*[ \n]*)*"
+
+  # One alternative per token class. The whitespace and comments after the token
+  # are consumed as part of the same match, so that reading a token is a single
+  # regex match which doesn't copy the rest of the source. The trivial tokens
+  # are ordered so that the longer ones are tried first.
+  __masterPatternSource = (
+    "(?:(?P<number>[0-9]+)" +
+    "|(?P<identifier>[a-zA-Z][a-zA-Z0-9_]*)" +
+    "|\"(?P<string>[^\"]*)\"?" +
+    "|(?P<trivial>" + "|".join(re.escape(token_string) for (token_string, token_type) in __trivialTokens) + "))" +
+    __skipPatternSource)
+
+  __skipPattern = re.compile(__skipPatternSource)
+  __masterPattern = re.compile(__masterPatternSource)
+
+  # The same patterns for scanning bytes (e.g., a memory-mapped file) without
+  # decoding the whole source first.
+  __bytesSkipPattern = re.compile(__skipPatternSource.encode())
+  __bytesMasterPattern = re.compile(__masterPatternSource.encode())
+
   @staticmethod
   def tokenNameToString(name):
     wanted_type = eval("TokenType." + name[len("token_"):])
@@ -125,83 +153,67 @@ class Scanner:
         return token_string
     assert(False)
 
-  def __init__(self, s):
+  # s is either a str, or a bytes-like object (bytes, mmap, memoryview)
+  # containing UTF-8. In the latter case, only the token values are decoded,
+  # and positions are byte offsets. Only s[start:end] is scanned, but the
+  # positions are still relative to the beginning of s.
+  def __init__(self, s, start = 0, end = None):
     self.s = s
-    self.pos = 0
-    self.__skipWhitespaceAndComments()
+    self.end = len(s) if end is None else end
+    self.__is_bytes = not isinstance(s, str)
+    if self.__is_bytes:
+      self.__master_pattern = Scanner.__bytesMasterPattern
+      self.__trivial_token_types = Scanner.__bytesTrivialTokenTypes
+      self.pos = Scanner.__bytesSkipPattern.match(s, start, self.end).end()
+    else:
+      self.__master_pattern = Scanner.__masterPattern
+      self.__trivial_token_types = Scanner.__trivialTokenTypes
+      self.pos = Scanner.__skipPattern.match(s, start, self.end).end()
     self.string_table = StringTable()
 
-  def __skipWhitespaceAndComments(self):
-    self.__skipWhitespace()
-    while self.pos + 1 < len(self.s) and self.s[self.pos] == "/" and self.s[self.pos + 1] == "/":
-      self.pos += 2
-      self.__skipUntilNewline()
-      self.__skipWhitespace()
-
-  def __skipWhitespace(self):
-    while self.__hasMore() and (self.s[self.pos] == " " or self.s[self.pos] == "\n"):
-      self.pos += 1
-
-  def __skipUntilNewline(self):
-    while self.__hasMore() and self.s[self.pos] != "\n":
-      self.pos += 1
-
-  def __scanNumber(self):
-    n = 0
-    while self.__hasMore() and self.s[self.pos] >= "0" and self.s[self.pos] <= "9":
-      n = n * 10 + ord(self.s[self.pos]) - ord("0")
-      self.pos += 1
-    return Token(TokenType.number, n)
-
-  def __scanString(self):
-    self.pos += 1
-    s = ""
-    while self.__hasMore() and self.s[self.pos] != "\"":
-      # FIXME: escaping
-      s += self.s[self.pos]
-      self.pos += 1
-    self.pos += 1
-    self.string_table.addString(s)
-    return Token(TokenType.string, s)
-
-  def __scanIdentifierOrKeyword(self):
-    name = ""
-    while self.__hasMore() and (
-        (self.s[self.pos] >= "a" and self.s[self.pos] <= "z") or
-        (self.s[self.pos] >= "A" and self.s[self.pos] <= "Z") or
-        (self.s[self.pos] >= "0" and self.s[self.pos] <= "9") or
-        self.s[self.pos] == '_'):
-      name += self.s[self.pos]
-      self.pos += 1
-    if name in Scanner.__keywords:
-      return Token(Scanner.__keywords[name])
-    return Token(TokenType.identifier, name)
-
-  def __hasMore(self):
-    return self.pos < len(self.s)
+  # Yields (position, token) pairs lazily. Like nextToken, keeps yielding eos at
+  # the end of the input.
+  def tokens(self):
+    while True:
+      pos = self.pos
+      yield (pos, self.nextToken())
 
   def nextToken(self):
-    token = self.__readNextToken()
-    self.__skipWhitespaceAndComments()
-    return token
-
-  def __readNextToken(self):
-    if not self.__hasMore():
-      return Token(TokenType.eos)
-
-    c = self.s[self.pos]
-
-    for (token_string, token_type) in Scanner.__trivialTokens:
-      if len(self.s[self.pos:]) >= len(token_string) and self.s[self.pos:(self.pos + len(token_string))] == token_string:
-        self.pos += len(token_string)
+    m = self.__master_pattern.match(self.s, self.pos, self.end)
+    if m is None:
+      if self.pos >= self.end:
+        return Token(TokenType.eos)
+      # Don't advance; the parser will report the error at this position.
+      return Token(TokenType.invalid)
+
+    self.pos = m.end()
+    kind = m.lastgroup
+    if kind == "identifier":
+      name = m.group("identifier")
+      if self.__is_bytes:
+        name = name.decode()
+      token_type = Scanner.__keywords.get(name)
+      if token_type is not None:
         return Token(token_type)
+      return Token(TokenType.identifier, name)
+    if kind == "number":
+      return Token(TokenType.number, int(m.group("number")))
+    if kind == "string":
+      # FIXME: escaping
+      s = m.group("string")
+      if self.__is_bytes:
+        s = s.decode()
+      self.string_table.addString(s)
+      return Token(TokenType.string, s)
+    return Token(self.__trivial_token_types[m.group("trivial")])
+
+
+# Maps the file into memory, so that a Scanner can read it without reading the
+# whole file into a str first.
+def map_source_file(file_name):
+  with open(file_name, "rb") as f:
+    if os.fstat(f.fileno()).st_size == 0:
+      # Empty files cannot be mapped.
+      return b""
+    return mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
 
-    if self.s[self.pos] >= "0" and self.s[self.pos] <= "9":
-      return self.__scanNumber()
-    if ((self.s[self.pos] >= "a" and self.s[self.pos] <= "z") or
-        (self.s[self.pos] >= "A" and self.s[self.pos] <= "Z")):
-      return self.__scanIdentifierOrKeyword()
-    if self.s[self.pos] == "\"":
-      return self.__scanString()
-
-    return Token(TokenType.invalid)
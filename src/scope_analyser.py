@@ -26,13 +26,23 @@ class Scope:
     # them in order (for simplicity; we also want to always allocate the
     # variables in the same order to be deterministic).
     self.variables = []
+    # The same variables by name, for fast lookups.
+    self.__variables_by_name = dict()
     self.children = []
+    # How deep inside functions the scope is; the top scope is at depth 0.
+    if parent is None:
+      self.depth = 0
+    elif scope_type == ScopeType.function:
+      self.depth = parent.depth + 1
+    else:
+      self.depth = parent.depth
+    # For function and top scopes: how many variables are allocated in the
+    # function context (including variables in sub scopes). Filled in by
+    # ScopeAnalyser.
+    self.slot_count = None
 
   def __getVariable(self, name):
-    for v in self.variables:
-      if v.name == name:
-        return v
-    return None
+    return self.__variables_by_name.get(name)
 
   def addVariable(self, variable):
     # print_debug("Adding variable " + str(variable) + " to scope " + str(self))
@@ -42,6 +52,7 @@ class Scope:
     # same variable. So, a variable in an if scope can shadow a variable in a
     # function.
     self.variables.append(variable)
+    self.__variables_by_name[variable.name] = variable
     return True
 
   def resolve(self, name):
@@ -268,7 +279,41 @@ class ScopeAnalyser:
     try:
       v1.visitProgram(self.__parse_tree)
       v2.visitProgram(self.__parse_tree)
+      ScopeAnalyser.__assignSlots(self.top_scope)
       self.success = True
     except ScopeError as e:
       self.success = False
       self.error = e
+
+  # Gives each variable allocated in the function (or top level) of
+  # allocation_scope a slot in the function context, so that at run time, a
+  # variable can be found by going depth levels up from the current function
+  # context and indexing with the slot.
+  @staticmethod
+  def __assignSlots(allocation_scope):
+    assert(allocation_scope.scope_type != ScopeType.sub)
+    function_scopes = []
+    slot = 0
+    scopes = [allocation_scope]
+    # Both analyser passes add the scopes they visit into the children of the
+    # parent, so the same child can be there several times.
+    seen = set()
+    while scopes:
+      scope = scopes.pop()
+      if scope in seen:
+        continue
+      seen.add(scope)
+      for v in scope.variables:
+        v.depth = allocation_scope.depth
+        v.slot = slot
+        slot += 1
+      for child in reversed(scope.children):
+        if child.scope_type == ScopeType.function:
+          if child not in seen:
+            seen.add(child)
+            function_scopes.append(child)
+        else:
+          scopes.append(child)
+    allocation_scope.slot_count = slot
+    for scope in function_scopes:
+      ScopeAnalyser.__assignSlots(scope)
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+
+from compilation_cache import CACHED_FILE_NAMES, CompilationCache, compiler_source_files, compiler_version, runtime_source_files
+
+import os
+import tempfile
+import time
+
+# Writes fake build files of size bytes for source into build_path.
+def write_build_files(build_path, source, size):
+  for name in CACHED_FILE_NAMES:
+    with open(os.path.join(build_path, name), "w") as f:
+      f.write((name + source + "\n") * (size // (len(name) + len(source) + 1) + 1))
+
+
+def read_build_files(build_path):
+  return [open(os.path.join(build_path, name)).read() for name in CACHED_FILE_NAMES]
+
+
+def check(condition, message):
+  if not condition:
+    print(message)
+    exit(1)
+
+
+if __name__ == '__main__':
+  with tempfile.TemporaryDirectory() as directory:
+    cache_path = os.path.join(directory, "cache")
+    cache = CompilationCache(cache_path, "version 1", 10000)
+
+    # A miss, then a hit with the same files.
+    key = cache.key("print(1);")
+    build_path = tempfile.mkdtemp(dir = directory)
+    check(not cache.fetch(key, build_path), "Expected a miss")
+    write_build_files(build_path, "print(1);", 1000)
+    cache.store(key, build_path)
+    fetch_path = tempfile.mkdtemp(dir = directory)
+    check(cache.fetch(key, fetch_path), "Expected a hit")
+    check(read_build_files(fetch_path) == read_build_files(build_path), "Got different files")
+
+    # Other sources and other compiler versions have other keys.
+    check(cache.key("print(2);") != key, "Same key for a different source")
+    check(CompilationCache(cache_path, "version 2").key("print(1);") != key, "Same key for a different version")
+
+    # Storing the same key again keeps the entry.
+    cache.store(key, build_path)
+    check(cache.statistics()["entries"] == 1, "Expected one entry")
+
+    # The least recently used entries are evicted when the cache is full; each
+    # entry is about 3000 bytes.
+    keys = [key]
+    for i in range(2):
+      source = "print(" + str(i + 2) + ");"
+      keys.append(cache.key(source))
+      write_build_files(build_path, source, 1000)
+      # The entries are ordered by their modification times.
+      time.sleep(0.01)
+      cache.store(keys[-1], build_path)
+    time.sleep(0.01)
+    check(cache.fetch(keys[0], fetch_path), "Expected a hit")
+    time.sleep(0.01)
+    keys.append(cache.key("print(4);"))
+    write_build_files(build_path, "print(4);", 1000)
+    cache.store(keys[-1], build_path)
+
+    check(cache.fetch(keys[0], fetch_path), "The recently used entry was evicted")
+    check(not cache.fetch(keys[1], fetch_path), "The least recently used entry was not evicted")
+    check(cache.fetch(keys[2], fetch_path), "Too many entries evicted")
+    check(cache.fetch(keys[3], fetch_path), "The new entry was evicted")
+
+    statistics = cache.statistics()
+    print(statistics)
+    check(statistics["hits"] == 5 and statistics["misses"] == 2 and statistics["evictions"] == 1, "Wrong statistics")
+    check(statistics["entries"] == 3 and statistics["size"] <= statistics["max_size"], "Wrong size")
+
+  # The compiler version covers the modules the compiler imports and the
+  # runtime sources, but not e.g. the tests, and doesn't depend on the current
+  # directory.
+  names = [os.path.basename(path) for path in compiler_source_files()]
+  for name in ["compiler.py", "scanner.py", "real_assembler.py", "register_allocator.py"]:
+    check(name in names, "Missing from the compiler sources: " + name)
+  check(not any(name.startswith("test_") or name.startswith("benchmark_") for name in names), "Tests in the compiler sources: " + str(names))
+  runtime_names = [os.path.basename(path) for path in runtime_source_files()]
+  check("runtime.cpp" in runtime_names and "Makefile" in runtime_names, "Missing runtime sources: " + str(runtime_names))
+  version = compiler_version()
+  current_directory = os.getcwd()
+  with tempfile.TemporaryDirectory() as directory:
+    os.chdir(directory)
+    check(compiler_version() == version, "The version depends on the current directory")
+    os.chdir(current_directory)
+
+  print("All OK!")
+  exit(0)
@@ -1,13 +1,18 @@
 #!/usr/bin/python3
 
-from grammar import GrammarDriver
-from grammar_rules import rules
-from interpreter import Interpreter
+from compilation_cache import CompilationCache, DEFAULT_COMPILATION_CACHE_SIZE, compiler_version
 
 from enum import Enum
+import concurrent.futures
 import os
 import re
 import subprocess
+import sys
+import tempfile
+import time
+
+RUNTIME_PATH = "runtime"
+RUNTIME_OBJECTS = ["runtime.o", "builtins.o", "memory.o", "stack_walk.o"]
 
 
 class TestResultStatus(Enum):
@@ -34,32 +39,56 @@ class Result:
     return Result(TestResultStatus.error, output, longer_output)
 
 
-def getOutput(input_file_name, gc_stress):
-  print("Running test " + input_file_name + ", gc_stress " + str(gc_stress))
+# The runtime objects are built once, before running the tests.
+def buildRuntime():
+  subprocess.check_output(["make", "-C", RUNTIME_PATH], stderr = subprocess.STDOUT)
 
-  input_file_path = os.path.join(test_path, input_file_name)
-  input_file = open(input_file_path, 'r')
-  input = input_file.read()
-  if input.startswith("SKIP"):
-    print("SKIPPED")
-    return Result.testSkipped()
 
-  input_file.close()
+# Returns a CompilationCache in directory for the current compiler and runtime.
+def createCache(directory, max_size):
+  return CompilationCache(directory, compiler_version(), max_size)
 
-  output = ""
+
+# Compiles the program into an executable in build_path (like compile.sh, but
+# without building the runtime). Returns the path of the executable, or an
+# error Result if the compilation failed. If cache (a CompilationCache) is
+# given, the files are copied from there if the same program was compiled
+# before.
+def compileTest(input_file_path, build_path, cache = None):
+  assembly_path = os.path.join(build_path, "temp.as")
+  object_path = os.path.join(build_path, "temp.o")
+  executable_path = os.path.join(build_path, "a.out")
+  if cache:
+    with open(input_file_path, "rb") as f:
+      key = cache.key(f.read())
+    if cache.fetch(key, build_path):
+      return executable_path
   try:
-    compile_output = subprocess.check_output(["src/compile.sh", input_file_path], stderr = subprocess.STDOUT)
+    with open(assembly_path, "w") as assembly_file:
+      subprocess.run([sys.executable, "src/compiler.py", input_file_path], stdout = assembly_file, stderr = subprocess.PIPE, check = True)
+    subprocess.check_output(["as", "-32", "-ggstabs", "-o", object_path, assembly_path], stderr = subprocess.STDOUT)
+    subprocess.check_output(["g++", "-m32", object_path] + [os.path.join(RUNTIME_PATH, o) for o in RUNTIME_OBJECTS] + ["-o", executable_path], stderr = subprocess.STDOUT)
   except subprocess.CalledProcessError as e:
-    error_line = e.output.decode("utf-8").split('\n')[-2]
+    lines = (e.stderr or e.output or b"").decode("utf-8").split('\n')
+    error_line = lines[-2] if len(lines) >= 2 else lines[-1]
+    output = ""
     error_search = re.search("(.*?)\.(.*?):", error_line)
     if error_search:
       output = error_search.group(2)
     return Result.testError(output, error_line)
+  if cache:
+    cache.store(key, build_path)
+  return executable_path
+
 
-  command = ["/tmp/a.out"]
+def getOutput(executable_path, gc_stress):
+  command = [executable_path]
   if gc_stress:
     command = command + ["--gc-stress"]
-  output = subprocess.check_output(command).decode("utf-8")
+  try:
+    output = subprocess.check_output(command).decode("utf-8")
+  except subprocess.CalledProcessError as e:
+    return Result.testError("Exited with status " + str(e.returncode), e.output.decode("utf-8"))
   lines = output.split('\n')
   if len(lines) < 2:
     return Result.testOk(output.strip())
@@ -68,48 +97,87 @@ def getOutput(input_file_name, gc_stress):
     return Result.testError(last_line, output)
   return Result.testOk(output.strip())
 
-skipped = 0
 
-def runTest(input_file_name, test_path, expect_error, gc_stress):
-  global skipped
+# Returns the failure message for the result, or None if it's what was
+# expected.
+def checkResult(result, expected_output, expect_error):
+  if expect_error == False and result.status == TestResultStatus.error:
+    return "Expected no error, got error:\n" + result.longer_output
 
-  result = getOutput(input_file_name, gc_stress)
+  if expect_error == True and result.status == TestResultStatus.ok:
+    return "Expected error, got none"
 
-  output_file_name = input_file_name[:-2] + "out"
-  if not os.path.isfile(os.path.join(test_path, output_file_name)):
-    print("Corresponding output file " + output_file_name + " not found")
-    exit(1)
+  if result.output != expected_output:
+    return "Got output:\n" + result.output + "\nWanted output:\n" + expected_output
+  return None
 
-  output_file = open(os.path.join(test_path, output_file_name), 'r')
-  expected_output = output_file.read().strip()
-  output_file.close()
 
-  if result.status == TestResultStatus.skipped:
-    skipped += 1
-    return
+# Compiles the program in its own temporary directory, and runs the executable
+# normally and with --gc-stress. Returns (input_file_path, status, messages,
+# wall time in seconds); status is "passed", "failed" or "skipped".
+def runTest(input_file_path, expect_error, cache = None):
+  start = time.perf_counter()
+  (status, messages) = runTestAndCheck(input_file_path, expect_error, cache)
+  return (input_file_path, status, messages, time.perf_counter() - start)
 
-  if expect_error == False and result.status == TestResultStatus.error:
-    print("Expected no error, got error:\n" + result.longer_output)
-    exit(1)
 
-  if expect_error == True and result.status == TestResultStatus.ok:
-    print("Expected error, got none")
-    exit(1)
+def runTestAndCheck(input_file_path, expect_error, cache):
+  output_file_path = input_file_path[:-2] + "out"
+  if not os.path.isfile(output_file_path):
+    return ("failed", ["Corresponding output file " + output_file_path + " not found"])
 
-  if result.output != expected_output:
-    print("Got output:\n" + result.output)
-    print("Wanted output:\n" + expected_output)
-    exit(1)
-  assert(result.output == expected_output)
+  input_file = open(input_file_path, 'r')
+  input = input_file.read()
+  input_file.close()
+  if input.startswith("SKIP"):
+    return ("skipped", [])
+
+  output_file = open(output_file_path, 'r')
+  expected_output = output_file.read().strip()
+  output_file.close()
 
+  messages = []
+  with tempfile.TemporaryDirectory(prefix = "test_compiler_") as build_path:
+    executable = compileTest(input_file_path, build_path, cache)
+    for gc_stress in [False, True]:
+      if isinstance(executable, Result):
+        # Compilation errors are the same in both modes.
+        result = executable
+      else:
+        result = getOutput(executable, gc_stress)
+      message = checkResult(result, expected_output, expect_error)
+      if message:
+        messages.append("gc_stress " + str(gc_stress) + ": " + message)
+  return ("failed" if messages else "passed", messages)
 
 
 if __name__ == '__main__':
+  # Usage: test_compiler.py [-j workers] [--cache directory] [--cache-size MB]
+  # By default, there's a worker per CPU, and the programs are not cached.
+  workers = os.cpu_count() or 1
+  cache_directory = None
+  cache_size = DEFAULT_COMPILATION_CACHE_SIZE
+  args = sys.argv[1:]
+  while args:
+    flag = args.pop(0)
+    if flag == "-j":
+      workers = int(args.pop(0))
+    elif flag == "--cache":
+      cache_directory = args.pop(0)
+    elif flag == "--cache-size":
+      cache_size = int(args.pop(0)) * 1024 * 1024
+    else:
+      print("Unknown flag " + flag)
+      exit(1)
+
+  buildRuntime()
+  cache = createCache(cache_directory, cache_size) if cache_directory else None
 
   # Read all input files in tests/, run the prog with the compiler, ensure
   # that the output matches the corresponding output file.
   test_paths = ["tests", "compiler_tests"]
 
+  tests = []
   for test_path in test_paths:
     files = [f for f in os.listdir(test_path) if os.path.isfile(os.path.join(test_path, f)) and f.endswith("in")]
 
@@ -118,22 +186,36 @@ if __name__ == '__main__':
     bad_files = [f for f in files if f.startswith("error_")]
     bad_files.sort()
 
-    for input_file_name in good_files:
-      runTest(input_file_name, test_path, False, False)
-
-    for input_file_name in bad_files:
-      runTest(input_file_name, test_path, True, False)
-
-    # gc stress
-    for input_file_name in good_files:
-      runTest(input_file_name, test_path, False, True)
-
-    for input_file_name in bad_files:
-      runTest(input_file_name, test_path, True, True)
+    tests += [(os.path.join(test_path, f), False) for f in good_files]
+    tests += [(os.path.join(test_path, f), True) for f in bad_files]
+
+  failed = []
+  skipped = 0
+  # The work is done in subprocesses, so threads are enough.
+  with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+    futures = [executor.submit(runTest, input_file_path, expect_error, cache) for (input_file_path, expect_error) in tests]
+    for future in concurrent.futures.as_completed(futures):
+      (input_file_path, status, messages, wall_time) = future.result()
+      print("%-7s %s %.1f ms" % (status.upper(), input_file_path, wall_time * 1000))
+      for message in messages:
+        print(message)
+      if status == "failed":
+        failed.append(input_file_path)
+      elif status == "skipped":
+        skipped += 1
+
+  if cache:
+    print("Compilation cache: " + str(cache.statistics()))
+
+  if failed:
+    print("Failed tests:")
+    for input_file_path in sorted(failed):
+      print(input_file_path)
+    exit(1)
 
-    if skipped > 0:
-      print("Some tests skipped")
-      exit(1)
+  if skipped > 0:
+    print("Some tests skipped")
+    exit(1)
 
   print("All OK!")
   exit(0)
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+from grammar import GrammarDriver
+from grammar_rules import rules
+from incremental import IncrementalFrontEnd, TextEdit
+from parse_tree import ParseTreeNode, all_slots
+from scanner import Token
+from scope_analyser import Scope
+from ttypes import Type
+from variable import Function, Variable
+
+BUILTINS = ["print", "Array"]
+
+SOURCE = """let a = 1;
+function f(x) {
+  let y = x + a;
+  return y * 2;
+}
+let b = f(3) +
+  f(4);
+print(b);
+while (a < 3) {
+  let t = a + 1;
+  if (t > 2) {
+    let u = t;
+    print(u);
+  }
+  a = t;
+}
+print(a);
+"""
+
+
+# Returns a comparable description of the parse tree, including the positions
+# and the results of the scope analysis. The Scopes found are added to scopes.
+def describe(value, scopes):
+  if isinstance(value, ParseTreeNode):
+    return (type(value).__name__,) + tuple((name, describe(getattr(value, name, None), scopes)) for name in all_slots(type(value)))
+  if isinstance(value, list):
+    return tuple(describe(item, scopes) for item in value)
+  if isinstance(value, Scope):
+    scopes.append(value)
+    return ("Scope", value.scope_type, value.depth, value.slot_count, describe(value.variables, scopes), describe(value.children, scopes))
+  if isinstance(value, Variable):
+    return (type(value).__name__, value.name, value.variable_type, value.depth, value.slot, value.is_parameter, value.referred_by_inner_functions)
+  if isinstance(value, Function):
+    return ("Function", value.name, describe(value.scope, scopes), describe(value.parameter_variables, scopes), describe(value.local_variables, scopes))
+  if isinstance(value, Token):
+    return (value.token_type, value.value)
+  if isinstance(value, Type):
+    return str(value)
+  return value
+
+
+# Returns (description, error) for the program and the top scope of
+# front_end after calling parse_function.
+def parse_with(front_end, parse_function):
+  try:
+    program = parse_function()
+  except BaseException as e:
+    return (None, e.__class__.__name__)
+  top_scopes = []
+  description = (describe(program, []), describe(front_end.top_scope, top_scopes))
+  # The scopes in the parse tree must be the ones of the latest analysis, not
+  # left over from a previous one.
+  tree_scopes = []
+  describe(program, tree_scopes)
+  for scope in tree_scopes:
+    if not any(scope is s for s in top_scopes):
+      return (description, "Stale scope")
+  return (description, None)
+
+
+# Returns a TextEdit replacing the only occurrence of old in source with new.
+def replace(source, old, new):
+  assert(source.count(old) == 1)
+  start = source.index(old)
+  return TextEdit(start, start + len(old), new)
+
+
+def check(condition, message):
+  if not condition:
+    print(message)
+    exit(1)
+
+
+if __name__ == '__main__':
+  grammar = GrammarDriver(rules)
+  front_end = IncrementalFrontEnd(grammar, BUILTINS)
+  front_end.parse(SOURCE)
+
+  # (name, old text, new text, whether some statements are expected to be
+  # reused). Each edit is applied to the result of the previous ones.
+  edits = [("Inside a function", "x + a", "x + a + 100", True),
+           ("Statement spanning lines", "f(3) +\n  f(4)", "f(3) +\n  f(4) +\n  f(5)", True),
+           ("Adding a statement", "print(b);\n", "print(b);\nlet c = b;\n", True),
+           ("Using the added statement", "print(a);", "print(c);", True),
+           ("Using an undeclared variable", "print(c);", "print(d);", True),
+           ("Declaring the variable", "let c = b;", "let d = b;", False),
+           ("Removing a statement", "print(b);\n", "", True),
+           ("Breaking the syntax", "while (a < 3) {", "while (a < 3)", False),
+           ("Restoring the syntax", "while (a < 3)", "while (a < 3) {", False),
+           ("Shadowing an outer variable", "let y = x + a + 100;", "let a = x;\n  let y = x + a + 100;", True),
+           ("Edit at the start", "let a = 1;", "let a = 10;", True),
+           ("Edit at the end", "print(d);\n", "print(d);\nprint(a);\n", True)]
+
+  for (name, old, new, expect_reuse) in edits:
+    print("Checking edit: " + name)
+    edit = replace(front_end.source, old, new)
+    new_source = edit.apply(front_end.source)
+    (description, error) = parse_with(front_end, lambda: front_end.update(edit))
+    check(front_end.source == new_source, "Wrong source:\n" + str(front_end.source))
+    fresh = IncrementalFrontEnd(grammar, BUILTINS)
+    (expected_description, expected_error) = parse_with(fresh, lambda: fresh.parse(new_source))
+    check(error == expected_error, "Got error " + str(error) + ", wanted " + str(expected_error))
+    check(description == expected_description, "Got:\n" + str(description) + "\nWanted:\n" + str(expected_description))
+    if expect_reuse:
+      check(front_end.reused_statement_count > 0, "No statements reused")
+
+  print("All OK!")
+  exit(0)
@@ -2,88 +2,260 @@
 
 from grammar import GrammarDriver
 from grammar_rules import rules
-from interpreter import Interpreter, InterpreterException
+from interpreter import ExecutionMode, Interpreter, InterpreterException
+from memoizer import Memoizer
+from profiler import Profiler
+from scope_analyser import ScopeError
 
+import concurrent.futures
+import io
+import json
 import os
+import sys
+import tempfile
+import time
 
-def run_tests_in(test_path):
-  skipped = 0
-  # Read all input files in the directory, run the prog with the interpreter,
-  # ensure that the output matches the corresponding output file.
+# How many of the slowest tests are listed.
+SLOWEST_TEST_COUNT = 10
+
+# The GrammarDriver of this process; it's built once and used for all tests.
+grammar = None
+
+def initialize_grammar():
+  global grammar
+  grammar = GrammarDriver(rules)
+
+
+# Returns the paths of the input files in the directory; the tests expecting
+# no error first.
+def test_files_in(test_path):
   files = [f for f in os.listdir(test_path) if os.path.isfile(os.path.join(test_path, f)) and f.endswith("in")]
   good_files = [f for f in files if not f.startswith("error_")]
   good_files.sort()
   bad_files = [f for f in files if f.startswith("error_")]
   bad_files.sort()
+  return [os.path.join(test_path, f) for f in good_files + bad_files]
 
-  for input_file_name in good_files:
-    input_file_path = os.path.join(test_path, input_file_name)
-    output_file_path = os.path.join(test_path, input_file_name[:-2] + "out")
-    print("Running test " + input_file_path)
-    if not os.path.isfile(output_file_path):
-      print("Corresponding output file " + output_file_path + " not found")
-      exit(1)
-    input_file = open(input_file_path, 'r')
-    input = input_file.read()
-    if input.startswith("SKIP"):
-      print("SKIPPED")
-      skipped += 1
-      continue
-    output_file = open(output_file_path, 'r')
-    expected_output = output_file.read().strip()
-
-    grammar = GrammarDriver(rules)
-    i = Interpreter(grammar, input)
-    output = i.run().strip()
-    if output != expected_output:
-      print("Got output:\n" + output)
-      print("Wanted output:\n" + expected_output)
-      exit(1)
-    assert(output == expected_output)
-
-  for input_file_name in bad_files:
-    input_file_path = os.path.join(test_path, input_file_name)
-    output_file_path = os.path.join(test_path, input_file_name[:-2] + "out")
-    print("Running test " + input_file_path)
-    if not os.path.isfile(output_file_path):
-      print("Corresponding output file " + output_file_path + " not found")
-      exit(1)
-    input_file = open(input_file_path, 'r')
-    input = input_file.read()
-    if input.startswith("SKIP"):
-      print("SKIPPED")
-      skipped += 1
-      continue
-    output_file = open(output_file_path, 'r')
-    expected_output = output_file.read().strip()
 
-    grammar = GrammarDriver(rules)
+# The message of an exception a test ended with.
+def error_message(e):
+  if isinstance(e, (InterpreterException, ScopeError)):
+    return e.message
+  return e.__class__.__name__ + ": " + str(e)
+
+
+# Runs the program with the interpreter and ensures that the output matches the
+# corresponding output file. Returns (input_file_path, mode name, status,
+# message, wall time in seconds); status is "passed", "failed" or "skipped".
+def run_test(input_file_path, mode):
+  start = time.perf_counter()
+  try:
+    (status, message) = run_test_and_check(input_file_path, mode)
+  except (Exception, InterpreterException, ScopeError) as e:
+    # E.g., a ScopeError or a RecursionError; the other tests are still run.
+    # KeyboardInterrupt and SystemExit still stop the run.
+    (status, message) = ("failed", "Got error:\n" + error_message(e))
+  return (input_file_path, mode.name, status, message, time.perf_counter() - start)
+
 
+def run_test_and_check(input_file_path, mode):
+  output_file_path = input_file_path[:-2] + "out"
+  if not os.path.isfile(output_file_path):
+    return ("failed", "Corresponding output file " + output_file_path + " not found")
+  input_file = open(input_file_path, 'r')
+  input = input_file.read()
+  if input.startswith("SKIP"):
+    return ("skipped", "")
+  output_file = open(output_file_path, 'r')
+  expected_output = output_file.read().strip()
+
+  if os.path.basename(input_file_path).startswith("error_"):
     try:
-      i = Interpreter(grammar, input)
+      i = Interpreter(grammar, input, mode)
       i.run()
     except InterpreterException as e:
       output = e.message
-    except BaseException as e:
+    except (Exception, ScopeError) as e:
       output = e.__class__.__name__
     else:
-      print("Expecting an error, got none")
-      exit(1)
+      return ("failed", "Expecting an error, got none")
+
+    if output != expected_output:
+      return ("failed", "Got output:\n" + output + "\nWanted output:\n" + expected_output)
+    return ("passed", "")
+
+  i = Interpreter(grammar, input, mode)
+  output = i.run().strip()
+  if output != expected_output:
+    return ("failed", "Got output:\n" + output + "\nWanted output:\n" + expected_output)
+
+  # The same output, written to a stream while the program runs.
+  stream = io.StringIO()
+  Interpreter(grammar, input, mode, stream, 1).run()
+  if stream.getvalue().strip() != expected_output:
+    return ("failed", "Got streamed output:\n" + stream.getvalue())
 
+  # The same output when only some functions are compiled.
+  if mode == ExecutionMode.tiered:
+    output = Interpreter(grammar, input, mode, tier_up_threshold = 2).run().strip()
     if output != expected_output:
-      print("Got output:\n" + output)
-      print("Wanted output:\n" + expected_output)
+      return ("failed", "Got tiered output:\n" + output)
+
+  # The same output with memoization; the small cache also tests evictions.
+  output = Interpreter(grammar, input, mode, memoizer = Memoizer(8)).run().strip()
+  if output != expected_output:
+    return ("failed", "Got memoized output:\n" + output)
+  return ("passed", "")
+
+
+# Runs the tests in all modes in worker processes (or in this process if
+# there's only one worker), printing the results as they come. Returns the
+# results in the order of the tests.
+def run_tests(test_paths, workers):
+  tests = [(input_file_path, mode) for mode in ExecutionMode for test_path in test_paths for input_file_path in test_files_in(test_path)]
+  results = dict()
+
+  def report(result):
+    (input_file_path, mode_name, status, message, wall_time) = result
+    print("%-7s %s (%s) %.1f ms" % (status.upper(), input_file_path, mode_name, wall_time * 1000))
+    if message:
+      print(message)
+    results[(input_file_path, mode_name)] = result
+
+  if workers == 1:
+    for (input_file_path, mode) in tests:
+      report(run_test(input_file_path, mode))
+  else:
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer = initialize_grammar) as executor:
+      futures = [executor.submit(run_test, input_file_path, mode) for (input_file_path, mode) in tests]
+      for future in concurrent.futures.as_completed(futures):
+        report(future.result())
+  return [results[(input_file_path, mode.name)] for (input_file_path, mode) in tests]
+
+
+def print_slowest(results, count):
+  print("Slowest tests:")
+  for (input_file_path, mode_name, status, message, wall_time) in sorted(results, key = lambda r: r[4], reverse = True)[:count]:
+    print("%10.1f ms %s (%s)" % (wall_time * 1000, input_file_path, mode_name))
+
+
+def write_summary(file_name, results, workers, wall_time):
+  tests = [{"file": input_file_path, "mode": mode_name, "status": status, "message": message, "time": t}
+           for (input_file_path, mode_name, status, message, t) in results]
+  summary = {"workers": workers,
+             "wall_time": wall_time,
+             "passed": len([r for r in results if r[2] == "passed"]),
+             "failed": len([r for r in results if r[2] == "failed"]),
+             "skipped": len([r for r in results if r[2] == "skipped"]),
+             "tests": tests}
+  with open(file_name, "w") as f:
+    json.dump(summary, f, indent = 2)
+
+
+# Profiles a program in all modes and checks that the counts match.
+def check_profiles(input_file_path):
+  print("Profiling " + input_file_path)
+  input = open(input_file_path, 'r').read()
+  expected_output = Interpreter(grammar, input).run()
+  profiles = []
+  for mode in ExecutionMode:
+    profiler = Profiler()
+    # Profiling doesn't change the output.
+    assert(Interpreter(grammar, input, mode, profiler = profiler).run() == expected_output)
+    profile = json.loads(profiler.toJson())
+    profiles.append(({f["name"]: f["calls"] for f in profile["functions"]},
+                     {s["pos"]: s["count"] for s in profile["statements"]}))
+  for profile in profiles:
+    if profile != profiles[0]:
+      print("Got profile:\n" + str(profile))
+      print("Wanted profile:\n" + str(profiles[0]))
       exit(1)
-    assert(output == expected_output)
 
-  return skipped
+
+# Checks that memoization is used for a program in all modes.
+def check_memoization(input_file_path):
+  print("Memoizing " + input_file_path)
+  input = open(input_file_path, 'r').read()
+  for mode in ExecutionMode:
+    memoizer = Memoizer()
+    Interpreter(grammar, input, mode, memoizer = memoizer).run()
+    if memoizer.hits == 0:
+      print("No memoized calls (" + mode.name + "): " + str(memoizer.statistics()))
+      exit(1)
+
+
+# Checks that functions are compiled when running a program in
+# ExecutionMode.tiered.
+def check_tiering(input_file_path):
+  print("Tiering " + input_file_path)
+  input = open(input_file_path, 'r').read()
+  i = Interpreter(grammar, input, ExecutionMode.tiered)
+  i.run()
+  if not i.tiered_up_functions:
+    print("No functions compiled")
+    exit(1)
+
+
+# Checks that a test which raises an exception is reported as failed, and that
+# the other tests are still run.
+def check_failures_reported(workers):
+  print("Checking that failures are reported")
+  with tempfile.TemporaryDirectory() as test_path:
+    for (name, input, output) in [("good", "print(1);", "1"), ("bad", "print(x);", "1")]:
+      open(os.path.join(test_path, name + ".in"), "w").write(input)
+      open(os.path.join(test_path, name + ".out"), "w").write(output)
+    summary_file_name = os.path.join(test_path, "summary.json")
+    write_summary(summary_file_name, run_tests([test_path], workers), workers, 0)
+    summary = json.load(open(summary_file_name))
+  statuses = {(os.path.basename(t["file"]), t["status"]) for t in summary["tests"]}
+  if statuses != {("bad.in", "failed"), ("good.in", "passed")} or summary["failed"] != len(ExecutionMode):
+    print("Got summary:\n" + json.dumps(summary, indent = 2))
+    exit(1)
 
 
 if __name__ == '__main__':
-  skipped = run_tests_in("interpreter_tests")
-  skipped += run_tests_in("tests")
+  # Usage: test_interpreter.py [-j workers] [--summary file]
+  # By default, there's a worker process per CPU. The summary is written as
+  # JSON.
+  workers = os.cpu_count() or 1
+  summary_file_name = None
+  args = sys.argv[1:]
+  while args:
+    flag = args.pop(0)
+    if flag in ["-j", "--summary"] and not args:
+      print("Usage: test_interpreter.py [-j workers] [--summary file]")
+      exit(1)
+    if flag == "-j":
+      workers = int(args.pop(0))
+    elif flag == "--summary":
+      summary_file_name = args.pop(0)
+    else:
+      print("Unknown flag " + flag)
+      exit(1)
+
+  start = time.perf_counter()
+  initialize_grammar()
+  results = run_tests(["interpreter_tests", "tests"], workers)
+  wall_time = time.perf_counter() - start
+
+  print_slowest(results, SLOWEST_TEST_COUNT)
+  if summary_file_name:
+    write_summary(summary_file_name, results, workers, wall_time)
+
+  failed = [r for r in results if r[2] == "failed"]
+  if failed:
+    print("Failed tests:")
+    for (input_file_path, mode_name, status, message, t) in failed:
+      print(input_file_path + " (" + mode_name + ")")
+    exit(1)
+
+  check_profiles("tests/fibonacci.in")
+  check_profiles("tests/mutually_recursive_functions.in")
+  check_memoization("tests/fibonacci.in")
+  check_tiering("interpreter_tests/tiered_execution.in")
+  check_failures_reported(workers)
 
-  if skipped > 0:
+  if [r for r in results if r[2] == "skipped"]:
     print("Some tests skipped")
     exit(1)
 
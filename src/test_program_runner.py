@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+from grammar import GrammarDriver
+from grammar_rules import rules
+from interpreter import ExecutionMode
+from program_runner import run_program, run_programs
+
+import os
+
+def read_tests_in(test_path):
+  # (input file path, source, expected output) for all tests in the directory.
+  tests = []
+  files = [f for f in os.listdir(test_path) if os.path.isfile(os.path.join(test_path, f)) and f.endswith("in")]
+  files.sort()
+  for input_file_name in files:
+    input_file_path = os.path.join(test_path, input_file_name)
+    output_file_path = os.path.join(test_path, input_file_name[:-2] + "out")
+    input = open(input_file_path, 'r').read()
+    if input.startswith("SKIP"):
+      continue
+    tests.append((input_file_path, input, open(output_file_path, 'r').read().strip()))
+  return tests
+
+
+# The output of a ProgramResult in the format of the expected output files.
+def result_output(result):
+  if result.error is None:
+    return result.output.strip()
+  if result.error == "InterpreterException":
+    return result.message
+  return result.error
+
+
+def check_results(tests, results):
+  for ((input_file_path, input, expected_output), result) in zip(tests, results):
+    print("Checking test " + input_file_path)
+    output = result_output(result)
+    if output != expected_output:
+      print("Got output:\n" + output)
+      print("Wanted output:\n" + expected_output)
+      exit(1)
+
+
+if __name__ == '__main__':
+  tests = read_tests_in("interpreter_tests") + read_tests_in("tests")
+  sources = [input for (input_file_path, input, expected_output) in tests]
+
+  # In several processes.
+  check_results(tests, run_programs(sources, ExecutionMode.closures, 2))
+
+  # Several times in the same process; the runs don't affect each other.
+  grammar = GrammarDriver(rules)
+  for i in range(2):
+    check_results(tests, [run_program(grammar, source) for source in sources])
+
+  # The messages don't contain the positions of the errors.
+  result = run_program(grammar, "function foo(x, y) { }\nfoo(2);")
+  if (result.error, result.message) != ("RuntimeError", "RuntimeError: Wrong number of parameters, expecting 2"):
+    print("Got result: " + str(result))
+    exit(1)
+
+  result = run_program(grammar, "print(1);\nlet = 2;")
+  if result.error != "SyntaxError" or "position" in result.message:
+    print("Got result: " + str(result))
+    exit(1)
+
+  print("All OK!")
+  exit(0)
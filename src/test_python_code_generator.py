@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+
+from grammar import GrammarDriver
+from grammar_rules import rules
+from interpreter import Interpreter, InterpreterException
+from python_code_generator import PythonCodeRunner
+
+import os
+
+# Runs the program and returns its output, or the error it ended with.
+def run_and_catch(runner):
+  try:
+    return ("output", runner.run())
+  except InterpreterException as e:
+    return ("error", e.message)
+  except BaseException as e:
+    return ("error", e.__class__.__name__)
+
+
+def run_tests_in(test_path):
+  skipped = 0
+  # Read all input files in the directory, run the prog with the Interpreter
+  # and by generating Python code for it, ensure that the outputs (or the
+  # errors) are the same.
+  files = [f for f in os.listdir(test_path) if os.path.isfile(os.path.join(test_path, f)) and f.endswith("in")]
+  files.sort()
+
+  grammar = GrammarDriver(rules)
+
+  for input_file_name in files:
+    input_file_path = os.path.join(test_path, input_file_name)
+    print("Running test " + input_file_path)
+    input_file = open(input_file_path, 'r')
+    input = input_file.read()
+    if input.startswith("SKIP"):
+      print("SKIPPED")
+      skipped += 1
+      continue
+
+    expected = run_and_catch(Interpreter(grammar, input))
+    runner = PythonCodeRunner(grammar, input)
+    result = run_and_catch(runner)
+    if result != expected:
+      print("Got " + result[0] + ":\n" + result[1])
+      print("Wanted " + expected[0] + ":\n" + expected[1])
+      if runner.code:
+        print("Generated code:\n" + runner.code)
+      exit(1)
+
+  return skipped
+
+
+if __name__ == '__main__':
+  skipped = 0
+  skipped += run_tests_in("tests")
+  skipped += run_tests_in("interpreter_tests")
+
+  if skipped > 0:
+    print("Some tests skipped")
+    exit(1)
+
+  print("All OK!")
+  exit(0)
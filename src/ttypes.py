@@ -77,26 +77,11 @@ class TypeTemplate(Type):
 
 
 class TypeList:
-  def __init__(self, items):
-    if items is None:
-      self.items = []
-    else:
-      assert(len(items) == 2)
-      assert(isinstance(items[0], Type))
-      self.items = [items[0]]
-      if items[1] is not None:
-        assert(isinstance(items[1], TypeListContinuation))
-        self.items.extend(items[1].items)
-
-
-class TypeListContinuation:
-  def __init__(self, items):
-    assert(len(items) == 2)
-    assert(isinstance(items[0], Type))
-    self.items = [items[0]]
-    if items[1] is not None:
-      assert(isinstance(items[1], TypeListContinuation))
-      self.items.extend(items[1].items)
+  # types is a list of Types, or None.
+  def __init__(self, types):
+    self.items = types or []
+    for t in self.items:
+      assert(isinstance(t, Type))
 
 
 string_type = String()
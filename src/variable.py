@@ -22,6 +22,11 @@ class Variable:
     self.referred_by_inner_functions = False
     # Offset of the variable inside a function context. Filled in by later stages.
     self.offset = None
+    # Filled in by ScopeAnalyser: the nesting depth of the function (or top
+    # level) which allocates the variable, and the index of the variable in its
+    # function context.
+    self.depth = None
+    self.slot = None
 
   def __str__(self):
     to_return = "Variable(" + self.name + ", "